@@ -3,20 +3,49 @@ Study Skills App - Main Application
 A multi-filter learning enhancement tool with 6 cognitive skill filters
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Blueprint, Flask, Response, current_app, g, render_template, request, jsonify, session, stream_with_context
+from functools import wraps
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import os
-import io
-import PyPDF2  # For PDF extraction
+import sys
+import json
+import time
+import signal
+import hashlib
+import hmac
+import logging
+import threading
+import uuid
+import contextvars
+from services.pdf_extractor import PDFExtractor, PDFExtractionError, PDFLimitExceeded
+from services.jobs import JobQueue, WebhookError
+from services.session_store import SessionStore
 from filters.blue_metacognition import MetacognitionFilter
 from filters.yellow_memory import MemoryFilter
 from filters.green_cognitive_load import CognitiveLoadFilter
 from filters.grey_time_blocking import TimeBlockingFilter
 from filters.purple_research import ResearchFilter
 from filters.orange_boredom import BoredomFilter
+from filters import ai_helper
+from filters.ai_helper import ai_flight, get_upstream_stats, response_cache
+from filters.model_router import model_router
+from filters.resilience import GeminiError
+from filters.single_flight import SingleFlight
+from filters.tokens import usage_tracker
+from filters.json_extract import parse_stats
+from filters.card_store import card_store
+from filters.fair_scheduler import current_caller, scheduler
+from filters.near_duplicate import NearDuplicateIndex
+from filters import metrics
+from filters.metrics import RequestTimings, current_timings, timed_stage
 
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
+logger = logging.getLogger(__name__)
+# One JSON line per request with its id, status and per-stage timings
+request_logger = logging.getLogger('study.requests')
+
+# Routes live on a blueprint so create_app() can build as many app instances as it likes
+bp = Blueprint('study', __name__)
 
 # Initialize all filters
 filters = {
@@ -28,12 +57,174 @@ filters = {
     'orange': BoredomFilter()
 }
 
-@app.route('/')
+pdf_extractor = PDFExtractor.from_env()
+
+# Study sessions live server-side; the cookie only carries their id
+session_store = SessionStore.from_env()
+
+# Identical filter runs (same filter, mode and text) in flight share one result;
+# a caller stops waiting after FILTER_FLIGHT_TIMEOUT seconds and runs the filter itself
+filter_flight = SingleFlight(timeout=float(os.environ.get('FILTER_FLIGHT_TIMEOUT', 180)))
+
+# Reworded or re-copied text reuses an earlier run's result (see NEAR_DUP_* env vars)
+near_duplicates = NearDuplicateIndex.from_env()
+
+def run_filter(color, text, mode='normal'):
+    """
+    Run a filter, reusing the result for a near-duplicate text and coalescing
+    with an identical run that is already in progress. The run costs the
+    caller one quota request however many chunks it fans out to, whether it
+    does the work or shares another caller's; a near-duplicate reuse is free.
+    """
+    with scheduler.run():
+        return _run_filter(color, text, mode)
+
+def _run_filter(color, text, mode):
+    filter_obj = filters[color]
+    if not filter_obj.cache_responses:
+        return filter_obj.process(text, mode=mode)
+    mode_key = json.dumps(mode, sort_keys=True)
+    fingerprint = None
+    if filter_obj.reuse_near_duplicates:
+        with timed_stage('near_duplicate', color):
+            fingerprint = near_duplicates.fingerprint(text)
+            result = near_duplicates.lookup((color, mode_key), fingerprint)
+        if fingerprint is not None and near_duplicates.enabled:
+            metrics.near_duplicates.inc(filter=color, result='hit' if result is not None else 'miss')
+        if result is not None:
+            return result
+
+    def process():
+        # Only the run that did the work indexes it, and only a complete, valid result
+        result = filter_obj.process(text, mode=mode)
+        if filter_obj.is_reusable(result):
+            near_duplicates.add((color, mode_key), fingerprint, result)
+        return result
+
+    # Every caller pays for its run before joining the flight: an over-quota
+    # leader must not hand its 429 to followers that still have quota
+    scheduler.charge(current_caller.get())
+    key = (color, mode_key, hashlib.sha256(text.encode('utf-8')).hexdigest())
+    return filter_flight.do(key, process)
+
+def run_job(job):
+    """Job runner: the run is charged to the quota of whoever submitted it"""
+    current_caller.set(job.get('owner'))
+    return run_filter(job['filter'], job['text'], job['mode'])
+
+# Long runs go through /jobs so they don't hold a web worker for the whole Gemini call
+job_queue = JobQueue.from_env(run_job)
+
+# Tracked per worker process for /readyz
+lifecycle = {'warmed_up': False, 'draining': False}
+
+# Bounded pool shared by /apply_filters so one batch can't spawn unlimited threads. Sized so that
+# concurrent batches can keep every upstream slot busy with one more batch ready behind them
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BATCH_MAX_WORKERS', scheduler.slots + len(filters))),
+    thread_name_prefix='apply-filters'
+)
+
+metrics.registry.gauge(
+    'study_gemini_calls_in_flight', 'Gemini calls currently running', fn=ai_helper.in_flight_calls)
+metrics.registry.gauge(
+    'study_gemini_circuit_open', '1 while the Gemini circuit breaker is failing fast',
+    fn=lambda: int(ai_helper.circuit_breaker.get_stats()['state'] != 'closed'))
+metrics.registry.gauge(
+    'study_scheduler_queued', 'Gemini calls waiting for a fair-scheduler slot',
+    fn=lambda: scheduler.get_stats()['queued_now'])
+
+def caller_id():
+    """Who a request's Gemini calls are charged to: a random id kept in the signed session cookie"""
+    caller = session.get('caller_id')
+    if caller is None:
+        session['caller_id'] = uuid.uuid4().hex
+        # Until the cookie comes back, share the address's quota so cookieless clients can't dodge it
+        return f"ip:{request.remote_addr}"
+    return caller
+
+def _bearer_matches(token):
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8'))
+
+def admin_required(view):
+    """Operator routes need the ADMIN_TOKEN bearer token, and are closed when none is configured"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        token = current_app.config.get('ADMIN_TOKEN')
+        if not token:
+            return jsonify({'error': 'Operator routes are disabled; set ADMIN_TOKEN'}), 403
+        if not _bearer_matches(token):
+            return jsonify({'error': 'Admin token required'}), 401
+        return view(*args, **kwargs)
+    return guarded
+
+def scrape_allowed(view):
+    """/metrics is open to scrapers unless METRICS_TOKEN is set, then it needs that bearer token"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and not _bearer_matches(token):
+            return jsonify({'error': 'Metrics token required'}), 401
+        return view(*args, **kwargs)
+    return guarded
+
+@bp.before_app_request
+def start_request_timing():
+    """Tag the request with an id and start collecting its stage timings"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.started = time.perf_counter()
+    g.timings = RequestTimings()
+    current_timings.set(g.timings)
+    g.caller = caller_id()
+    current_caller.set(g.caller)
+    metrics.http_requests_in_flight.inc()
+
+@bp.after_app_request
+def log_request_timing(response):
+    """Record route latency and emit the request's timing log line"""
+    if 'started' not in g:
+        return response
+    response.headers['X-Request-ID'] = g.request_id
+    quota = scheduler.quota(g.caller)
+    response.headers['X-RateLimit-Limit'] = str(quota['limit'])
+    response.headers['X-RateLimit-Remaining'] = str(quota['remaining'])
+    response.headers['X-RateLimit-Reset'] = str(int(quota['reset_seconds'] + 0.5))
+    entry = {
+        'request_id': g.request_id,
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint or 'unmatched',
+        'status': response.status_code
+    }
+    started, timings = g.started, g.timings
+    if response.is_streamed:
+        # The body (and its Gemini calls) runs after this hook; log once it has been sent
+        response.call_on_close(lambda: _log_request(entry, started, timings))
+    else:
+        _log_request(entry, started, timings)
+    return response
+
+def _log_request(entry, started, timings):
+    """Observe route latency and emit the request's timing log line"""
+    elapsed = time.perf_counter() - started
+    metrics.http_request_seconds.observe(
+        elapsed, endpoint=entry['endpoint'], method=entry['method'], status=entry['status'])
+    request_logger.info(json.dumps(dict(entry, duration_ms=round(elapsed * 1000, 1), stages=timings.as_dict())))
+
+@bp.teardown_app_request
+def end_request_timing(exc):
+    if 'started' in g:
+        metrics.http_requests_in_flight.dec()
+    current_timings.set(None)
+    current_caller.set(None)
+
+@bp.route('/')
 def index():
     """Main Dashboard"""
     return render_template('index.html')
 
-@app.route('/filter/<color>')
+@bp.route('/filter/<color>')
 def filter_page(color):
     """Render specific filter page"""
     if color not in filters:
@@ -42,7 +233,7 @@ def filter_page(color):
     # Map color to template name
     return render_template(f'{color}.html', active_filter=color)
 
-@app.route('/extract_pdf', methods=['POST'])
+@bp.route('/extract_pdf', methods=['POST'])
 def extract_pdf():
     """Extract text from uploaded PDF"""
     if 'file' not in request.files:
@@ -52,18 +243,38 @@ def extract_pdf():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
         
-    if file:
+    if request.args.get('stream') == '1' or request.form.get('stream') == '1':
+        return _stream_pdf_pages(file)
+    
+    try:
+        with timed_stage('pdf_extract'):
+            text, page_count, cached = pdf_extractor.extract(file.stream)
+        return jsonify({'success': True, 'text': text, 'pages': page_count, 'cached': cached})
+    except PDFLimitExceeded as e:
+        return jsonify({'error': str(e)}), 413
+    except PDFExtractionError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _stream_pdf_pages(file):
+    """Stream each page's text as an SSE event as soon as it is extracted"""
+    def generate():
         try:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            return jsonify({'success': True, 'text': text})
+            for number, page_text, cached in pdf_extractor.iter_pages(file.stream):
+                yield _sse('page', {'page': number, 'text': page_text, 'cached': cached})
         except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            # Headers are long gone, so every failure ends the stream with an event
+            yield _sse('error', {'error': str(e)})
+        yield _sse('done', {})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-@app.route('/apply_filter', methods=['POST'])
+@bp.route('/apply_filter', methods=['POST'])
 def apply_filter():
     """Apply selected filter to the input text"""
     try:
@@ -79,18 +290,177 @@ def apply_filter():
             return jsonify({'error': 'Invalid filter'}), 400
         
         # Apply the selected filter
-        result = filters[filter_color].process(text, mode=mode)
+        result = run_filter(filter_color, text, mode)
         
         return jsonify({
             'success': True,
             'filter': filter_color,
-            'result': result
+            'result': result,
+            'quota': scheduler.quota(g.caller)
         })
     
+    except GeminiError as e:
+        return _gemini_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/start_study_session', methods=['POST'])
+@bp.route('/apply_filter/stream', methods=['POST'])
+def apply_filter_stream():
+    """Apply a filter and stream its output as Server-Sent Events"""
+    data = request.json or {}
+    text = data.get('text', '')
+    filter_color = data.get('filter', 'blue')
+    mode = data.get('mode', 'normal')
+    
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    
+    if filter_color not in filters:
+        return jsonify({'error': 'Invalid filter'}), 400
+    
+    def generate():
+        # Sent immediately so the client sees its first byte before the model answers
+        yield _sse('start', {'filter': filter_color, 'mode': mode})
+        try:
+            with scheduler.run():
+                for event, payload in filters[filter_color].stream(text, mode=mode):
+                    yield _sse(event, payload)
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+        yield _sse('done', {})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _gemini_error_response(error):
+    """JSON error for an upstream failure, with Retry-After when we know it"""
+    body = {'error': str(error), 'retryable': error.retryable}
+    if error.retry_after is not None:
+        body['retry_after'] = round(error.retry_after, 1)
+    response = jsonify(body)
+    response.status_code = error.status
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, int(error.retry_after + 0.5)))
+    return response
+
+def _sse(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('/apply_filters', methods=['POST'])
+def apply_filters():
+    """Apply several filters to one text concurrently"""
+    try:
+        data = request.json
+        text = data.get('text', '')
+        colors = data.get('filters') or list(filters.keys())
+        mode = data.get('mode', 'normal')  # A string, or a {color: mode} mapping
+        
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
+        
+        invalid = [color for color in colors if color not in filters]
+        if invalid:
+            return jsonify({'error': f"Invalid filter(s): {', '.join(invalid)}"}), 400
+        
+        colors = list(dict.fromkeys(colors))
+        started = time.perf_counter()
+        # Each filter runs on a pool thread; copying the context keeps its timings on this request
+        futures = {
+            color: batch_executor.submit(
+                contextvars.copy_context().run, _timed_process, color, text,
+                mode.get(color, 'normal') if isinstance(mode, dict) else mode
+            )
+            for color in colors
+        }
+        
+        results, errors, timings = {}, {}, {}
+        for color, future in futures.items():
+            result, error, elapsed = future.result()
+            timings[color] = elapsed
+            if error is None:
+                results[color] = result
+            else:
+                errors[color] = error
+        
+        return jsonify({
+            'success': bool(results),
+            'results': results,
+            'errors': errors,
+            'timings_ms': timings,
+            'total_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _timed_process(color, text, mode):
+    """Run one filter, returning (result, error, elapsed_ms) instead of raising"""
+    started = time.perf_counter()
+    try:
+        result, error = run_filter(color, text, mode), None
+    except Exception as e:
+        result, error = None, str(e)
+    return result, error, round((time.perf_counter() - started) * 1000, 1)
+
+@bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a filter run in the background and return its id immediately"""
+    try:
+        data = request.json or {}
+        text = data.get('text', '')
+        filter_color = data.get('filter', 'blue')
+        mode = data.get('mode', 'normal')
+        
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
+        
+        if filter_color not in filters:
+            return jsonify({'error': 'Invalid filter'}), 400
+        
+        try:
+            job = job_queue.submit(
+                filter_color, text, mode,
+                priority=data.get('priority'),
+                webhook_url=data.get('webhook_url'),
+                owner=g.caller
+            )
+        except WebhookError as e:
+            return jsonify({'error': str(e)}), 400
+        except ValueError:
+            return jsonify({'error': 'Invalid priority'}), 400
+        
+        return jsonify({'success': True, 'job': job}), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report a job's status, and its result once finished; only to whoever submitted it"""
+    job = job_queue.get(job_id, g.caller)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued job; a running one finishes but its result is discarded"""
+    job = job_queue.cancel(job_id, g.caller)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@bp.route('/jobs', methods=['GET'])
+@admin_required
+def job_stats():
+    """Report job counts by status"""
+    return jsonify({'success': True, 'jobs': job_queue.get_stats()})
+
+@bp.route('/start_study_session', methods=['POST'])
 def start_study_session():
     """Start a time-blocked study session (Grey filter)"""
     try:
@@ -104,11 +474,14 @@ def start_study_session():
         # Generate question for unlocking using Grey filter (which calls AI)
         unlock_question = filters['grey'].generate_unlock_question(text)
         
-        # Store session data
-        session['study_start'] = datetime.now().isoformat()
-        session['study_duration'] = duration
-        session['study_text'] = text
-        session['unlock_answer'] = unlock_question['answer']
+        # Store session data server-side; the text can be a whole PDF, far too big for a cookie
+        session_id = session_store.create(
+            text,
+            study_start=datetime.now().isoformat(),
+            study_duration=duration,
+            unlock_answer=unlock_question['answer']
+        )
+        session['study_session_id'] = session_id
         
         return jsonify({
             'success': True,
@@ -117,17 +490,21 @@ def start_study_session():
             'end_time': (datetime.now() + timedelta(minutes=duration)).isoformat()
         })
     
+    except GeminiError as e:
+        return _gemini_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/check_unlock', methods=['POST'])
+@bp.route('/check_unlock', methods=['POST'])
 def check_unlock():
     """Check if the user's answer unlocks the study session"""
     try:
         data = request.json
         user_answer = data.get('answer', '')
         
-        if 'unlock_answer' not in session:
+        session_id = session.get('study_session_id')
+        study_session = session_store.get(session_id)
+        if not study_session or not study_session.get('unlock_answer'):
             return jsonify({'error': 'No active study session'}), 400
         
         # Check if answer is correct (using Grey filter AI logic or simple match)
@@ -137,12 +514,12 @@ def check_unlock():
         
         correct = filters['grey'].check_answer(
             user_answer, 
-            session['unlock_answer']
+            study_session['unlock_answer']
         )
         
         if correct:
             # Clear the session lock
-            session.pop('unlock_answer', None)
+            session_store.update(session_id, unlock_answer=None, unlocked_at=datetime.now().isoformat())
         
         return jsonify({
             'success': True,
@@ -153,31 +530,236 @@ def check_unlock():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/get_hint', methods=['POST'])
+@bp.route('/get_hint', methods=['POST'])
 def get_hint():
-    """Get a hint for memory filter blank"""
+    """Get a progressive hint for a memory filter blank (served locally, no AI call)"""
     try:
-        data = request.json
-        word = data.get('word', '')
+        data = request.get_json(silent=True) or {}
+        
+        try:
+            blank = int(data.get('blank', 1))
+            hint_level = int(data.get('hint_level', 1))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'blank and hint_level must be integers'}), 400
         
-        hint = filters['yellow'].get_hint(word)
+        if not data.get('exercise_id') and not data.get('word'):
+            return jsonify({'error': 'Provide exercise_id (with level and blank) or word'}), 400
+        
+        hint = filters['yellow'].get_hint(
+            word=data.get('word'),
+            exercise_id=data.get('exercise_id'),
+            level=data.get('level', 'easy'),
+            blank=blank,
+            hint_level=hint_level
+        )
+        if hint is None:
+            return jsonify({'error': 'Blank not found'}), 404
         
         return jsonify({
             'success': True,
-            'hint': hint
+            **hint
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/review/due', methods=['GET'])
+def review_due():
+    """The caller's Memory Mastery cards due for review now, most overdue first"""
+    if card_store is None:
+        return jsonify({'error': 'Card store is disabled'}), 404
+    try:
+        limit = min(int(request.args.get('limit', 20)), 200)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    cards = card_store.due(g.caller, limit)
+    return jsonify({
+        'success': True,
+        'cards': cards,
+        'count': len(cards),
+        'next_due': card_store.next_due(g.caller)
+    })
+
+@bp.route('/review/<card_id>', methods=['POST'])
+def review_card(card_id):
+    """Grade recall of one card (0 = forgot, 5 = perfect) and reschedule it"""
+    if card_store is None:
+        return jsonify({'error': 'Card store is disabled'}), 404
+    data = request.get_json(silent=True) or {}
+    grade = data.get('grade')
+    if not isinstance(grade, int) or isinstance(grade, bool) or not 0 <= grade <= 5:
+        return jsonify({'error': 'grade must be an integer from 0 to 5'}), 400
+    
+    card = card_store.review(card_id, grade, owner=g.caller)
+    if card is None:
+        return jsonify({'error': 'Card not found'}), 404
+    return jsonify({'success': True, 'card': card})
+
+@bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def cache_stats():
+    """Report AI response cache hit/miss counters"""
+    return jsonify({
+        'success': True,
+        'cache': response_cache.get_stats(),
+        'coalesced': {
+            'gemini_calls': ai_flight.get_stats(),
+            'filter_runs': filter_flight.get_stats()
+        },
+        'near_duplicates': near_duplicates.get_stats()
+    })
+
+@bp.route('/sessions/stats', methods=['GET'])
+@admin_required
+def session_stats():
+    """Report how many study sessions and stored texts are live"""
+    return jsonify({'success': True, 'sessions': session_store.get_stats()})
+
+@bp.route('/usage', methods=['GET'])
+@admin_required
+def usage_stats():
+    """Report prompt/response token totals per filter"""
+    return jsonify({
+        'success': True,
+        'usage': usage_tracker.get_stats(),
+        'parse_failures': parse_stats.get_stats()
+    })
+
+@bp.route('/routing/stats', methods=['GET'])
+@admin_required
+def routing_stats():
+    """Report calls, escalations, latency and estimated cost per filter and model"""
+    return jsonify({'success': True, 'routing': model_router.get_stats()})
+
+@bp.route('/upstream/status', methods=['GET'])
+@admin_required
+def upstream_status():
+    """Report Gemini circuit breaker, rate limiter and retry counters"""
+    return jsonify({'success': True, 'upstream': get_upstream_stats()})
+
+@bp.route('/cache/purge', methods=['POST'])
+@admin_required
+def cache_purge():
+    """Purge one cached AI response by key, or the whole cache"""
+    try:
+        data = request.get_json(silent=True) or {}
+        response_cache.purge(data.get('key'))
+        if not data.get('key'):
+            # Otherwise purged results would keep being served to reworded copies
+            near_duplicates.clear()
+        return jsonify({'success': True, 'cache': response_cache.get_stats()})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/metrics', methods=['GET'])
+@scrape_allowed
+def prometheus_metrics():
+    """Latency histograms, cache, retry and parse counters in Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: warmed up and not shutting down, so the load balancer may send traffic"""
+    ready = lifecycle['warmed_up'] and not lifecycle['draining']
+    body = {
+        'ready': ready,
+        'warmed_up': lifecycle['warmed_up'],
+        'draining': lifecycle['draining'],
+        'in_flight_gemini_calls': ai_helper.in_flight_calls(),
+        'circuit_breaker': ai_helper.circuit_breaker.get_stats()['state']
+    }
+    return jsonify(body), 200 if ready else 503
+
+def load_config():
+    """Flask settings from the environment"""
+    secret_key = os.environ.get('SECRET_KEY')
+    if not secret_key:
+        # Fine for one dev process; behind a load balancer every worker needs the same key
+        logger.warning("SECRET_KEY is not set; using a random key, so sessions won't survive restarts or span workers")
+        secret_key = os.urandom(24)
+    return {
+        'SECRET_KEY': secret_key,
+        'SESSION_COOKIE_SECURE': os.environ.get('SESSION_COOKIE_SECURE', '0') == '1',
+        'SESSION_COOKIE_HTTPONLY': True,
+        'SESSION_COOKIE_SAMESITE': 'Lax',
+        'WARMUP': os.environ.get('APP_WARMUP', '1') == '1',
+        'ADMIN_TOKEN': os.environ.get('ADMIN_TOKEN') or None,
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN') or None,
+        'WARMUP_CONNECTIONS': int(os.environ.get('APP_WARMUP_CONNECTIONS', 2)),
+    }
+
+def create_app(config=None):
+    """Build the Flask app; config overrides the environment (useful in tests)"""
+    app = Flask(__name__)
+    app.config.from_mapping(load_config())
+    if config:
+        app.config.update(config)
+    if not logging.getLogger().handlers:
+        # Gunicorn only configures its own loggers; give ours somewhere to go
+        logging.basicConfig(
+            level=os.environ.get('LOG_LEVEL', 'INFO'),
+            format='%(asctime)s %(name)s %(levelname)s %(message)s'
+        )
+    app.register_blueprint(bp)
+    if app.config['WARMUP']:
+        # In the background so a slow or unreachable upstream doesn't stall worker boot
+        threading.Thread(
+            target=warmup, args=(app.config['WARMUP_CONNECTIONS'],), name='warmup', daemon=True
+        ).start()
+    else:
+        lifecycle['warmed_up'] = True
+    return app
+
+def warmup(connections=2):
+    """Open Gemini connections and start job workers before traffic arrives"""
+    started = time.perf_counter()
+    try:
+        opened = ai_helper.warmup(connections)
+    except Exception as e:
+        # Not fatal: the pool opens connections on demand anyway
+        logger.warning("Gemini connection warmup failed: %s", e)
+        opened = 0
+    job_queue.start()
+    lifecycle['warmed_up'] = True
+    logger.info("Warmed up in %.0f ms (%d Gemini connections)", (time.perf_counter() - started) * 1000, opened)
+
+def begin_drain():
+    """Fail /readyz from now on so the load balancer stops sending new requests"""
+    lifecycle['draining'] = True
+
+def drain(timeout=30):
+    """Let background jobs and in-flight Gemini calls finish, up to timeout seconds"""
+    begin_drain()
+    deadline = time.monotonic() + timeout
+    job_queue.stop(timeout)
+    if not ai_helper.wait_for_in_flight(max(0.0, deadline - time.monotonic())):
+        logger.warning("Shutting down with %d Gemini calls still in flight", ai_helper.in_flight_calls())
+    ai_helper.get_client().close()
+    pdf_extractor.shutdown()
+
 if __name__ == '__main__':
-    # Create necessary directories
-    os.makedirs('templates', exist_ok=True)
-    os.makedirs('static', exist_ok=True)
-    os.makedirs('filters', exist_ok=True)
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py wsgi:app`
+    app = create_app()
+    
+    def on_sigterm(signum, frame):
+        drain(float(os.environ.get('SHUTDOWN_GRACE', 30)))
+        sys.exit(0)
+    
+    signal.signal(signal.SIGTERM, on_sigterm)
     
     print("=" * 60)
     print("🎓 Study Skills App Starting...")
     print("=" * 60)
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(
+        debug=os.environ.get('FLASK_DEBUG', '0') == '1',
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 5000))
+    )
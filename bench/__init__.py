@@ -0,0 +1,5 @@
+"""
+Bench - Offline throughput and latency benchmarks
+Runs the real app against a local fake Gemini that replays recorded replies;
+see `python -m bench --help`
+"""
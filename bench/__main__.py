@@ -0,0 +1,186 @@
+"""
+Bench runner - `python -m bench [--scenario NAME ...] [--output results.json]`
+Reports p50/p95/p99 latency, requests/s at a fixed concurrency and peak RSS as JSON
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from filters.fake_gemini import FakeGeminiServer
+
+from .replay import RECORDINGS_PATH, ReplayResponder, load_recordings
+from .scenarios import all_scenarios
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process plus its finished children (PDF workers)"""
+    total = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+             + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is kilobytes on Linux but bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(total / divisor, 1)
+
+
+def run_scenario(app, scenario, requests, concurrency, warmup):
+    local = threading.local()
+
+    def client():
+        # The test client keeps cookies, so each thread needs its own
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            ok = scenario.run(client(), i)
+        except Exception:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(-warmup, 0)))
+        started = time.perf_counter()
+        outcomes = list(executor.map(one, range(requests)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(ms for ms, _ in outcomes)
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, ok in outcomes if not ok),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+        'rps': round(requests / wall, 2),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline, current):
+    """Print per-scenario changes against a previous results file"""
+    print(f"{'scenario':<22} {'p50 ms':>16} {'p95 ms':>16} {'rps':>16}", file=sys.stderr)
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'rps'):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{result[key]:>8} ({change:+.0f}%)")
+        print(f"{name:<22} " + ' '.join(f"{cell:>16}" for cell in cells), file=sys.stderr)
+
+
+def main(argv=None):
+    scenarios = all_scenarios()
+    parser = argparse.ArgumentParser(prog='python -m bench', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=sorted(scenarios),
+                        help='scenario to run (repeatable; default: all)')
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per scenario')
+    parser.add_argument('--pdf-requests', type=int, default=5, help='timed requests per PDF scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed requests before each scenario')
+    parser.add_argument('--latency-ms', type=float, default=300.0, help='fake Gemini mean latency')
+    parser.add_argument('--jitter-ms', type=float, default=100.0, help='fake Gemini latency std deviation')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of fake Gemini calls that 503')
+    parser.add_argument('--recordings', default=RECORDINGS_PATH, help='recorded replies to serve')
+    parser.add_argument('--seed', type=int, default=1, help='seed for latency jitter')
+    parser.add_argument('--output', help='write JSON results here as well as to stdout')
+    parser.add_argument('--compare', help='previous results file to diff against')
+    args = parser.parse_args(argv)
+
+    responder = ReplayResponder(load_recordings(args.recordings), args.latency_ms, args.jitter_ms, args.seed)
+    fake = FakeGeminiServer(responder).start()
+    fake.failure_rate = args.failure_rate
+
+    # Must be in place before the app (and ai_helper) is imported
+    os.environ.update({
+        'GEMINI_BASE_URL': fake.base_url,
+        'GEMINI_API_KEY': os.environ.get('GEMINI_API_KEY') or 'bench',
+        'GEMINI_FAKE': '0',
+        'SESSION_BACKEND': 'memory',
+        'JOBS_BACKEND': 'memory',
+        'SECRET_KEY': 'bench',
+        'APP_WARMUP': '0',
+    })
+    os.environ.setdefault('GEMINI_CACHE_ENABLED', '0')
+    # Stored exercise sets persist across runs and would turn Yellow into a database read
+    os.environ.setdefault('CARDS_ENABLED', '0')
+    # Scenario texts differ only by a suffix, so they would all be near-duplicate hits
+    os.environ.setdefault('NEAR_DUP_ENABLED', '0')
+    # A handful of bench clients would otherwise exhaust their per-user quota
+    os.environ.setdefault('USER_RATE_LIMIT_RPM', '100000')
+    os.environ.setdefault('USER_RATE_LIMIT_BURST', '100000')
+    # Per-request timing lines would drown out the results
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as app_module
+    app = app_module.create_app({'TESTING': True})
+
+    results = {
+        'meta': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'scenarios': {},
+    }
+    try:
+        for name in args.scenario or scenarios:
+            scenario = scenarios[name]
+            if scenario.setup:
+                scenario.setup(app_module)
+            requests = args.pdf_requests if name.startswith('extract_pdf') else args.requests
+            upstream_before = fake.requests
+            result = run_scenario(app, scenario, requests, args.concurrency, args.warmup)
+            result['upstream_requests'] = fake.requests - upstream_before
+            results['scenarios'][name] = result
+            print(f"{name:<22} p50 {result['p50_ms']:>9} ms  p95 {result['p95_ms']:>9} ms  "
+                  f"{result['rps']:>8} req/s  errors {result['errors']}", file=sys.stderr)
+    finally:
+        fake.stop()
+    results['meta']['unmatched_prompts'] = responder.misses
+    results['meta']['peak_rss_mb'] = peak_rss_mb()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
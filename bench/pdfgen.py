@@ -0,0 +1,66 @@
+"""
+PDF Gen - Synthetic text PDFs of any page count
+Written by hand (no PDF library) so the benchmark needs nothing beyond the app's own dependencies
+"""
+
+PARAGRAPH = (
+    "Photosynthesis converts light energy into chemical energy stored in glucose. "
+    "Chlorophyll in the thylakoid membranes absorbs mostly red and blue light. "
+    "The light-dependent reactions split water, release oxygen and produce ATP and NADPH. "
+    "The Calvin cycle then uses that ATP and NADPH to fix carbon dioxide into sugars."
+)
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_stream(page_number, lines_per_page):
+    lines = [f"Page {page_number}"]
+    words = PARAGRAPH.split()
+    for i in range(lines_per_page):
+        # Rotate the paragraph so pages don't extract to identical text
+        start = (page_number * 7 + i * 11) % len(words)
+        lines.append(' '.join((words[start:] + words[:start])[:12]))
+    body = ["BT", "/F1 11 Tf", "14 TL", "72 740 Td"]
+    for line in lines:
+        body.append(f"({_escape(line)}) Tj T*")
+    body.append("ET")
+    return '\n'.join(body).encode('latin-1')
+
+
+def make_pdf(pages, lines_per_page=40, seed=0):
+    """Return the bytes of a valid PDF with `pages` pages of text; seed varies the content"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    page_tree = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for number in range(1, pages + 1):
+        stream = _page_stream(number + seed, lines_per_page)
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (page_tree, font, content)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % page_tree
+    objects[page_tree - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b' '.join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
@@ -0,0 +1,50 @@
+"""
+Replay - Answer fake Gemini requests from recorded replies
+A recording matches on the responseSchema's required keys (structured
+prompts) or on a substring of the prompt (free-text prompts)
+"""
+
+import json
+import os
+import random
+import time
+
+RECORDINGS_PATH = os.path.join(os.path.dirname(__file__), 'recordings.json')
+
+
+def load_recordings(path=RECORDINGS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['recordings']
+
+
+class ReplayResponder:
+    """Responder for FakeGeminiServer with per-request latency drawn around latency_ms"""
+
+    def __init__(self, recordings, latency_ms=0.0, jitter_ms=0.0, seed=None):
+        self.recordings = recordings
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.random = random.Random(seed)
+        self.misses = 0
+
+    def __call__(self, model, payload):
+        delay = max(0.0, self.random.gauss(self.latency_ms, self.jitter_ms)) if self.jitter_ms else self.latency_ms
+        if delay:
+            time.sleep(delay / 1000.0)
+        reply = self.match(payload)
+        if isinstance(reply, str):
+            return reply
+        return json.dumps(reply)
+
+    def match(self, payload):
+        prompt = payload['contents'][0]['parts'][0]['text']
+        schema = payload.get('generationConfig', {}).get('responseSchema') or {}
+        required = set(schema.get('required', []))
+        for recording in self.recordings:
+            if 'schema_keys' in recording:
+                if required and set(recording['schema_keys']) == required:
+                    return recording['response']
+            elif recording['prompt_contains'] in prompt:
+                return recording['response']
+        self.misses += 1
+        return f"No recording for prompt: {prompt[:80]}"
@@ -0,0 +1,84 @@
+"""
+Scenarios - One benchmarked operation each, driven through the Flask test client
+"""
+
+import io
+
+from .pdfgen import make_pdf
+
+FILTERS = ('blue', 'yellow', 'green', 'grey', 'purple', 'orange')
+PDF_PAGES = (10, 100, 500)
+
+SAMPLE_TEXT = """Photosynthesis
+
+Photosynthesis is the process by which green plants, algae and some bacteria convert light energy into chemical energy. The overall reaction combines carbon dioxide and water to produce glucose and oxygen, powered by sunlight absorbed by chlorophyll.
+
+Light-dependent reactions
+
+In the thylakoid membranes, chlorophyll absorbs light, mostly in the red and blue wavelengths. The absorbed energy splits water molecules, releasing oxygen as a by-product and driving an electron transport chain that produces ATP and NADPH.
+
+The Calvin cycle
+
+In the stroma, the enzyme RuBisCO fixes carbon dioxide onto ribulose bisphosphate. Using the ATP and NADPH from the light-dependent reactions, the resulting three-carbon molecules are reduced and eventually assembled into glucose, while ribulose bisphosphate is regenerated.
+
+Why it matters
+
+Photosynthesis supplies almost all of the chemical energy used by life on Earth and is the source of the oxygen in the atmosphere. Understanding its limiting factors, such as light intensity, carbon dioxide concentration and temperature, is central to agriculture and climate science.
+"""
+
+
+class Scenario:
+    """A named operation; run(client, i) returns True on success"""
+
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+
+def _ok(response):
+    return response.status_code == 200 and (response.get_json(silent=True) or {}).get('success', False)
+
+
+def filter_scenario(color):
+    def run(client, i):
+        # A per-request suffix keeps the response cache and coalescing from hiding upstream cost
+        text = f"{SAMPLE_TEXT}\nReview note {i}."
+        return _ok(client.post('/apply_filter', json={'text': text, 'filter': color}))
+    return Scenario(f'filter_{color}', run)
+
+
+def pdf_scenario(pages):
+    pdf = make_pdf(pages)
+
+    def setup(app_module):
+        from filters.response_cache import ResponseCache
+        # Every upload is the same file, so without this all but the first would be cache hits
+        app_module.pdf_extractor.cache = ResponseCache(enabled=False)
+
+    def run(client, i):
+        response = client.post(
+            '/extract_pdf',
+            data={'file': (io.BytesIO(pdf), f'bench-{pages}.pdf')},
+            content_type='multipart/form-data'
+        )
+        return _ok(response) and response.get_json()['pages'] == pages
+    return Scenario(f'extract_pdf_{pages}p', run, setup)
+
+
+def grey_flow_scenario():
+    def run(client, i):
+        started = client.post('/start_study_session', json={'text': f"{SAMPLE_TEXT}\nSession {i}.", 'duration': 25})
+        if not _ok(started):
+            return False
+        # The recorded unlock answer for the grey filter is "glucose"
+        unlocked = client.post('/check_unlock', json={'answer': 'glucose'})
+        return _ok(unlocked) and unlocked.get_json()['correct']
+    return Scenario('grey_session_flow', run)
+
+
+def all_scenarios():
+    scenarios = [filter_scenario(color) for color in FILTERS]
+    scenarios += [pdf_scenario(pages) for pages in PDF_PAGES]
+    scenarios.append(grey_flow_scenario())
+    return {scenario.name: scenario for scenario in scenarios}
@@ -1,65 +1,398 @@
 """
-AI Helper - Strictly Gemini 2.5 Flash
+AI Helper - Strictly Gemini 2.5 (Flash by default; per-filter tiers via model_router)
 """
 
 import os
-import json
-import urllib.request
-import urllib.parse
+import asyncio
+import contextvars
+import threading
 import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from .response_cache import ResponseCache, make_cache_key
+from .gemini_client import GeminiClient
+from .tokens import estimate_tokens, usage_tracker
+from .single_flight import SingleFlight
+from .fair_scheduler import current_caller, scheduler
+from .model_router import model_router, validate
+from .metrics import (
+    current_timings, gemini_cache, gemini_prompt_tokens, gemini_request_seconds, gemini_response_tokens,
+    gemini_retries
+)
+from .resilience import (
+    CircuitBreaker, GeminiBlockedError, GeminiConfigError, GeminiRateLimitError, TokenBucket,
+    backoff_delay, classify_error
+)
 
-def get_ai_response(prompt, max_retries=2):
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "maxOutputTokens": 4096,  # Increased for larger context
+}
+
+# Shared across every filter in this process; see GEMINI_CACHE_* env vars
+response_cache = ResponseCache.from_env()
+
+# Identical requests already in flight share one upstream call; a caller stops
+# waiting after GEMINI_FLIGHT_TIMEOUT seconds and calls Gemini itself
+ai_flight = SingleFlight(timeout=float(os.environ.get('GEMINI_FLIGHT_TIMEOUT', 90)))
+
+# Global quota limiter (GEMINI_RATE_LIMIT_RPM) and upstream health breaker
+rate_limiter = TokenBucket.from_env()
+circuit_breaker = CircuitBreaker.from_env()
+
+# How long a call may wait for a quota token, and the longest backoff worth sleeping
+RATE_LIMIT_WAIT = float(os.environ.get('GEMINI_RATE_LIMIT_WAIT', 5))
+MAX_RETRY_WAIT = float(os.environ.get('GEMINI_MAX_RETRY_WAIT', 10))
+
+retry_stats = {}
+_stats_lock = threading.Lock()
+
+_client = None
+_client_lock = threading.Lock()
+_fake_server = None
+
+# Gemini calls currently running, so shutdown can wait for them instead of cutting them off
+_in_flight = 0
+_in_flight_cond = threading.Condition()
+
+# Upper bound on Gemini requests one filter run may have in flight at once
+MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 4))
+
+# Blocking calls made from async code run here rather than in a throwaway
+# executor per event loop, so threads are reused across filter runs
+_io_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('GEMINI_POOL_SIZE', 8)),
+    thread_name_prefix='gemini-io'
+)
+
+def get_client():
     """
-    Get AI response using Google's Gemini 2.5 Flash API.
+    Return this worker's pooled Gemini client, creating it on first use.
+    With GEMINI_FAKE=1 the client talks to a local FakeGeminiServer instead.
+    """
+    global _client, _fake_server
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if fake_mode():
+                    from .fake_gemini import FakeGeminiServer
+                    _fake_server = FakeGeminiServer().start()
+                    _client = GeminiClient.from_env(base_url=_fake_server.base_url)
+                else:
+                    _client = GeminiClient.from_env()
+    return _client
+
+def warmup(connections=1):
+    """Create the client and pre-open pooled connections; returns how many were opened"""
+    if not fake_mode() and not os.environ.get('GEMINI_API_KEY'):
+        return 0
+    return get_client().warmup(connections)
+
+@contextmanager
+def _tracked():
+    global _in_flight
+    with _in_flight_cond:
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _in_flight_cond:
+            _in_flight -= 1
+            _in_flight_cond.notify_all()
+
+def in_flight_calls():
+    with _in_flight_cond:
+        return _in_flight
+
+def wait_for_in_flight(timeout):
+    """Block until no Gemini call is running or timeout passes; True if drained"""
+    with _in_flight_cond:
+        return _in_flight_cond.wait_for(lambda: _in_flight == 0, timeout)
+
+def fake_mode():
+    return os.environ.get('GEMINI_FAKE', '0') == '1'
+
+def generation_config(max_output_tokens=None, response_schema=None, temperature=None):
+    """
+    GENERATION_CONFIG, with maxOutputTokens and temperature set for the calling filter.
+    A response_schema switches Gemini to structured JSON output.
+    """
+    config = dict(GENERATION_CONFIG)
+    if max_output_tokens:
+        config['maxOutputTokens'] = max_output_tokens
+    if temperature is not None:
+        config['temperature'] = temperature
+    if response_schema:
+        config['responseMimeType'] = 'application/json'
+        config['responseSchema'] = response_schema
+    return config
+
+def record_usage(filter_name, prompt, text, usage=None):
+    """
+    Record token counts, preferring Gemini's usageMetadata over local estimates.
+    Returns (prompt_tokens, response_tokens).
+    """
+    usage = usage or {}
+    if 'promptTokenCount' in usage:
+        prompt_tokens, response_tokens = usage['promptTokenCount'], usage.get('candidatesTokenCount', 0)
+        usage_tracker.record(filter_name, prompt_tokens, response_tokens)
+    else:
+        prompt_tokens, response_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        usage_tracker.record(filter_name, prompt_tokens, response_tokens, estimated=True)
+    gemini_prompt_tokens.observe(prompt_tokens, filter=filter_name or 'unknown')
+    gemini_response_tokens.observe(response_tokens, filter=filter_name or 'unknown')
+    return prompt_tokens, response_tokens
+
+def get_ai_response(prompt, max_retries=2, use_cache=True, max_output_tokens=None, filter_name=None,
+                    response_schema=None, model_tiers=None, temperature=None):
+    """
+    Get AI response using Google's Gemini 2.5 API.
      STRICTLY AI ONLY - No rule-based fallbacks.
+    model_tiers is the filter's cascade, cheapest first: each tier's reply is
+    checked against response_schema and the next tier is tried only if it
+    fails (without a schema the first tier always answers).
+    Identical (model, prompt, config) requests are served from response_cache
+    unless use_cache is False. Token usage is recorded under filter_name.
+    Raises a GeminiError subclass when no usable response can be produced.
     """
-    api_key = os.environ.get('GEMINI_API_KEY', '')
-    
-    if not api_key:
-        return "Error: GEMINI_API_KEY not found in environment variables. Please set it to use the AI filters."
-    
-    # Retry logic for API stability
+    api_key = _require_api_key()
+
+    route = model_router.route(filter_name, model_tiers, temperature)
+    config = generation_config(max_output_tokens, response_schema, route.temperature)
+    for model in route.models[:-1]:
+        text = _get_model_response(model, prompt, config, api_key, max_retries, use_cache, filter_name)
+        if response_schema is None or validate(text, response_schema):
+            return text
+        model_router.record_escalation(filter_name, model)
+    return _get_model_response(route.models[-1], prompt, config, api_key, max_retries, use_cache, filter_name)
+
+def _get_model_response(model, prompt, config, api_key, max_retries, use_cache, filter_name):
+    """One model's reply, from the cache, a coalesced call or Gemini itself"""
+    cache_key = make_cache_key(model, prompt, config)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        gemini_cache.inc(filter=filter_name or 'unknown', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            return cached
+        # Charged before joining, so a coalesced caller pays its own way and a
+        # leader that is over quota fails alone instead of failing everyone
+        scheduler.charge(current_caller.get())
+        # Nothing cached yet, but an identical call may already be waiting on Gemini
+        return ai_flight.do(
+            cache_key,
+            lambda: _request_ai_response(model, prompt, config, cache_key, api_key, max_retries, True, filter_name)
+        )
+
+    scheduler.charge(current_caller.get())
+    return _request_ai_response(model, prompt, config, cache_key, api_key, max_retries, False, filter_name)
+
+def _request_ai_response(model, prompt, config, cache_key, api_key, max_retries, use_cache, filter_name):
+    """Call Gemini with typed retries and cache the successful result; the caller has been charged"""
+    with _tracked():
+        return _call_with_retries(model, prompt, config, cache_key, api_key, max_retries, use_cache, filter_name)
+
+def _call_with_retries(model, prompt, config, cache_key, api_key, max_retries, use_cache, filter_name):
+    data = {
+        "contents": [{
+            "parts": [{
+                "text": prompt
+            }]
+        }],
+        "generationConfig": config
+    }
+
+    caller, cost = current_caller.get(), estimate_tokens(prompt)
+    for attempt in range(max_retries + 1):
+        # Backoff sleeps happen outside the slot so other users' calls can use it
+        with scheduler.slot(caller, filter_name, cost):
+            trial = _admit()
+            started = time.perf_counter()
+            try:
+                # Reuses a pooled keep-alive connection when one is idle
+                result = get_client().generate(model, data, api_key)
+            except Exception as e:
+                error = classify_error(e)
+            except BaseException:
+                _abandon(trial)
+                raise
+            else:
+                error = None
+        if error is not None:
+            _record_attempt(filter_name, model, started, type(error).__name__)
+            circuit_breaker.record_failure(error)
+            _wait_before_retry(error, attempt, max_retries, filter_name)
+            continue
+        elapsed = _record_attempt(filter_name, model, started, 'ok')
+        circuit_breaker.record_success()
+
+        # Extract text from response
+        if 'candidates' in result and len(result['candidates']) > 0:
+            candidate = result['candidates'][0]
+            if 'content' in candidate and 'parts' in candidate['content']:
+                text = candidate['content']['parts'][0]['text']
+                tokens = record_usage(filter_name, prompt, text, result.get('usageMetadata'))
+                model_router.record(filter_name, model, elapsed, *tokens)
+                # Only real model output is cached, never errors
+                if use_cache:
+                    response_cache.set(cache_key, text)
+                return text
+
+        # If we get here but no content, maybe a safety filter blocked it?
+        raise GeminiBlockedError("AI Error: No content generated. The text might have triggered safety filters.")
+
+def stream_ai_response(prompt, max_retries=2, use_cache=True, max_output_tokens=None, filter_name=None,
+                       response_schema=None, model_tiers=None, temperature=None):
+    """
+    Yield the Gemini response incrementally via streamGenerateContent.
+    Failures before the first chunk are retried like get_ai_response; once
+    text has been yielded the error is raised, since the caller has partial output.
+    Streamed text can't be taken back, so this uses the last tier of the cascade.
+    """
+    api_key = _require_api_key()
+
+    route = model_router.route(filter_name, model_tiers, temperature)
+    model = route.models[-1]
+    config = generation_config(max_output_tokens, response_schema, route.temperature)
+    cache_key = make_cache_key(model, prompt, config)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        gemini_cache.inc(filter=filter_name or 'unknown', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            yield cached
+            return
+
+    scheduler.charge(current_caller.get())
+    with _tracked():
+        yield from _stream_with_retries(model, prompt, config, cache_key, api_key, max_retries, use_cache, filter_name)
+
+def _stream_with_retries(model, prompt, config, cache_key, api_key, max_retries, use_cache, filter_name):
+    data = {
+        "contents": [{
+            "parts": [{
+                "text": prompt
+            }]
+        }],
+        "generationConfig": config
+    }
+
+    caller, cost = current_caller.get(), estimate_tokens(prompt)
     for attempt in range(max_retries + 1):
-        try:
-            # Gemini 2.5 Flash API endpoint
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-            
-            # Prepare request
-            data = {
-                "contents": [{
-                    "parts": [{
-                        "text": prompt
-                    }]
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "maxOutputTokens": 4096,  # Increased for larger context
-                }
-            }
-            
-            # Make request
-            req = urllib.request.Request(
-                url,
-                data=json.dumps(data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                
-                # Extract text from response
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    candidate = result['candidates'][0]
-                    if 'content' in candidate and 'parts' in candidate['content']:
-                        return candidate['content']['parts'][0]['text']
-            
-            # If we get here but no content, maybe a safety filter blocked it?
-            return "AI Error: No content generated. The text might have triggered safety filters."
-
-        except Exception as e:
-            if attempt < max_retries:
-                time.sleep(1)  # tiny backoff
-                continue
-            return f"AI API Error: {str(e)}"
-    
-    return "AI Service Unavailable"
+        pieces = []
+        usage = None
+        with scheduler.slot(caller, filter_name, cost):
+            trial = _admit()
+            started = time.perf_counter()
+            try:
+                for event in get_client().stream(model, data, api_key):
+                    # The final event carries the totals for the whole response
+                    usage = event.get('usageMetadata', usage)
+                    for candidate in event.get('candidates', [])[:1]:
+                        for part in candidate.get('content', {}).get('parts', []):
+                            if part.get('text'):
+                                pieces.append(part['text'])
+                                yield part['text']
+            except Exception as e:
+                cause, error = e, classify_error(e)
+            except BaseException:
+                # GeneratorExit when the client disconnects mid-stream
+                _abandon(trial)
+                raise
+            else:
+                error = None
+        if error is not None:
+            _record_attempt(filter_name, model, started, type(error).__name__)
+            circuit_breaker.record_failure(error)
+            if pieces:
+                raise error from cause
+            _wait_before_retry(error, attempt, max_retries, filter_name)
+            continue
+        elapsed = _record_attempt(filter_name, model, started, 'ok')
+        circuit_breaker.record_success()
+
+        if not pieces:
+            raise GeminiBlockedError("AI Error: No content generated. The text might have triggered safety filters.")
+        tokens = record_usage(filter_name, prompt, ''.join(pieces), usage)
+        model_router.record(filter_name, model, elapsed, *tokens)
+        if use_cache:
+            response_cache.set(cache_key, ''.join(pieces))
+        return
+
+def _require_api_key():
+    api_key = os.environ.get('GEMINI_API_KEY', '')
+    if not api_key and not fake_mode():
+        raise GeminiConfigError("Error: GEMINI_API_KEY not found in environment variables. Please set it to use the AI filters.")
+    return api_key
+
+def _admit():
+    """
+    Wait briefly for a quota token, then fail fast while the breaker is open.
+    The quota comes first so a rate-limited call never holds the half-open
+    trial. Returns True if this call is the breaker's trial.
+    """
+    if not rate_limiter.acquire(timeout=RATE_LIMIT_WAIT):
+        raise GeminiRateLimitError(
+            "AI request quota exhausted; please try again shortly",
+            retry_after=rate_limiter.time_until_available()
+        )
+    return circuit_breaker.before_call()
+
+def _abandon(trial):
+    """An attempt was interrupted before it had an outcome; free the breaker's trial if it held it"""
+    if trial:
+        circuit_breaker.abandon_trial()
+
+def _record_attempt(filter_name, model, started, outcome):
+    """Observe one upstream attempt's latency, globally and for the current request; returns it"""
+    elapsed = time.perf_counter() - started
+    gemini_request_seconds.observe(elapsed, filter=filter_name or 'unknown', model=model, outcome=outcome)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add('gemini', elapsed)
+    return elapsed
+
+def _wait_before_retry(error, attempt, max_retries, filter_name=None):
+    """Sleep before the next attempt, or raise if the error should not be retried"""
+    if not error.retryable or attempt >= max_retries:
+        raise error
+    delay = backoff_delay(attempt, error.retry_after)
+    if delay > MAX_RETRY_WAIT:
+        # Holding a worker thread this long is worse than failing now
+        raise error
+    with _stats_lock:
+        retry_stats[type(error).__name__] = retry_stats.get(type(error).__name__, 0) + 1
+    gemini_retries.inc(filter=filter_name or 'unknown', error=type(error).__name__)
+    time.sleep(delay)
+
+def get_upstream_stats():
+    """Breaker state, limiter tokens and retry counts for monitoring"""
+    with _stats_lock:
+        retries = dict(retry_stats)
+    return {
+        'circuit_breaker': circuit_breaker.get_stats(),
+        'rate_limiter': rate_limiter.get_stats(),
+        'scheduler': scheduler.get_stats(),
+        'retries': retries,
+        'in_flight': in_flight_calls(),
+        'client': get_client().get_stats()
+    }
+
+async def get_ai_response_async(prompt, **kwargs):
+    """
+    Awaitable get_ai_response. The request itself still goes through the
+    pooled client, on a shared I/O thread, so the event loop stays free.
+    """
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry contextvars over, so the request's timings would be lost
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_io_executor, lambda: context.run(get_ai_response, prompt, **kwargs))
+
+async def gather_bounded(*aws, limit=None, return_exceptions=False):
+    """Await several coroutines concurrently, at most `limit` at a time"""
+    # Created per call: asyncio primitives are bound to the loop that first uses them
+    semaphore = asyncio.Semaphore(limit or MAX_CONCURRENCY)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=return_exceptions)
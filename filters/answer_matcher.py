@@ -0,0 +1,245 @@
+"""
+Answer Matcher - Offline grading for Grey unlock answers
+Tokenizes, stems and canonicalizes synonyms, then allows small typos, so
+"mitochondrion" matches "mitochondria" without asking the model
+"""
+
+import json
+import math
+import os
+import re
+import zlib
+from collections import namedtuple
+from functools import lru_cache
+
+TOKEN = re.compile(r"[a-z0-9]+")
+NON_WORD = re.compile(r"[^a-z0-9\s]+")
+SPACES = re.compile(r"\s+")
+
+STOP_WORDS = frozenset((
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'is', 'are', 'was', 'were', 'be', 'been', 'it', 'its', 'this', 'that', 'these', 'those',
+    'as', 'from', 'into', 'which', 'what', 'who', 'they', 'their', 'called', 'known',
+))
+
+# Plurals and forms suffix rules get wrong; both sides map to one spelling
+IRREGULAR = {
+    'mitochondria': 'mitochondrion', 'bacteria': 'bacterium', 'criteria': 'criterion',
+    'phenomena': 'phenomenon', 'data': 'datum', 'media': 'medium', 'strata': 'stratum',
+    'nuclei': 'nucleus', 'fungi': 'fungus', 'cacti': 'cactus', 'stimuli': 'stimulus', 'alveoli': 'alveolus',
+    'analyses': 'analysis', 'hypotheses': 'hypothesis', 'theses': 'thesis', 'crises': 'crisis',
+    'axes': 'axis', 'indices': 'index', 'matrices': 'matrix', 'vertices': 'vertex', 'appendices': 'appendix',
+    'children': 'child', 'people': 'person', 'men': 'man', 'women': 'woman', 'mice': 'mouse',
+    'teeth': 'tooth', 'feet': 'foot', 'geese': 'goose', 'leaves': 'leaf', 'lives': 'life',
+    'went': 'go', 'gone': 'go', 'made': 'make', 'took': 'take', 'taken': 'take', 'grew': 'grow', 'grown': 'grow',
+}
+
+# Multi-word terms folded into one token before tokenizing
+PHRASES = {
+    'carbon dioxide': 'co2', 'adenosine triphosphate': 'atp', 'deoxyribonucleic acid': 'dna',
+    'ribonucleic acid': 'rna', 'united states': 'usa', 'united kingdom': 'uk',
+    'world war two': 'ww2', 'world war ii': 'ww2', 'world war 2': 'ww2',
+}
+
+SYNONYM_GROUPS = (
+    ('big', 'large', 'huge', 'great'),
+    ('small', 'little', 'tiny'),
+    ('increase', 'rise', 'grow', 'gain'),
+    ('decrease', 'decline', 'drop', 'fall', 'reduce', 'lower'),
+    ('fast', 'quick', 'rapid'),
+    ('slow', 'gradual'),
+    ('begin', 'start', 'commence'),
+    ('end', 'finish', 'stop'),
+    ('make', 'produce', 'create', 'generate'),
+    ('use', 'utilize', 'employ'),
+    ('show', 'demonstrate', 'display'),
+    ('energy', 'power'),
+    ('one', '1'), ('two', '2'), ('three', '3'), ('four', '4'), ('five', '5'),
+    ('six', '6'), ('seven', '7'), ('eight', '8'), ('nine', '9'), ('ten', '10'),
+)
+
+# Longest first so e.g. "ational" wins over "al"
+SUFFIXES = (
+    ('ational', 'ate'), ('ization', 'ize'), ('fulness', 'ful'), ('ousness', 'ous'), ('iveness', 'ive'),
+    ('ations', 'ate'), ('ation', 'ate'), ('ingly', ''), ('ments', ''), ('ment', ''), ('ness', ''),
+    ('ies', 'y'), ('ied', 'y'), ('ing', ''), ('edly', ''), ('ed', ''), ('ly', ''),
+    ('ches', 'ch'), ('shes', 'sh'), ('sses', 'ss'), ('xes', 'x'), ('zes', 'z'), ('es', 'e'), ('s', ''),
+)
+
+MatchResult = namedtuple('MatchResult', 'correct score matched missing')
+
+
+@lru_cache(maxsize=16384)
+def stem(word):
+    """Light suffix-stripping stemmer; keeps at least three characters of the word"""
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith(('ss', 'us', 'is')):
+        return word
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            # "running" -> "runn" -> "run"
+            if suffix in ('ing', 'ed') and word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+            break
+    return word
+
+
+def within_edits(a, b, limit):
+    """True if the Levenshtein distance between a and b is at most limit (banded, exits early)"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if a == b:
+        return True
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        low = limit + 1
+        for j, cb in enumerate(b, start=1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            low = min(low, current[j])
+        if low > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def edit_tolerance(token):
+    # Short words must match exactly; "cell" vs "call" is a different answer
+    if len(token) >= 9:
+        return 2
+    if len(token) >= 5:
+        return 1
+    return 0
+
+
+# Typos rarely touch the start of a word, and terms that differ only there are
+# often opposites (exothermic/endothermic, afferent/efferent)
+FIXED_LEADING = 3
+
+# Opposite prefixes that share those leading letters, so the check above lets
+# them through; pairs like exo/endo already differ there
+OPPOSITE_PREFIXES = (('hyper', 'hypo'), ('intra', 'inter'))
+
+
+def is_typo_of(term, token):
+    """True if token is term with a few typing slips, never a prefix-swapped opposite"""
+    limit = edit_tolerance(term)
+    if not limit or term[:FIXED_LEADING] != token[:FIXED_LEADING]:
+        return False
+    for a, b in OPPOSITE_PREFIXES:
+        if (term.startswith(a) and token.startswith(b)) or (term.startswith(b) and token.startswith(a)):
+            return False
+    return within_edits(term, token, limit)
+
+
+class AnswerMatcher:
+    """Grades a free-text answer against the expected one, entirely offline"""
+
+    def __init__(self, threshold=0.6, synonym_groups=SYNONYM_GROUPS, phrases=None,
+                 embedding_threshold=0.0, embedding_dims=256, cache_size=4096):
+        self.threshold = threshold
+        self.phrases = dict(PHRASES, **(phrases or {}))
+        self.phrase_pattern = re.compile(
+            r'\b(' + '|'.join(re.escape(p) for p in sorted(self.phrases, key=len, reverse=True)) + r')\b'
+        )
+        self.canonical = {}
+        for group in synonym_groups:
+            canonical = stem(group[0])
+            for word in group:
+                self.canonical[stem(word)] = canonical
+        # 0 disables the hashed n-gram similarity fallback
+        self.embedding_threshold = embedding_threshold
+        self.embedding_dims = embedding_dims
+        self.match_normalized = lru_cache(maxsize=cache_size)(self._match_normalized)
+
+    @classmethod
+    def from_env(cls):
+        """
+        ANSWER_MATCH_THRESHOLD: share of expected terms the answer must cover.
+        ANSWER_SYNONYMS_PATH: JSON {"groups": [[...]], "phrases": {...}} added to the built-ins.
+        ANSWER_EMBEDDING_THRESHOLD: cosine similarity that also passes (0 = off).
+        """
+        groups, phrases = list(SYNONYM_GROUPS), {}
+        path = os.environ.get('ANSWER_SYNONYMS_PATH')
+        if path:
+            with open(path, encoding='utf-8') as f:
+                extra = json.load(f)
+            groups += [tuple(group) for group in extra.get('groups', [])]
+            phrases = extra.get('phrases', {})
+        return cls(
+            threshold=float(os.environ.get('ANSWER_MATCH_THRESHOLD', 0.6)),
+            synonym_groups=groups,
+            phrases=phrases,
+            embedding_threshold=float(os.environ.get('ANSWER_EMBEDDING_THRESHOLD', 0))
+        )
+
+    def normalize(self, text):
+        """Lowercase, strip punctuation and collapse whitespace; the cache key for an answer"""
+        return SPACES.sub(' ', NON_WORD.sub(' ', (text or '').lower())).strip()
+
+    def terms(self, normalized):
+        """Content terms of normalized text: phrases folded, stop words dropped, stemmed, synonyms merged"""
+        folded = self.phrase_pattern.sub(lambda m: self.phrases[m.group(1)], normalized)
+        terms = []
+        for token in TOKEN.findall(folded):
+            if token in STOP_WORDS:
+                continue
+            term = stem(token)
+            terms.append(self.canonical.get(term, term))
+        return terms
+
+    def match(self, user_answer, correct_answer):
+        """MatchResult for an answer; repeated (expected, answer) pairs come from the cache"""
+        return self.match_normalized(self.normalize(correct_answer), self.normalize(user_answer))
+
+    def is_correct(self, user_answer, correct_answer):
+        if not user_answer or not correct_answer:
+            return False
+        return self.match(user_answer, correct_answer).correct
+
+    def get_stats(self):
+        info = self.match_normalized.cache_info()
+        return {'cache_hits': info.hits, 'cache_misses': info.misses, 'cache_size': info.currsize}
+
+    def _match_normalized(self, correct, answer):
+        expected = list(dict.fromkeys(self.terms(correct)))
+        given = set(self.terms(answer))
+        if not expected or not given:
+            return MatchResult(False, 0.0, (), tuple(expected))
+
+        matched, missing = [], []
+        for term in expected:
+            if term in given or any(is_typo_of(term, g) for g in given):
+                matched.append(term)
+            else:
+                missing.append(term)
+        score = len(matched) / len(expected)
+        correct_enough = score >= self.threshold
+
+        if not correct_enough and self.embedding_threshold:
+            similarity = self._similarity(' '.join(expected), ' '.join(given))
+            score = max(score, similarity)
+            correct_enough = similarity >= self.embedding_threshold
+        return MatchResult(correct_enough, round(score, 3), tuple(matched), tuple(missing))
+
+    def _embed(self, text):
+        """Hashed character-trigram vector, L2-normalized; a crude CPU-only sentence embedding"""
+        vector = {}
+        for word in text.split():
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                slot = zlib.crc32(padded[i:i + 3].encode('utf-8')) % self.embedding_dims
+                vector[slot] = vector.get(slot, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {slot: v / norm for slot, v in vector.items()}
+
+    def _similarity(self, a, b):
+        va, vb = self._embed(a), self._embed(b)
+        return sum(v * vb.get(slot, 0.0) for slot, v in va.items())
+
+
+answer_matcher = AnswerMatcher.from_env()
@@ -0,0 +1,237 @@
+"""
+Base Filter - Shared sync/async and streaming entry points
+Filters implement process_chunk_async (or just build_prompt/parse_response);
+long documents are fanned out over chunks and merged with reduce_results
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .ai_helper import MAX_CONCURRENCY, get_ai_response, get_ai_response_async, stream_ai_response
+from .document import MAX_CHUNKS, Document, coverage, fan_out, spread
+from .json_extract import extract_json, parse_stats
+from .resilience import GeminiError
+from .json_stream import JSONStreamParser
+from .metrics import filter_seconds, timed_stage
+from .model_router import matches_schema
+from .tokens import get_budget
+
+
+class BaseFilter:
+    # Filter color; selects the token budget from tokens.DEFAULT_BUDGETS
+    name = None
+    # How many chunks one run may use (None means DOCUMENT_MAX_CHUNKS)
+    max_chunks = None
+    # False for filters that work on the whole document in process_async themselves
+    fans_out = True
+    # False for filters whose output should differ between runs (no caching or coalescing)
+    cache_responses = True
+    # False for filters whose result is tied to the exact input (e.g. character
+    # offsets), so a reworded near-duplicate text must not be served it
+    reuse_near_duplicates = True
+    # Gemini responseSchema for single-prompt JSON filters; enables structured output
+    response_schema = None
+    # Model tiers to try, cheapest first (see model_router.TIERS); later tiers only
+    # answer when an earlier reply fails response_schema
+    model_tiers = ('flash',)
+    # Sampling temperature; None keeps ai_helper.GENERATION_CONFIG's
+    temperature = None
+    # Multi-prompt filters fold their prompts into one call unless FILTER_PROMPT_MODE=multi
+    combined_prompts = os.environ.get('FILTER_PROMPT_MODE', 'combined') != 'multi'
+
+    @property
+    def budget(self):
+        return get_budget(self.name)
+
+    @property
+    def chunk_tokens(self):
+        """Token budget for one chunk of input text"""
+        return self.budget.input_tokens
+
+    def ai_options(self):
+        """Keyword arguments sizing and attributing this filter's model calls"""
+        options = {
+            'max_output_tokens': self.budget.output_tokens,
+            'filter_name': self.name,
+            'model_tiers': self.model_tiers,
+            'temperature': self.temperature,
+        }
+        if self.response_schema is not None:
+            options['response_schema'] = self.response_schema
+        return options
+
+    def process(self, text, mode='normal'):
+        """Blocking entry point used by the Flask routes"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = run_sync(self.process_async(text, mode=mode))
+            outcome = 'ok'
+            return result
+        finally:
+            filter_seconds.observe(time.perf_counter() - started, filter=self.name or 'unknown', outcome=outcome)
+
+    async def process_async(self, text, mode='normal'):
+        """Run the filter over the whole document, chunk by chunk"""
+        return await fan_out(self, text, mode=mode)
+
+    async def process_chunk_async(self, text, mode='normal'):
+        """Single-prompt filters only need build_prompt and parse_response"""
+        with timed_stage('prompt_build', self.name):
+            prompt = self.build_prompt(text, mode)
+        response_text = await get_ai_response_async(prompt, **self.ai_options())
+        repair_prompt = self._repair_prompt(response_text)
+        if repair_prompt is not None:
+            try:
+                repaired = await get_ai_response_async(repair_prompt, **self.ai_options())
+            except GeminiError:
+                repaired = ''
+            response_text = self._check_repair(response_text, repaired)
+        with timed_stage('parse', self.name):
+            return self.parse_response(response_text, mode)
+
+    def build_prompt(self, text, mode='normal'):
+        """Return the filter's single JSON prompt, or None for multi-step filters"""
+        return None
+
+    def parse_response(self, response_text, mode='normal'):
+        raise NotImplementedError
+
+    def is_reusable(self, result):
+        """
+        True if result may be served for a near-duplicate text: a complete
+        answer that satisfies response_schema, not a fallback or partial result
+        """
+        if not self.reuse_near_duplicates or not isinstance(result, dict) or result.get('error'):
+            return False
+        covered = result.get('coverage')
+        if isinstance(covered, dict) and covered.get('failed'):
+            return False
+        return self.response_schema is None or matches_schema(result, self.response_schema)
+
+    def select_chunks(self, chunks, limit):
+        """Choose which chunks to send; by default an even spread over the document"""
+        return spread(chunks, limit)
+
+    def reduce_results(self, results, mode='normal'):
+        """Merge per-chunk results into one; filters override with their own merge"""
+        return results[0]
+
+    def stream(self, text, mode='normal'):
+        """
+        Yield (event, data) pairs while the result is produced:
+        'delta' for raw model text and 'item' for each completed JSON sub-object
+        on single-chunk input, 'chunk' for each finished chunk on longer input,
+        then a final 'result'.
+        """
+        if not self.fans_out:
+            yield 'result', self.process(text, mode=mode)
+            return
+
+        all_chunks = Document(text).chunks(self.chunk_tokens)
+        chunks = self.select_chunks(all_chunks, self.max_chunks or MAX_CHUNKS) if all_chunks else []
+        if len(chunks) > 1:
+            yield from self._stream_chunks(chunks, mode, len(all_chunks))
+            return
+
+        covered = coverage(len(all_chunks) or 1, 1)
+        chunk_text = chunks[0].text if chunks else text
+        prompt = self.build_prompt(chunk_text, mode)
+        if prompt is None:
+            yield 'result', _with_coverage(run_sync(self.process_chunk_async(chunk_text, mode=mode)), covered)
+            return
+
+        parser = JSONStreamParser()
+        pieces = []
+        for piece in stream_ai_response(prompt, **self.ai_options()):
+            pieces.append(piece)
+            yield 'delta', {'text': piece}
+            for path, value in parser.feed(piece):
+                yield 'item', {'path': list(path), 'value': value}
+        response_text = ''.join(pieces)
+        repair_prompt = self._repair_prompt(response_text)
+        if repair_prompt is not None:
+            try:
+                repaired = get_ai_response(repair_prompt, **self.ai_options())
+            except GeminiError:
+                repaired = ''
+            response_text = self._check_repair(response_text, repaired)
+        yield 'result', _with_coverage(self.parse_response(response_text, mode), covered)
+
+    def _repair_prompt(self, response_text):
+        """
+        Return a prompt asking the model to fix its reply when that reply is not
+        parseable JSON, or None when no repair is needed (or none is possible).
+        """
+        if self.response_schema is None:
+            return None
+        try:
+            extract_json(response_text)
+            return None
+        except ValueError:
+            parse_stats.record(self.name, 'failed')
+        if '{' not in response_text:
+            # No JSON attempt at all (e.g. an upstream error message); nothing to repair
+            return None
+        return (
+            "The text below was meant to be a single JSON object matching this schema, "
+            "but it is not valid JSON. Return ONLY the corrected JSON object.\n\n"
+            f"SCHEMA:\n{json.dumps(self.response_schema)}\n\nTEXT:\n{response_text}"
+        )
+
+    def _check_repair(self, original, repaired):
+        """Use the repaired reply if it parses, otherwise keep the original"""
+        try:
+            extract_json(repaired)
+        except ValueError:
+            parse_stats.record(self.name, 'repair_failed')
+            return original
+        parse_stats.record(self.name, 'repaired')
+        return repaired
+
+    def _stream_chunks(self, chunks, mode, total):
+        """Like fan_out, but yielding each chunk's result (or 'chunk_error') as it finishes"""
+        results = [None] * len(chunks)
+        errors = []
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENCY, len(chunks))) as executor:
+            # Copied context keeps the caller's quota and timings attached on the pool threads
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run, run_sync, self.process_chunk_async(chunk.text, mode=mode)
+                ): position
+                for position, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                position = futures[future]
+                try:
+                    results[position] = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    yield 'chunk_error', {
+                        'index': chunks[position].index,
+                        'section': chunks[position].section,
+                        'error': str(e)
+                    }
+                    continue
+                yield 'chunk', {
+                    'index': chunks[position].index,
+                    'section': chunks[position].section,
+                    'result': results[position]
+                }
+        succeeded = [result for result in results if result is not None]
+        if not succeeded:
+            raise errors[0]
+        result = succeeded[0] if len(succeeded) == 1 else self.reduce_results(succeeded, mode=mode)
+        yield 'result', _with_coverage(result, coverage(total, len(succeeded), len(errors)))
+
+
+def _with_coverage(result, covered):
+    return dict(result, coverage=covered) if isinstance(result, dict) else result
+
+
+def run_sync(coro):
+    """Run a coroutine to completion from synchronous code"""
+    return asyncio.run(coro)
@@ -3,19 +3,41 @@ Blue Filter - Metacognition
 Applies Bloom's Taxonomy to generate questions using Gemini 2.5 Flash
 """
 
-import json
-import re
-from .ai_helper import get_ai_response
+from .base import BaseFilter
+from .json_extract import extract_json
 
-class MetacognitionFilter:
-    def process(self, text, mode='normal'):
+BLOOM_LEVELS = ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]
+
+# Summary of a result the model produced nothing usable for
+FAILED_SUMMARY = "AI generation failed."
+
+class MetacognitionFilter(BaseFilter):
+    name = 'blue'
+    # Bloom analysis is the hardest prompt; it stays on the full model
+    model_tiers = ('flash',)
+    temperature = 0.4
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "concepts": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "questions": {
+                "type": "OBJECT",
+                "properties": {level: {"type": "STRING"} for level in BLOOM_LEVELS},
+                "required": BLOOM_LEVELS
+            },
+            "summary": {"type": "STRING"}
+        },
+        "required": ["concepts", "questions", "summary"]
+    }
+    
+    def build_prompt(self, text, mode='normal'):
         """Generate Bloom's Taxonomy questions from text using purely AI"""
         
-        prompt = f"""
+        return f"""
         Analyze the following study text and apply Bloom's Taxonomy.
         
         TEXT:
-        {text[:4000]}
+        {text}
         
         TASK:
         1. Identify 5-7 key concepts.
@@ -37,23 +59,48 @@ class MetacognitionFilter:
             "summary": "Brief summary text..."
         }}
         """
-        
-        response_text = get_ai_response(prompt)
-        
-        # Clean up JSON if AI adds markdown blocks
-        clean_json = response_text.replace('```json', '').replace('```', '').strip()
-        
+    
+    def parse_response(self, response_text, mode='normal'):
+        """Turn the model's JSON reply into the Blue result"""
         try:
-            result = json.loads(clean_json)
+            # Tolerates markdown fences, preambles and trailing prose
+            result = extract_json(response_text)
             # Ensure keys exist
             if 'concepts' not in result: result['concepts'] = []
             if 'questions' not in result: result['questions'] = {}
             if 'summary' not in result: result['summary'] = "Analysis complete."
             return result
-        except json.JSONDecodeError:
+        except ValueError:
             # Fallback if valid JSON wasn't returned (should be rare with 2.5 Flash)
             return {
                 "concepts": ["Error parsing AI response"],
                 "questions": {"Error": "Could not generate structured questions. Please try again."},
-                "summary": "AI generation failed."
+                "summary": FAILED_SUMMARY
             }
+    
+    def is_reusable(self, result):
+        return super().is_reusable(result) and result.get('summary') != FAILED_SUMMARY
+    
+    def reduce_results(self, results, mode='normal'):
+        """Merge per-chunk analyses: dedupe concepts, pool questions per Bloom level"""
+        concepts, seen = [], set()
+        all_questions = {}
+        summaries = []
+        for result in results:
+            for concept in result.get('concepts', []):
+                if isinstance(concept, str) and concept.lower() not in seen:
+                    seen.add(concept.lower())
+                    concepts.append(concept)
+            for level, question in result.get('questions', {}).items():
+                if level != 'Error':
+                    all_questions.setdefault(level, []).append(question)
+            if result.get('summary') and result['summary'] != FAILED_SUMMARY:
+                summaries.append(result['summary'])
+        
+        return {
+            "concepts": concepts[:12],
+            # One question per level keeps the page layout; the rest stay available
+            "questions": {level: questions[0] for level, questions in all_questions.items()} or results[0].get('questions', {}),
+            "all_questions": all_questions,
+            "summary": ' '.join(summaries) or FAILED_SUMMARY
+        }
@@ -0,0 +1,278 @@
+"""
+Card Store - Spaced repetition for Memory Mastery blanks
+Every generated blank becomes a card scheduled with SM-2; the exercise set is
+kept too, so re-running the Yellow filter on known text needs no Gemini call
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DAY = 24 * 3600
+
+BLANK_MARKER = re.compile(r'\[BLANK_(\d+)\]')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def card_id(digest, level, answer):
+    # Keyed by answer rather than position, so a rephrased exercise keeps its schedule
+    return hashlib.sha1(f"{digest}:{level}:{answer.strip().lower()}".encode('utf-8')).hexdigest()[:20]
+
+
+def sm2(ease, interval, repetitions, grade):
+    """
+    One SM-2 step. grade is 0-5 (below 3 is a lapse); returns the new
+    (ease, interval_days, repetitions)
+    """
+    if grade < 3:
+        repetitions, interval = 0, 1.0
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1.0
+        elif repetitions == 2:
+            interval = 6.0
+        else:
+            interval = round(interval * ease, 1)
+    ease = max(1.3, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    return ease, interval, repetitions
+
+
+def blank_context(exercise_text, number, blanks):
+    """The sentence holding BLANK_number, with that blank shown as ____ and the others filled in"""
+    def fill(match):
+        n = int(match.group(1))
+        if n == number:
+            return '____'
+        return blanks[n - 1]['answer'] if 0 < n <= len(blanks) else match.group(0)
+
+    marker = f"[BLANK_{number}]"
+    for sentence in SENTENCE_END.split(exercise_text):
+        if marker in sentence:
+            return BLANK_MARKER.sub(fill, sentence).strip()
+    return BLANK_MARKER.sub(fill, exercise_text).strip()
+
+
+class CardStore:
+    """
+    SQLite-backed exercise sets and SM-2 cards, indexed by due date. Exercise
+    sets are shared; each owner (caller id) has their own schedule for a card.
+    """
+
+    def __init__(self, path, rephrase_lapses=3):
+        self.path = path
+        # A card forgotten this many times in a row gets freshly worded by Gemini
+        self.rephrase_lapses = rephrase_lapses
+        self.local = threading.local()
+        # The file and schema are created on first use, so importing the app touches no disk
+        self.ready = False
+        self.ready_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build the store from CARDS_* environment variables; None when disabled"""
+        if os.environ.get('CARDS_ENABLED', '1') != '1':
+            return None
+        return cls(
+            os.environ.get('CARDS_DB_PATH', os.path.join('instance', 'cards.db')),
+            rephrase_lapses=int(os.environ.get('CARDS_REPHRASE_LAPSES', 3))
+        )
+
+    def _create_schema(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS exercise_sets ("
+            " text_hash TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        # Databases created before cards had owners: rebuild with the wider key,
+        # keeping the old cards under the anonymous owner
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(cards)")]
+        if columns and 'owner' not in columns:
+            conn.execute("ALTER TABLE cards RENAME TO cards_v1")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cards ("
+            " owner TEXT NOT NULL DEFAULT '',"
+            " id TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " level TEXT NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " hint TEXT,"
+            " context TEXT,"
+            " ease REAL NOT NULL DEFAULT 2.5,"
+            " interval REAL NOT NULL DEFAULT 0,"
+            " repetitions INTEGER NOT NULL DEFAULT 0,"
+            " lapses INTEGER NOT NULL DEFAULT 0,"
+            " due REAL NOT NULL,"
+            " last_reviewed REAL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (owner, id))"
+        )
+        if columns and 'owner' not in columns:
+            copied = ', '.join(columns)
+            conn.execute(f"INSERT INTO cards ({copied}) SELECT {copied} FROM cards_v1")
+            conn.execute("DROP TABLE cards_v1")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_due ON cards(owner, due)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_text ON cards(owner, text_hash)")
+        conn.commit()
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        if not self.ready:
+            with self.ready_lock:
+                if not self.ready:
+                    self._create_schema(conn)
+                    self.ready = True
+        return conn
+
+    def get_exercises(self, digest, owner=None):
+        """
+        The stored exercise set for a text, or None if it is new or owner needs
+        it rephrased. Only the cards of the current set count towards that, so
+        lapses on answers a rephrasing dropped don't keep the set stale.
+        A set that is reused gives owner cards for its blanks.
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT result FROM exercise_sets WHERE text_hash = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row['result'])
+        ids = [blank['card_id'] for _, _, _, blank in self._blanks(result) if blank.get('card_id')]
+        if ids:
+            marks = ', '.join('?' * len(ids))
+            stale = conn.execute(
+                f"SELECT 1 FROM cards WHERE owner = ? AND id IN ({marks}) AND lapses >= ? LIMIT 1",
+                (owner or '', *ids, self.rephrase_lapses)
+            ).fetchone()
+            if stale:
+                return None
+        self._add_cards(conn, digest, result, owner, rephrased=False)
+        conn.commit()
+        return result
+
+    def get_exercises_by_id(self, exercise_id):
+        """The stored set whose exercise_id (text hash prefix) matches, as last generated"""
+        # Prefix match as a range on the primary key, so it stays an index seek
+        row = self._connect().execute(
+            "SELECT result FROM exercise_sets WHERE text_hash >= ? AND text_hash < ? LIMIT 1",
+            (exercise_id, exercise_id + 'g')
+        ).fetchone()
+        return json.loads(row['result']) if row else None
+
+    def save_exercises(self, digest, result, owner=None):
+        """
+        Store a generated exercise set and make owner a card for each blank.
+        Cards that already exist keep their schedule; a rephrased one has its
+        lapse streak cleared. Returns the result annotated with exercise_id and card ids.
+        """
+        conn = self._connect()
+        result = dict(result, exercise_id=digest[:16])
+        for level, _, _, blank in self._blanks(result):
+            blank['card_id'] = card_id(digest, level, blank['answer'])
+        self._add_cards(conn, digest, result, owner, rephrased=True)
+        conn.execute(
+            "INSERT OR REPLACE INTO exercise_sets (text_hash, result, created_at) VALUES (?, ?, ?)",
+            (digest, json.dumps(result), time.time())
+        )
+        conn.commit()
+        return result
+
+    def _blanks(self, result):
+        """(level, number, exercise, blank) for every blank with an answer"""
+        for level, exercise in result.get('exercises', {}).items():
+            if not isinstance(exercise, dict):
+                continue
+            for number, blank in enumerate(exercise.get('blanks', []), start=1):
+                if isinstance(blank, dict) and blank.get('answer'):
+                    yield level, number, exercise, blank
+
+    def _add_cards(self, conn, digest, result, owner, rephrased):
+        now = time.time()
+        on_conflict = (
+            " ON CONFLICT(owner, id) DO UPDATE SET hint = excluded.hint, context = excluded.context, lapses = 0"
+            if rephrased else " ON CONFLICT(owner, id) DO NOTHING"
+        )
+        for level, number, exercise, blank in self._blanks(result):
+            if not blank.get('card_id'):
+                continue
+            conn.execute(
+                "INSERT INTO cards (owner, id, text_hash, level, answer, hint, context, due, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)" + on_conflict,
+                (owner or '', blank['card_id'], digest, level, blank['answer'], blank.get('hint'),
+                 blank_context(exercise.get('text', ''), number, exercise['blanks']), now, now)
+            )
+
+    def due(self, owner=None, limit=20, now=None):
+        """owner's cards due for review, most overdue first (a range scan on idx_cards_due)"""
+        rows = self._connect().execute(
+            "SELECT * FROM cards WHERE owner = ? AND due <= ? ORDER BY due LIMIT ?",
+            (owner or '', now or time.time(), limit)
+        ).fetchall()
+        return [self._card(row) for row in rows]
+
+    def next_due(self, owner=None):
+        row = self._connect().execute("SELECT MIN(due) FROM cards WHERE owner = ?", (owner or '',)).fetchone()
+        return row[0]
+
+    def review(self, card_id, grade, owner=None, now=None):
+        """
+        Apply a 0-5 recall grade to owner's card; returns the updated card, or
+        None if unknown. A card owner hasn't seen yet (the exercise set came from
+        another caller's run) is added to their schedule first.
+        """
+        now = now or time.time()
+        owner = owner or ''
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM cards WHERE owner = ? AND id = ?", (owner, card_id)).fetchone()
+        if row is None:
+            added = conn.execute(
+                "INSERT INTO cards (owner, id, text_hash, level, answer, hint, context, due, created_at)"
+                " SELECT ?, id, text_hash, level, answer, hint, context, ?, ? FROM cards WHERE id = ? LIMIT 1",
+                (owner, now, now, card_id)
+            )
+            if not added.rowcount:
+                return None
+            row = conn.execute("SELECT * FROM cards WHERE owner = ? AND id = ?", (owner, card_id)).fetchone()
+        ease, interval, repetitions = sm2(row['ease'], row['interval'], row['repetitions'], grade)
+        lapses = row['lapses'] + 1 if grade < 3 else 0
+        conn.execute(
+            "UPDATE cards SET ease = ?, interval = ?, repetitions = ?, lapses = ?, due = ?, last_reviewed = ?"
+            " WHERE owner = ? AND id = ?",
+            (ease, interval, repetitions, lapses, now + interval * DAY, now, owner, card_id)
+        )
+        conn.commit()
+        return self._card(conn.execute("SELECT * FROM cards WHERE owner = ? AND id = ?", (owner, card_id)).fetchone())
+
+    def get_stats(self):
+        conn = self._connect()
+        return {
+            'cards': conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0],
+            'due_now': conn.execute("SELECT COUNT(*) FROM cards WHERE due <= ?", (time.time(),)).fetchone()[0],
+            'exercise_sets': conn.execute("SELECT COUNT(*) FROM exercise_sets").fetchone()[0],
+        }
+
+    def _card(self, row):
+        card = dict(row)
+        card.pop('owner', None)
+        card['interval_days'] = card.pop('interval')
+        return card
+
+
+card_store = CardStore.from_env()
@@ -0,0 +1,239 @@
+"""
+Concept Graph - Local keyphrases and learning order for study text
+TF-IDF over a document's chunks picks each chunk's keyphrases; co-occurrence
+and first-mention order give weighted edges between them, and a topological
+sort of that graph orders the material, all without a model call
+"""
+
+import heapq
+import re
+
+import numpy as np
+
+from .answer_matcher import STOP_WORDS, stem
+
+WORD = re.compile(r"[a-z][a-z0-9'-]*[a-z0-9]|[a-z]")
+
+# Words too generic to be concepts on top of answer_matcher's stop words
+GENERIC_WORDS = frozenset((
+    'also', 'can', 'may', 'might', 'must', 'such', 'more', 'most', 'other', 'some', 'many', 'much',
+    'used', 'use', 'using', 'one', 'two', 'first', 'second', 'between', 'each', 'than', 'then', 'there',
+    'here', 'has', 'have', 'had', 'not', 'only', 'all', 'any', 'both', 'will', 'would', 'could',
+    'should', 'over', 'under', 'about', 'how', 'why', 'when', 'where', 'while', 'very', 'often', 'same',
+    'like', 'well', 'however', 'because', 'so', 'if', 'no', 'our', 'we', 'you', 'your', 'he', 'she',
+    'his', 'her', 'them', 'do', 'does', 'did', 'make', 'makes', 'made', 'called', 'example', 'way',
+    'ways', 'part', 'parts', 'almost', 'eventually', 'resulting', 'mostly', 'new', 'given', 'different',
+))
+SKIP = STOP_WORDS | GENERIC_WORDS
+
+# Multi-word phrases make better map labels than their single words
+PHRASE_BOOST = 1.3
+# Verb and adverb forms; fine inside a phrase ("limiting factors") but weak concepts alone
+VERBAL_ENDINGS = ('ing', 'ed', 'ly')
+
+
+class ConceptGraph:
+    """
+    Concepts (keyphrases) with weighted edges from an earlier-introduced
+    concept to a later one it co-occurs with
+    """
+
+    def __init__(self, labels, scores, first_chunks, chunk_sets, edges, keyphrases):
+        self.labels = labels
+        self.scores = scores
+        self.first_chunks = first_chunks
+        self.chunk_sets = chunk_sets
+        # (source, target, weight), source introduced before target
+        self.edges = edges
+        # Per chunk: its top keyphrase labels, best first
+        self.keyphrases = keyphrases
+
+    @classmethod
+    def from_texts(cls, texts, keyphrases=5, max_concepts=30, window=25, min_edge_weight=0.3, max_parents=3):
+        """
+        Build the graph for a document given as chunk texts. window is how many
+        words count as "together" for co-occurrence; each concept keeps its
+        max_parents strongest incoming edges of at least min_edge_weight.
+        """
+        chunk_ids, term_ids, positions = [], [], []
+        vocabulary, surfaces = {}, {}
+        position = 0
+        for chunk, text in enumerate(texts):
+            previous = None
+            for match in WORD.finditer(text.lower()):
+                word = match.group()
+                if word in SKIP or len(word) < 3:
+                    previous = None
+                    position += 1
+                    continue
+                key = stem(word)
+                terms = [] if word.endswith(VERBAL_ENDINGS) else [(key, word)]
+                if previous is not None:
+                    terms.append((previous[0] + ' ' + key, previous[1] + ' ' + word))
+                for term, surface in terms:
+                    term_id = vocabulary.setdefault(term, len(vocabulary))
+                    counts = surfaces.setdefault(term_id, {})
+                    counts[surface] = counts.get(surface, 0) + 1
+                    chunk_ids.append(chunk)
+                    term_ids.append(term_id)
+                    positions.append(position)
+                previous = (key, word)
+                position += 1
+
+        if not vocabulary:
+            return cls([], np.zeros(0), [], [], [], [[] for _ in texts])
+
+        n_chunks, n_terms = len(texts), len(vocabulary)
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        is_phrase = np.zeros(n_terms, dtype=bool)
+        for term, term_id in vocabulary.items():
+            is_phrase[term_id] = ' ' in term
+
+        # Sparse chunk x term counts as (row, col, count) triples
+        cells, counts = np.unique(chunk_ids * n_terms + term_ids, return_counts=True)
+        rows, cols = cells // n_terms, cells % n_terms
+        df = np.bincount(cols, minlength=n_terms)
+        idf = np.log((1 + n_chunks) / (1 + df)) + 1.0
+        weights = (1.0 + np.log(counts)) * idf[cols] * np.where(is_phrase[cols], PHRASE_BOOST, 1.0)
+        # A phrase seen once is usually an accident of word order
+        totals = np.bincount(term_ids, minlength=n_terms)
+        weights[is_phrase[cols] & (totals[cols] < 2)] = 0.0
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=n_chunks))
+        weights = weights / np.maximum(norms[rows], 1e-12)
+
+        # Top keyphrases per chunk: sort by row, then by descending weight. Twice as
+        # many as needed, since words inside a listed phrase are dropped below
+        order = np.lexsort((-weights, rows))
+        row_starts = np.searchsorted(rows[order], np.arange(n_chunks))
+        row_ends = np.append(row_starts[1:], len(order))
+        top = [order[s:min(e, s + 2 * keyphrases)] for s, e in zip(row_starts, row_ends)]
+
+        # Concepts: the best-scoring terms that are a keyphrase somewhere
+        scores = np.bincount(cols, weights=weights, minlength=n_terms)
+        candidates = np.unique(np.concatenate([cols[t[weights[t] > 0]] for t in top])) if top else np.zeros(0, int)
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        terms_by_id = {term_id: term for term, term_id in vocabulary.items()}
+        chosen = []
+        chosen_phrases = set()
+        for term_id in candidates:
+            term = terms_by_id[int(term_id)]
+            if ' ' in term:
+                chosen_phrases.update(term.split())
+            elif term in chosen_phrases:
+                # Mostly seen inside a chosen phrase ("dioxide" in "carbon dioxide")
+                continue
+            chosen.append(int(term_id))
+            if len(chosen) >= max_concepts:
+                break
+
+        concept_index = np.full(n_terms, -1, dtype=np.int64)
+        concept_index[chosen] = np.arange(len(chosen))
+        labels = [max(surfaces[term_id].items(), key=lambda item: item[1])[0] for term_id in chosen]
+
+        # First mention and chunk membership of each concept
+        mask = concept_index[term_ids] >= 0
+        concept_of = concept_index[term_ids[mask]]
+        first_position = np.full(len(chosen), np.iinfo(np.int64).max)
+        np.minimum.at(first_position, concept_of, positions[mask])
+        first_chunk = np.full(len(chosen), n_chunks)
+        np.minimum.at(first_chunk, concept_of, chunk_ids[mask])
+        presence = np.zeros((n_chunks, len(chosen)), dtype=bool)
+        presence[chunk_ids[mask], concept_of] = True
+
+        # Co-occurrence within word windows, normalized to cosine (Ochiai) similarity
+        windows = positions[mask] // window
+        together = np.zeros((int(windows.max()) + 1 if len(windows) else 0, len(chosen)), dtype=np.float32)
+        together[windows, concept_of] = 1.0
+        co = together.T @ together
+        frequency = np.diag(co).copy()
+        similarity = co / np.sqrt(np.maximum(np.outer(frequency, frequency), 1e-12))
+        np.fill_diagonal(similarity, 0.0)
+
+        # Edges point from the earlier-introduced concept, so the graph is acyclic
+        edges = []
+        rank = np.argsort(np.argsort(first_position, kind='stable'), kind='stable')
+        for target in range(len(chosen)):
+            earlier = np.flatnonzero((rank < rank[target]) & (similarity[:, target] >= min_edge_weight))
+            strongest = earlier[np.argsort(-similarity[earlier, target], kind='stable')[:max_parents]]
+            edges.extend((int(source), target, round(float(similarity[source, target]), 3)) for source in strongest)
+
+        keyphrase_labels = []
+        for t in top:
+            terms = [int(cols[cell]) for cell in t if weights[cell] > 0]
+            inside = {word for term_id in terms if ' ' in terms_by_id[term_id] for word in terms_by_id[term_id].split()}
+            keyphrase_labels.append([
+                max(surfaces[term_id].items(), key=lambda item: item[1])[0]
+                for term_id in terms if ' ' in terms_by_id[term_id] or terms_by_id[term_id] not in inside
+            ][:keyphrases])
+
+        return cls(
+            labels, scores[chosen] if chosen else np.zeros(0), [int(c) for c in first_chunk],
+            [np.flatnonzero(presence[:, i]).tolist() for i in range(len(chosen))],
+            edges, keyphrase_labels
+        )
+
+    def learning_order(self):
+        """
+        Concepts in topological order (Kahn): a concept comes after every
+        concept with an edge into it; among those ready, the strongest first.
+        from_texts never builds a cycle, but if edges form one, its strongest
+        waiting concept is released so every concept is still placed.
+        """
+        incoming = [0] * len(self.labels)
+        outgoing = [[] for _ in self.labels]
+        for source, target, _ in self.edges:
+            incoming[target] += 1
+            outgoing[source].append(target)
+        ready = [(-self.scores[i], i) for i, count in enumerate(incoming) if count == 0]
+        heapq.heapify(ready)
+        order, placed = [], set()
+        while len(order) < len(self.labels):
+            if not ready:
+                # Only concepts on a cycle are left waiting
+                waiting = min(
+                    (i for i in range(len(self.labels)) if i not in placed), key=lambda i: (-self.scores[i], i))
+                incoming[waiting] = 0
+                heapq.heappush(ready, (-self.scores[waiting], waiting))
+            _, concept = heapq.heappop(ready)
+            order.append(concept)
+            placed.add(concept)
+            for target in outgoing[concept]:
+                incoming[target] -= 1
+                if incoming[target] == 0:
+                    heapq.heappush(ready, (-self.scores[target], target))
+        return order
+
+    def roots(self, limit=5):
+        """
+        Foundational concepts: those nothing points into, ranked by how much
+        builds on them, then the earliest of the rest in learning order
+        """
+        has_parent = {target for _, target, _ in self.edges}
+        reach = {}
+        for source, _, weight in self.edges:
+            reach[source] = reach.get(source, 0.0) + weight
+        roots = [i for i in range(len(self.labels)) if i not in has_parent]
+        roots.sort(key=lambda i: (-reach.get(i, 0.0), -self.scores[i]))
+        roots += [i for i in self.learning_order() if i in has_parent]
+        return [self.labels[i] for i in roots[:limit]]
+
+    def as_dict(self, chunk_ids=None):
+        """JSON-ready nodes and edges; chunk_ids maps chunk positions to ids (default 1-based)"""
+        chunk_ids = chunk_ids or list(range(1, len(self.keyphrases) + 1))
+        position = {concept: i for i, concept in enumerate(self.learning_order())}
+        return {
+            'nodes': [
+                {
+                    'id': i,
+                    'label': label,
+                    'score': round(float(self.scores[i]), 3),
+                    'first_chunk': chunk_ids[self.first_chunks[i]],
+                    'chunks': [chunk_ids[c] for c in self.chunk_sets[i]],
+                    'position': position[i],
+                }
+                for i, label in enumerate(self.labels)
+            ],
+            'edges': [{'source': s, 'target': t, 'weight': w} for s, t, w in self.edges],
+        }
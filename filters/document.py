@@ -0,0 +1,148 @@
+"""
+Document - Chapter-aware segmentation of extracted textbook text
+Splits text into sections and token-bounded chunks, and fans filters out over them
+"""
+
+import os
+import re
+from .ai_helper import gather_bounded
+from .tokens import estimate_tokens
+
+# Caps how many chunks one filter run may send, so cost and latency stay bounded
+MAX_CHUNKS = int(os.environ.get('DOCUMENT_MAX_CHUNKS', 8))
+
+NAMED_HEADING = re.compile(r'^(?:chapter|section|part|unit|lesson|module)\s+[\dIVXLC]+\b.{0,80}$', re.IGNORECASE)
+NUMBERED_HEADING = re.compile(r'^\d+(?:\.\d+){0,3}\.?\s+[A-Z][^.!?]{0,80}$')
+CAPS_HEADING = re.compile(r"^[A-Z][A-Z0-9 ,:&'()-]{3,80}$")
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+class Section:
+    def __init__(self, title, text):
+        self.title = title
+        self.text = text
+
+
+class Chunk:
+    def __init__(self, index, section, text):
+        self.index = index
+        self.section = section
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+
+class Document:
+    def __init__(self, text):
+        self.text = text
+        self.sections = self._segment(text)
+
+    def chunks(self, max_tokens):
+        """Pack paragraphs into chunks of at most max_tokens, never crossing a section"""
+        chunks = []
+        for section in self.sections:
+            current, current_tokens = [], 0
+            for piece in self._pieces(section.text, max_tokens):
+                piece_tokens = estimate_tokens(piece)
+                if current and current_tokens + piece_tokens > max_tokens:
+                    chunks.append(Chunk(len(chunks), section.title, '\n\n'.join(current)))
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_tokens
+            if current:
+                chunks.append(Chunk(len(chunks), section.title, '\n\n'.join(current)))
+        return chunks
+
+    def _segment(self, text):
+        sections = []
+        title, lines = None, []
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped and self._is_heading(stripped):
+                if any(l.strip() for l in lines):
+                    sections.append(Section(title, '\n'.join(lines).strip()))
+                title, lines = stripped, []
+            else:
+                lines.append(line)
+        if any(l.strip() for l in lines) or not sections:
+            sections.append(Section(title, '\n'.join(lines).strip()))
+        return sections
+
+    def _is_heading(self, line):
+        if len(line) > 90:
+            return False
+        return bool(NAMED_HEADING.match(line) or NUMBERED_HEADING.match(line) or CAPS_HEADING.match(line))
+
+    def _pieces(self, text, max_tokens):
+        """Paragraphs, split further by sentence and then by word if still too large"""
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if estimate_tokens(paragraph) <= max_tokens:
+                yield paragraph
+                continue
+            for sentence in SENTENCE_END.split(paragraph):
+                if estimate_tokens(sentence) <= max_tokens:
+                    yield sentence
+                    continue
+                current, current_tokens = [], 0
+                for word in sentence.split():
+                    word_tokens = estimate_tokens(word)
+                    if current and current_tokens + word_tokens > max_tokens:
+                        yield ' '.join(current)
+                        current, current_tokens = [], 0
+                    current.append(word)
+                    current_tokens += word_tokens
+                if current:
+                    yield ' '.join(current)
+
+
+def spread(chunks, limit):
+    """Pick at most `limit` chunks spaced evenly across the whole document"""
+    if len(chunks) <= limit:
+        return chunks
+    if limit == 1:
+        return chunks[:1]
+    step = (len(chunks) - 1) / (limit - 1)
+    return [chunks[round(i * step)] for i in range(limit)]
+
+
+def coverage(chunks, used, failed=0):
+    """
+    How much of a document a result covers: its chunk count, how many chunks
+    went into the result, and how many were sent but failed. used < chunks
+    means a partial result, whether from sampling or failures.
+    """
+    return {'chunks': chunks, 'used': used, 'failed': failed}
+
+
+async def map_chunks(text, fn, max_tokens, max_chunks=None, select=spread):
+    """
+    Run the coroutine function fn(chunk_text) over the document's chunks
+    concurrently. Returns (results, coverage): chunks that fail are dropped
+    from results and counted in coverage; if every chunk fails, the first
+    error is raised.
+    """
+    chunks = Document(text).chunks(max_tokens) or [Chunk(0, None, text)]
+    selected = select(chunks, max_chunks or MAX_CHUNKS)
+    results = await gather_bounded(*(fn(chunk.text) for chunk in selected), return_exceptions=True)
+    succeeded = [result for result in results if not isinstance(result, BaseException)]
+    if not succeeded:
+        raise results[0]
+    return succeeded, coverage(len(chunks), len(succeeded), len(results) - len(succeeded))
+
+
+async def fan_out(filter, text, mode='normal'):
+    """Apply a filter to every chunk of a document and merge with its reducer"""
+    results, covered = await map_chunks(
+        text,
+        lambda chunk_text: filter.process_chunk_async(chunk_text, mode=mode),
+        filter.chunk_tokens,
+        filter.max_chunks,
+        filter.select_chunks
+    )
+    result = results[0] if len(results) == 1 else filter.reduce_results(results, mode=mode)
+    if isinstance(result, dict):
+        result = dict(result, coverage=covered)
+    return result
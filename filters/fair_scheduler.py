@@ -0,0 +1,211 @@
+"""
+Fair Scheduler - Per-user quotas and weighted fair queuing for Gemini calls
+Each caller (a browser session) gets its own token bucket, and when every
+upstream slot is busy, waiting calls are served in weighted-fair order so
+one heavy user can't starve the rest
+"""
+
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .resilience import GeminiRateLimitError, TokenBucket
+
+# Interactive unlock questions jump ahead of study filters, which jump ahead of jokes
+PRIORITY_CLASSES = {
+    'grey': 'interactive',
+    'blue': 'standard', 'yellow': 'standard', 'green': 'standard', 'purple': 'standard',
+    'orange': 'background',
+}
+CLASS_WEIGHTS = {'interactive': 4.0, 'standard': 2.0, 'background': 1.0}
+
+# Who the current request is for; set by the web tier, None for internal calls
+current_caller = contextvars.ContextVar('current_caller', default=None)
+
+# The filter run the current call belongs to; set by FairScheduler.run, None outside one
+current_run = contextvars.ContextVar('current_run', default=None)
+
+
+class _Waiter:
+    __slots__ = ('granted', 'cancelled')
+
+    def __init__(self):
+        self.granted = False
+        self.cancelled = False
+
+
+class _Run:
+    __slots__ = ('charged', 'lock')
+
+    def __init__(self):
+        self.charged = False
+        self.lock = threading.Lock()
+
+
+class FairScheduler:
+    """
+    Admits at most `slots` concurrent upstream calls. Queued calls are ordered
+    by their WFQ finish tag: cost divided by priority-class weight, on top of
+    the caller's previous tag, so a user's long backlog queues behind others'.
+    """
+
+    def __init__(self, slots=8, user_rate=0.5, user_burst=10, max_wait=10.0, max_users=10000):
+        self.slots = slots
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        # Longest a call may queue before it is rejected, so every wait is bounded
+        self.max_wait = max_wait
+        self.max_users = max_users
+        self.buckets = OrderedDict()
+        self.last_finish = {}
+        # Finish tags of each caller's calls still waiting in the queue
+        self.pending = {}
+        self.virtual_time = 0.0
+        self.active = 0
+        self.queue = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected_quota': 0, 'rejected_wait': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            slots=int(os.environ.get('SCHEDULER_SLOTS', os.environ.get('GEMINI_POOL_SIZE', 8))),
+            user_rate=float(os.environ.get('USER_RATE_LIMIT_RPM', 30)) / 60.0,
+            user_burst=float(os.environ.get('USER_RATE_LIMIT_BURST', 10)),
+            max_wait=float(os.environ.get('SCHEDULER_MAX_WAIT', 10))
+        )
+
+    @contextmanager
+    def run(self):
+        """
+        Count everything in the block as one filter run: its first upstream
+        call takes a request from the caller's quota and the rest of its
+        fan-out rides on it, so a chunked document costs the same as a short text
+        """
+        token = current_run.set(_Run())
+        try:
+            yield
+        finally:
+            current_run.reset(token)
+
+    def charge(self, caller):
+        """
+        Take one request from the caller's quota, or raise GeminiRateLimitError.
+        Inside run(), only the run's first charge takes a token.
+        """
+        run = current_run.get()
+        if run is None:
+            self._take(caller)
+            return
+        with run.lock:
+            if not run.charged:
+                self._take(caller)
+                run.charged = True
+
+    def _take(self, caller):
+        bucket = self._bucket(caller)
+        if not bucket.acquire(timeout=0):
+            with self.cond:
+                self.stats['rejected_quota'] += 1
+            raise GeminiRateLimitError(
+                "You've used your AI quota for the moment; please try again shortly",
+                retry_after=bucket.time_until_available()
+            )
+
+    @contextmanager
+    def slot(self, caller, filter_name, cost=1.0):
+        """Hold one upstream slot for the duration of the block, queueing fairly if none is free"""
+        weight = CLASS_WEIGHTS[PRIORITY_CLASSES.get(filter_name, 'standard')]
+        key = caller or 'anonymous'
+        with self.cond:
+            # A caller's queued calls line up behind each other, but only granted
+            # calls move last_finish: a rejected call costs its caller no priority
+            pending = self.pending.get(key)
+            start = max(self.virtual_time, self.last_finish.get(key, 0.0), max(pending) if pending else 0.0)
+            finish = start + max(cost, 1.0) / weight
+            if self.active < self.slots and not self.queue:
+                self.active += 1
+                self.stats['admitted'] += 1
+            else:
+                self.pending.setdefault(key, []).append(finish)
+                try:
+                    self._wait(finish)
+                finally:
+                    self.pending[key].remove(finish)
+                    if not self.pending[key]:
+                        del self.pending[key]
+            self.last_finish[key] = max(self.last_finish.get(key, 0.0), finish)
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                self._dispatch()
+
+    def quota(self, caller):
+        """Remaining requests for a caller, for X-RateLimit-* headers and responses"""
+        bucket = self._bucket(caller)
+        stats = bucket.get_stats()
+        return {
+            'limit': int(bucket.capacity),
+            'remaining': int(stats['available']),
+            'reset_seconds': round(bucket.time_until_available(), 1) if stats['available'] < 1 else 0.0
+        }
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats.update(active=self.active, queued_now=len(self.queue), slots=self.slots, users=len(self.buckets))
+        return stats
+
+    def _wait(self, finish):
+        # Called with self.cond held
+        waiter = _Waiter()
+        heapq.heappush(self.queue, (finish, next(self.counter), waiter))
+        self.stats['queued'] += 1
+        deadline = time.monotonic() + self.max_wait
+        while not waiter.granted:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Lazily dropped by _dispatch
+                waiter.cancelled = True
+                self.stats['rejected_wait'] += 1
+                raise GeminiRateLimitError(
+                    "The AI service is busy; please try again shortly",
+                    retry_after=min(self.max_wait, 5.0)
+                )
+            self.cond.wait(remaining)
+        self.stats['admitted'] += 1
+
+    def _dispatch(self):
+        # Called with self.cond held: hand free slots to the smallest finish tags
+        while self.active < self.slots and self.queue:
+            finish, _, waiter = heapq.heappop(self.queue)
+            if waiter.cancelled:
+                continue
+            self.virtual_time = max(self.virtual_time, finish)
+            waiter.granted = True
+            self.active += 1
+        self.cond.notify_all()
+
+    def _bucket(self, caller):
+        key = caller or 'anonymous'
+        with self.cond:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.user_rate, self.user_burst)
+                while len(self.buckets) > self.max_users:
+                    old, _ = self.buckets.popitem(last=False)
+                    self.last_finish.pop(old, None)
+            else:
+                self.buckets.move_to_end(key)
+            return bucket
+
+
+scheduler = FairScheduler.from_env()
@@ -0,0 +1,152 @@
+"""
+Fake Gemini - Local stand-in for the Gemini API
+Speaks HTTP/1.1 keep-alive so connection pooling can be exercised offline
+"""
+
+import json
+import random
+import re
+import socket
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_PATH = re.compile(r'/v1beta/models/(?P<model>[^:/]+):(?P<method>\w+)')
+
+
+def echo_responder(model, payload):
+    """Default responder: echo the first 200 characters of the prompt"""
+    prompt = payload['contents'][0]['parts'][0]['text']
+    return f"[{model}] {prompt[:200]}"
+
+
+class FakeGeminiServer:
+    """Threaded local server answering generateContent and streamGenerateContent"""
+
+    def __init__(self, responder=echo_responder, host='127.0.0.1', port=0, stream_chunk_size=64):
+        self.responder = responder
+        # Per-model responders and extra delays, so model routing can be exercised offline
+        self.model_responders = {}
+        self.model_delays = {}
+        self.stream_chunk_size = stream_chunk_size
+        # Seconds to wait before answering, and queued failures to serve first
+        self.delay = 0.0
+        self.failures = deque()
+        # Fraction of other requests that fail at random with failure_status
+        self.failure_rate = 0.0
+        self.failure_status = 503
+        self.connections = 0
+        self.requests = 0
+        self.model_requests = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fail_next(self, count=1, status=503, retry_after=None):
+        """Make the next `count` requests fail with an HTTP error"""
+        with self.lock:
+            for _ in range(count):
+                self.failures.append((status, retry_after))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with fake.lock:
+                    fake.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with fake.lock:
+                    fake.requests += 1
+
+                match = MODEL_PATH.match(self.path)
+                if not match:
+                    self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+                    return
+                model = match.group('model')
+                with fake.lock:
+                    fake.model_requests[model] += 1
+
+                with fake.lock:
+                    failure = fake.failures.popleft() if fake.failures else None
+                if failure is None and fake.failure_rate and random.random() < fake.failure_rate:
+                    failure = (fake.failure_status, None)
+                delay = fake.delay + fake.model_delays.get(model, 0.0)
+                if delay:
+                    time.sleep(delay)
+                if failure is not None:
+                    status, retry_after = failure
+                    headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+                    self.send_json(status, {'error': {'code': status, 'message': 'Injected failure'}}, headers)
+                    return
+
+                text = fake.model_responders.get(model, fake.responder)(model, payload)
+                if match.group('method') == 'streamGenerateContent':
+                    self.send_stream(text)
+                    return
+                self.send_json(200, {
+                    'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}]
+                })
+
+            def send_stream(self, text):
+                # Gemini sends SSE events over chunked transfer encoding
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for start in range(0, len(text), fake.stream_chunk_size):
+                        piece = text[start:start + fake.stream_chunk_size]
+                        event = {'candidates': [{'content': {'parts': [{'text': piece}], 'role': 'model'}}]}
+                        data = f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8')
+                        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading mid-stream, as a disconnecting browser does
+                    self.close_connection = True
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,213 @@
+"""
+Gemini Client - Pooled keep-alive HTTP transport
+Reuses persistent HTTP/1.1 connections instead of a fresh urlopen per call
+"""
+
+import http.client
+import json
+import os
+import queue
+import threading
+import urllib.parse
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+
+# Errors that mean a pooled keep-alive connection went stale under us
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class GeminiHTTPError(Exception):
+    """Non-2xx response from the Gemini API"""
+
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        super().__init__(f"HTTP {status}: {body[:200]}")
+
+
+class GeminiClient:
+    """Thread-safe client holding a bounded pool of persistent connections"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, pool_size=8, connect_timeout=5.0, read_timeout=30.0):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme or 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip('/')
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle = queue.LifoQueue()
+        # Caps the number of live connections (idle + in use) per worker
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.stats = {'requests': 0, 'connections_opened': 0, 'connections_reused': 0, 'stale_retries': 0}
+        self.stats_lock = threading.Lock()
+        self.pid = os.getpid()
+
+    @classmethod
+    def from_env(cls, base_url=None):
+        """Build a client from GEMINI_BASE_URL / GEMINI_POOL_* environment variables"""
+        return cls(
+            base_url=base_url or os.environ.get('GEMINI_BASE_URL', DEFAULT_BASE_URL),
+            pool_size=int(os.environ.get('GEMINI_POOL_SIZE', 8)),
+            connect_timeout=float(os.environ.get('GEMINI_CONNECT_TIMEOUT', 5)),
+            read_timeout=float(os.environ.get('GEMINI_READ_TIMEOUT', 30))
+        )
+
+    def generate(self, model, payload, api_key=''):
+        """POST a generateContent request and return the decoded JSON body"""
+        path = f"/v1beta/models/{model}:generateContent"
+        status, headers, body = self.request('POST', path, payload, api_key)
+        if status >= 300:
+            raise GeminiHTTPError(status, body.decode('utf-8', 'replace'), headers)
+        return json.loads(body.decode('utf-8'))
+
+    def stream(self, model, payload, api_key=''):
+        """
+        POST a streamGenerateContent request and yield each decoded SSE event.
+        The connection goes back to the pool only if the stream was fully read.
+        """
+        path = self.base_path + f"/v1beta/models/{model}:streamGenerateContent?alt=sse"
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Accept': 'text/event-stream', 'Connection': 'keep-alive'}
+        if api_key:
+            headers['x-goog-api-key'] = api_key
+
+        with self.slots:
+            conn, reused = self._acquire()
+            try:
+                try:
+                    response = self._send(conn, 'POST', path, body, headers)
+                except STALE_CONNECTION_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                    self._count('stale_retries')
+                    conn = self._open()
+                    response = self._send(conn, 'POST', path, body, headers)
+
+                if response.status >= 300:
+                    data = response.read()
+                    raise GeminiHTTPError(
+                        response.status,
+                        data.decode('utf-8', 'replace'),
+                        {k.lower(): v for k, v in response.getheaders()}
+                    )
+
+                while True:
+                    line = response.readline()
+                    if not line:
+                        break
+                    line = line.strip()
+                    if line.startswith(b'data:'):
+                        yield json.loads(line[5:].decode('utf-8'))
+            except BaseException:
+                # Includes GeneratorExit when the consumer stops early
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self.idle.put(conn)
+            self._count('requests')
+
+    def request(self, method, path, payload=None, api_key=''):
+        """Send one request over a pooled connection; returns (status, headers, body)"""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        if api_key:
+            headers['x-goog-api-key'] = api_key
+
+        with self.slots:
+            conn, reused = self._acquire()
+            try:
+                try:
+                    response = self._send(conn, method, self.base_path + path, body, headers)
+                except STALE_CONNECTION_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive socket; retry once on a fresh one
+                    self._count('stale_retries')
+                    conn = self._open()
+                    response = self._send(conn, method, self.base_path + path, body, headers)
+
+                # The body must be drained before the connection can be reused
+                data = response.read()
+                response_headers = {k.lower(): v for k, v in response.getheaders()}
+            except BaseException:
+                # A half-sent request or half-read body leaves the socket unusable
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self.idle.put(conn)
+            self._count('requests')
+            return response.status, response_headers, data
+
+    def warmup(self, count=1):
+        """Open count connections ahead of time so the first requests skip the TCP/TLS handshake"""
+        opened = 0
+        for _ in range(min(count, self.pool_size)):
+            conn = self._open()
+            conn.connect()
+            conn.sock.settimeout(self.read_timeout)
+            self.idle.put(conn)
+            opened += 1
+        return opened
+
+    def close(self):
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['idle_connections'] = self.idle.qsize()
+        stats['pool_size'] = self.pool_size
+        return stats
+
+    def _send(self, conn, method, path, body, headers):
+        if conn.sock is None:
+            conn.connect()
+            # Connect with the short timeout, then wait for responses with the long one
+            conn.sock.settimeout(self.read_timeout)
+        conn.request(method, path, body=body, headers=headers)
+        return conn.getresponse()
+
+    def _acquire(self):
+        if os.getpid() != self.pid:
+            # Forked worker: never share inherited sockets with the parent
+            self.idle = queue.LifoQueue()
+            self.pid = os.getpid()
+        try:
+            conn = self.idle.get_nowait()
+            self._count('connections_reused')
+            return conn, True
+        except queue.Empty:
+            return self._open(), False
+
+    def _open(self):
+        if self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        self._count('connections_opened')
+        return conn
+
+    def _count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
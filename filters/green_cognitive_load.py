@@ -4,29 +4,95 @@ Uses Gemini 2.5 Flash to break down complexity
 """
 
 import re
-import json
-from .ai_helper import get_ai_response
+import os
+import asyncio
+from .ai_helper import gather_bounded, get_ai_response_async
+from .base import BaseFilter
+from .concept_graph import ConceptGraph
+from .document import MAX_CHUNKS, Document, coverage, map_chunks, spread
+from .json_extract import extract_json
+from .metrics import timed_stage
+from .resilience import GeminiError
+from .sentence_chunker import iter_chunks, lead_sentence
+from .tokens import estimate_tokens
 
-class CognitiveLoadFilter:
+COMBINED_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "main_ideas": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"chunk_id": {"type": "INTEGER"}, "main_idea": {"type": "STRING"}},
+                "required": ["chunk_id", "main_idea"]
+            }
+        },
+        "prerequisites": {"type": "ARRAY", "items": {"type": "STRING"}}
+    },
+    "required": ["main_ideas", "prerequisites"]
+}
+
+FALLBACK_PREREQUISITES = [
+    "Basic understanding of the subject area",
+    "Familiarity with key terminology",
+    "Foundational concepts in this domain"
+]
+
+class CognitiveLoadFilter(BaseFilter):
+    name = 'green'
+    # Chunking happens locally over the whole text; only prerequisites use the model
+    fans_out = False
+    max_chunks = 3
+    # Chunks carry start/end offsets into this exact text
+    reuse_near_duplicates = False
+    model_tiers = ('lite', 'flash')
+    temperature = 0.4
+    # GREEN_MODEL_LABELS=0 builds the whole result locally: lead sentences as main
+    # ideas and the concept graph's foundational concepts as prerequisites
+    model_labels = os.environ.get('GREEN_MODEL_LABELS', '1') != '0'
+    
     def __init__(self):
         self.max_chunk_size = 300  # words per chunk
+        self.hard_chunk_size = 450  # cut here even mid-sentence (unpunctuated PDF text)
     
-    def process(self, text, mode='normal'):
+    async def process_async(self, text, mode='normal'):
         """Process text with cognitive load management"""
-        # Remove noise first
-        simplified = self._remove_noise(text)
-        
-        # Break into manageable chunks
-        chunks = self._chunk_text(simplified)
+        if not self.model_labels:
+            simplified = self._remove_noise(text)
+            chunks = self._chunk_text(simplified)
+            prerequisites = []
+            covered = coverage(len(chunks), len(chunks))
+        elif self.combined_prompts:
+            # Chunk locally first, then get main ideas and prerequisites in one request per batch
+            simplified = self._remove_noise(text)
+            chunks = self._chunk_text(simplified)
+            prerequisites, covered = await self._analyze_chunks(chunks)
+        else:
+            # Start the prerequisites request first so it overlaps the local work
+            prerequisites_task = asyncio.ensure_future(self._identify_prerequisites(text))
+            await asyncio.sleep(0)  # let the task hand its request to the I/O pool
+            
+            # Remove noise first
+            simplified = self._remove_noise(text)
+            
+            # Break into manageable chunks
+            chunks = self._chunk_text(simplified)
+            
+            # Identify prerequisites
+            prerequisites, covered = await prerequisites_task
         
-        # Identify prerequisites
-        prerequisites = self._identify_prerequisites(text)
+        # Keyphrases, concept map and learning order are all computed locally
+        with timed_stage('concept_graph', self.name):
+            graph = ConceptGraph.from_texts([chunk['content'] for chunk in chunks])
+        for chunk, keyphrases in zip(chunks, graph.keyphrases):
+            chunk['keyphrases'] = keyphrases
+        prerequisites = prerequisites or graph.roots() or list(FALLBACK_PREREQUISITES)
         
         # Create concept map
-        concept_map = self._create_concept_map(text, chunks)
+        concept_map = self._create_concept_map(chunks, graph)
         
         # Create learning path
-        learning_path = self._create_learning_path(chunks, prerequisites)
+        learning_path = self._create_learning_path(chunks, prerequisites, graph)
         
         return {
             'simplified_text': simplified,
@@ -34,62 +100,105 @@ class CognitiveLoadFilter:
             'prerequisites': prerequisites,
             'concept_map': concept_map,
             'learning_path': learning_path,
+            'coverage': covered,
             'mode': mode
         }
     
     def _chunk_text(self, text):
-        """Break text into manageable chunks"""
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        chunk_id = 1
-        
-        for word in words:
-            current_chunk.append(word)
-            current_length += 1
-            
-            # Check if we've reached chunk size or end of sentence
-            if current_length >= self.max_chunk_size and word.endswith(('.', '!', '?')):
-                chunks.append({
-                    'id': chunk_id,
-                    'content': ' '.join(current_chunk),
-                    'word_count': current_length,
-                    'main_idea': self._extract_main_idea(' '.join(current_chunk))
-                })
-                chunk_id += 1
-                current_chunk = []
-                current_length = 0
-        
-        # Add remaining words as final chunk
-        if current_chunk:
-            chunks.append({
-                'id': chunk_id,
-                'content': ' '.join(current_chunk),
-                'word_count': current_length,
-                'main_idea': self._extract_main_idea(' '.join(current_chunk))
-            })
+        """Break text into manageable chunks, ending at sentence boundaries where possible"""
+        return [
+            {
+                'id': span.index + 1,
+                'content': span.text(text),
+                'word_count': span.words,
+                'main_idea': lead_sentence(text, span),
+                'start': span.start,
+                'end': span.end
+            }
+            for span in iter_chunks(text, self.max_chunk_size, self.hard_chunk_size)
+        ]
+    
+    async def _analyze_chunks(self, chunks):
+        """
+        Combined mode: send batches of chunks, each returning the chunks' main ideas
+        and the batch's prerequisites together. Updates main_idea in place and
+        returns (prerequisites, coverage), counting chunks the model saw.
+        """
+        batches = []
+        for chunk in chunks:
+            tokens = estimate_tokens(chunk['content'])
+            if batches and batches[-1][1] + tokens <= self.chunk_tokens:
+                batches[-1][0].append(chunk)
+                batches[-1][1] += tokens
+            else:
+                batches.append([[chunk], tokens])
+        selected = spread([batch for batch, _ in batches], self.max_chunks or MAX_CHUNKS)
+        
+        results = await gather_bounded(*(self._analyze_batch(batch) for batch in selected), return_exceptions=True)
+        
+        by_id = {chunk['id']: chunk for chunk in chunks}
+        per_batch_prereqs = []
+        used = failed = 0
+        for batch, result in zip(selected, results):
+            if isinstance(result, BaseException):
+                failed += len(batch)
+                continue
+            used += len(batch)
+            for item in result.get('main_ideas', []):
+                if isinstance(item, dict) and item.get('chunk_id') in by_id and item.get('main_idea'):
+                    by_id[item['chunk_id']]['main_idea'] = item['main_idea']
+            per_batch_prereqs.append([p for p in result.get('prerequisites', []) if isinstance(p, str)])
+        
+        return self._merge_prerequisites(per_batch_prereqs), coverage(len(chunks), used, failed)
+    
+    async def _analyze_batch(self, batch):
+        """One structured request for a batch of chunks"""
+        numbered = '\n\n'.join(f"[Chunk {chunk['id']}]\n{chunk['content']}" for chunk in batch)
+        prompt = f"""Analyze these study text chunks.
+
+1. For EACH chunk, write its main idea in one short sentence (chunk_id must match the chunk number).
+2. Identify 3-5 prerequisite concepts or knowledge areas that students should understand BEFORE studying this material, in order of importance.
+
+{numbered}
+
+Return ONLY JSON: {{"main_ideas": [{{"chunk_id": 1, "main_idea": "..."}}], "prerequisites": ["..."]}}"""
         
-        return chunks
+        response = await get_ai_response_async(prompt, response_schema=COMBINED_SCHEMA, **self.ai_options())
+        return extract_json(response)
     
-    def _extract_main_idea(self, text):
-        """Extract the main idea from a chunk"""
-        # Get first sentence or first 100 characters
-        sentences = re.split(r'[.!?]+', text)
-        if sentences:
-            main = sentences[0].strip()
-            return main[:100] + '...' if len(main) > 100 else main
-        return text[:100] + '...'
+    async def _identify_prerequisites(self, text):
+        """Identify prerequisite knowledge needed across the whole document, with its coverage"""
+        try:
+            per_chunk, covered = await map_chunks(
+                text, self._identify_chunk_prerequisites, self.chunk_tokens, self.max_chunks)
+        except GeminiError:
+            # The local chunking is still useful; process_async falls back to the concept graph
+            total = len(Document(text).chunks(self.chunk_tokens)) or 1
+            return [], coverage(total, 0, min(total, self.max_chunks or MAX_CHUNKS))
+        return self._merge_prerequisites(per_chunk), covered
+    
+    def _merge_prerequisites(self, per_chunk):
+        """Keep the first occurrence of each prerequisite, in document order"""
+        prerequisites, seen = [], set()
+        for chunk_prereqs in per_chunk:
+            for prereq in chunk_prereqs:
+                if prereq.lower() not in seen:
+                    seen.add(prereq.lower())
+                    prerequisites.append(prereq)
+        
+        # Empty when the model gave none; process_async falls back to the concept graph
+        return prerequisites[:5]
     
-    def _identify_prerequisites(self, text):
-        """Identify prerequisite knowledge needed"""
+    async def _identify_chunk_prerequisites(self, text):
+        """Ask the model for the prerequisites of one chunk"""
         prompt = f"""Analyze this text and identify 3-5 prerequisite concepts or knowledge areas that students should understand BEFORE studying this material.
 
-Text: "{text[:500]}..."
+Text: "{text}"
 
 List prerequisites in order of importance, one per line, starting with "- "."""
 
-        ai_response = get_ai_response(prompt)
+        # A failure is counted in the result's coverage by map_chunks
+        ai_response = await get_ai_response_async(prompt, **self.ai_options())
         
         # Parse prerequisites
         prerequisites = []
@@ -100,31 +209,12 @@ List prerequisites in order of importance, one per line, starting with "- "."""
                 if prereq:
                     prerequisites.append(prereq)
         
-        # Fallback if no prerequisites found
-        if not prerequisites:
-            prerequisites = [
-                "Basic understanding of the subject area",
-                "Familiarity with key terminology",
-                "Foundational concepts in this domain"
-            ]
-        
-        return prerequisites[:5]
+        return prerequisites
     
-    def _create_concept_map(self, text, chunks):
-        """Create a simple concept map"""
-        concept_map = {
-            'title': 'Learning Roadmap',
-            'nodes': []
-        }
-        
-        for i, chunk in enumerate(chunks):
-            concept_map['nodes'].append({
-                'id': chunk['id'],
-                'label': f"Step {chunk['id']}",
-                'description': chunk['main_idea'],
-                'position': i
-            })
-        
+    def _create_concept_map(self, chunks, graph):
+        """Concept nodes with weighted edges from earlier-introduced concepts to later ones"""
+        concept_map = {'title': 'Learning Roadmap'}
+        concept_map.update(graph.as_dict([chunk['id'] for chunk in chunks]))
         return concept_map
     
     def _remove_noise(self, text):
@@ -149,8 +239,11 @@ List prerequisites in order of importance, one per line, starting with "- "."""
         
         return simplified
     
-    def _create_learning_path(self, chunks, prerequisites):
-        """Create a recommended learning path"""
+    def _create_learning_path(self, chunks, prerequisites, graph):
+        """
+        Create a recommended learning path: prerequisites, then each chunk at
+        the point the concept graph's topological order first needs it
+        """
         path = {
             'steps': [],
             'total_time_estimate': len(chunks) * 10  # 10 minutes per chunk
@@ -165,14 +258,27 @@ List prerequisites in order of importance, one per line, starting with "- "."""
                 'time_estimate': 5
             })
         
-        # Add chunks
-        for chunk in chunks:
+        # Chunks in the order their concepts are introduced; a chunk with no
+        # concepts stays in front of the chunk that follows it in the document
+        introduces = {}
+        for concept in graph.learning_order():
+            introduces.setdefault(graph.first_chunks[concept], []).append(graph.labels[concept])
+        pending = [i for i in range(len(chunks)) if i not in introduces]
+        ordered = []
+        for position in introduces:
+            while pending and pending[0] < position:
+                ordered.append(pending.pop(0))
+            ordered.append(position)
+        ordered += pending
+        for position in ordered:
+            chunk = chunks[position]
             path['steps'].append({
                 'order': len(path['steps']) + 1,
                 'type': 'main_content',
                 'content': chunk['main_idea'],
                 'chunk_id': chunk['id'],
+                'concepts': introduces.get(position, []),
                 'time_estimate': 10
             })
         
-        return path
\ No newline at end of file
+        return path
@@ -3,24 +3,56 @@ Grey Filter - Time Blocking
 Locks study sessions and generates unlock questions
 """
 
-import re
-import json
 import random
-from .ai_helper import get_ai_response
+from .answer_matcher import answer_matcher
+from .base import BaseFilter, run_sync
+from .json_extract import extract_json
 
-class TimeBlockingFilter:
-    def __init__(self):
-        self.locked_sessions = {}
-        self.session_history = []
+# Served when the model's reply can't be parsed
+FALLBACK_QUESTION = {
+    "question": "What is the main topic?",
+    "answer": "The topic",
+    "session_tips": ["Focus!", "No phone!", "Drink water."],
+    "recommended_duration": 25
+}
+
+class TimeBlockingFilter(BaseFilter):
+    name = 'grey'
+    # One unlock question per session, drawn from anywhere in the document
+    max_chunks = 1
+    # A single short question: try the light model first
+    model_tiers = ('lite', 'flash')
+    temperature = 0.3
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "question": {"type": "STRING"},
+            "answer": {"type": "STRING"},
+            "session_tips": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "recommended_duration": {"type": "INTEGER"}
+        },
+        "required": ["question", "answer", "session_tips", "recommended_duration"]
+    }
     
     def generate_unlock_question(self, text):
         """Generate a question to unlock the session using AI"""
-        
-        prompt = f"""
+        return run_sync(self.generate_unlock_question_async(text))
+
+    async def generate_unlock_question_async(self, text):
+        """Async variant of generate_unlock_question"""
+        return await super().process_async(text)
+
+    def select_chunks(self, chunks, limit):
+        """Ask about a random part of the material, not always the first page"""
+        return random.sample(chunks, min(limit, len(chunks)))
+
+    def build_prompt(self, text, mode='normal'):
+        """Prompt for the unlock question, answer and session tips"""
+        return f"""
         Generate a specific verification question from this text to check if the student actually studied.
         
         TEXT:
-        {text[:2000]}
+        {text}
         
         OUTPUT FORMAT (JSON ONLY):
         {{
@@ -30,48 +62,24 @@ class TimeBlockingFilter:
             "recommended_duration": 25
         }}
         """
-        
-        response_text = get_ai_response(prompt)
-        clean_json = response_text.replace('```json', '').replace('```', '').strip()
-        
+
+    def parse_response(self, response_text, mode='normal'):
+        """Turn the model's JSON reply into the unlock question"""
         try:
-            return json.loads(clean_json)
+            return extract_json(response_text)
         except Exception:
-            return {
-                "question": "What is the main topic?",
-                "answer": "The topic",
-                "session_tips": ["Focus!", "No phone!", "Drink water."],
-                "recommended_duration": 25
-            }
+            return dict(FALLBACK_QUESTION, session_tips=list(FALLBACK_QUESTION['session_tips']))
 
-    def process(self, text, mode='normal'):
+    def is_reusable(self, result):
+        return super().is_reusable(result) and result.get('question') != FALLBACK_QUESTION['question']
+    
+    async def process_async(self, text, mode='normal'):
         """Process for initial view (tips etc)"""
-        return self.generate_unlock_question(text)
+        return await self.generate_unlock_question_async(text)
 
     def check_answer(self, user_answer, correct_answer):
-        """Check if user's answer matches the correct answer"""
-        if not user_answer or not correct_answer:
-            return False
-        
-        # Normalize both answers
-        user_answer = user_answer.lower().strip()
-        correct_answer = correct_answer.lower().strip()
-        
-        # Extract words (remove punctuation)
-        user_words = set(re.findall(r'\b\w+\b', user_answer))
-        correct_words = set(re.findall(r'\b\w+\b', correct_answer))
-        
-        # Remove common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were'}
-        user_words = user_words - stop_words
-        correct_words = correct_words - stop_words
-        
-        if not correct_words:
-            return False
-        
-        # Calculate overlap
-        overlap = len(user_words & correct_words) / len(correct_words)
-        return overlap >= 0.6
+        """Check if user's answer matches the correct answer (offline, no model call)"""
+        return answer_matcher.is_correct(user_answer, correct_answer)
     
     def _calculate_recommended_duration(self, text):
         """Calculate recommended study duration based on text length"""
@@ -0,0 +1,85 @@
+"""
+Hint Index - Progressive hints for Memory Mastery blanks, served locally
+Hints are precomputed when an exercise set is generated, so a hint click is
+a dictionary lookup rather than a model call
+"""
+
+import threading
+from collections import OrderedDict
+
+HINT_LEVELS = ('first_letter', 'length', 'masked', 'model')
+
+
+def _masked(answer):
+    # First letter and every third letter shown; spaces and punctuation kept
+    return ' '.join(
+        c if i == 0 or i % 3 == 0 or not c.isalnum() else '_'
+        for i, c in enumerate(answer)
+    )
+
+
+def build_hints(answer, model_hint=None):
+    """The progressive hints for one answer, weakest first"""
+    answer = answer.strip()
+    letters = sum(1 for c in answer if c.isalnum())
+    hints = [
+        f"Starts with '{answer[:1]}'",
+        f"Starts with '{answer[:1]}', {letters} letters" + (f", {len(answer.split())} words" if ' ' in answer else ''),
+        _masked(answer),
+    ]
+    if model_hint and model_hint.strip():
+        hints.append(model_hint.strip())
+    return tuple(hints)
+
+
+class HintIndex:
+    """exercise_id -> level -> precomputed hints per blank, LRU-bounded"""
+
+    def __init__(self, max_exercises=2048, loader=None):
+        self.max_exercises = max_exercises
+        # Called with an exercise_id on a miss (e.g. generated by another worker)
+        self.loader = loader
+        self.exercises = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, result):
+        """Index every blank of a generated exercise set; no-op without an exercise_id"""
+        exercise_id = result.get('exercise_id')
+        if not exercise_id:
+            return
+        levels = {}
+        for level, exercise in result.get('exercises', {}).items():
+            if not isinstance(exercise, dict):
+                continue
+            # A blank without an answer keeps its slot, so [BLANK_n] still maps to entry n
+            levels[level] = [
+                build_hints(blank['answer'], blank.get('hint'))
+                if isinstance(blank, dict) and blank.get('answer') else None
+                for blank in exercise.get('blanks', [])
+            ]
+        with self.lock:
+            self.exercises[exercise_id] = levels
+            self.exercises.move_to_end(exercise_id)
+            while len(self.exercises) > self.max_exercises:
+                self.exercises.popitem(last=False)
+
+    def hints(self, exercise_id, level, blank):
+        """All hints for blank number `blank` (1-based, as in [BLANK_n]), or None if it has none"""
+        with self.lock:
+            levels = self.exercises.get(exercise_id)
+            if levels is not None:
+                self.exercises.move_to_end(exercise_id)
+        if levels is None and self.loader is not None:
+            result = self.loader(exercise_id)
+            if result is not None:
+                self.add(result)
+                with self.lock:
+                    levels = self.exercises.get(exercise_id)
+        if levels is None:
+            return None
+        blanks = levels.get(level, [])
+        return blanks[blank - 1] if 0 < blank <= len(blanks) else None
+
+    def get_stats(self):
+        with self.lock:
+            return {'exercises': len(self.exercises), 'max_exercises': self.max_exercises}
@@ -0,0 +1,83 @@
+"""
+JSON Extract - Tolerant parsing of model replies
+Finds the first balanced JSON object even with markdown fences, preambles or trailing prose
+"""
+
+import json
+import threading
+from .metrics import parse_failures
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(text):
+    """Return the first JSON object in text, or raise ValueError"""
+    stripped = text.strip()
+    try:
+        # Fast path: structured-output mode returns bare JSON
+        value = json.loads(stripped)
+    except ValueError:
+        pass
+    else:
+        # Callers index the result as a dict; a bare list or string must not slip through
+        if isinstance(value, dict):
+            return value
+
+    start = stripped.find('{')
+    while start != -1:
+        end = _balanced_end(stripped, start)
+        if end is None:
+            break
+        try:
+            value, _ = _decoder.raw_decode(stripped[start:end])
+            return value
+        except ValueError:
+            start = stripped.find('{', start + 1)
+    raise ValueError("No JSON object found in model response")
+
+
+def _balanced_end(text, start):
+    """Index just past the brace closing the object opened at start, or None if unclosed"""
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+class ParseStats:
+    """Per-filter counts of replies that were not valid JSON"""
+
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, filter_name, outcome):
+        # outcome is 'failed' (first parse), 'repaired' or 'repair_failed'
+        with self.lock:
+            counts = self.counts.setdefault(filter_name or 'unknown', {'failed': 0, 'repaired': 0, 'repair_failed': 0})
+            counts[outcome] += 1
+        parse_failures.inc(filter=filter_name or 'unknown', outcome=outcome)
+
+    def get_stats(self):
+        with self.lock:
+            return {name: dict(counts) for name, counts in self.counts.items()}
+
+
+parse_stats = ParseStats()
@@ -0,0 +1,124 @@
+"""
+JSON Stream - Incremental parser for streamed model output
+Emits each completed sub-object (e.g. one Bloom question) as soon as it closes
+"""
+
+import json
+
+WHITESPACE = ' \t\r\n'
+
+
+class _Frame:
+    __slots__ = ('kind', 'key', 'index', 'expect_key', 'value_start')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.key = None
+        self.index = 0
+        self.expect_key = kind == '{'
+        self.value_start = None
+
+
+class JSONStreamParser:
+    """
+    Feed text chunks in; get back (path, value) pairs for every completed
+    top-level scalar and every completed member of a top-level container.
+
+    For {"concepts": ["a", "b"], "questions": {"Remember": "..."}} this yields
+    (("concepts", 0), "a"), (("concepts", 1), "b"), (("questions", "Remember"), "...").
+    Anything before the first "{" (markdown fences, preambles) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.frames = []
+        self.started = False
+        self.finished = False
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.string_is_key = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        items = []
+        buffer = self.buffer
+        i = self.pos
+        length = len(buffer)
+
+        while i < length and not self.finished:
+            c = buffer[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.string_is_key:
+                        self.frames[-1].key = json.loads(buffer[self.string_start:i + 1])
+                i += 1
+                continue
+
+            if not self.started:
+                if c == '{':
+                    self.frames.append(_Frame('{'))
+                    self.started = True
+                i += 1
+                continue
+
+            top = self.frames[-1]
+            if c == '"':
+                self.in_string = True
+                self.string_start = i
+                self.string_is_key = top.kind == '{' and top.expect_key
+                if not self.string_is_key and top.value_start is None:
+                    top.value_start = i
+            elif c in '{[':
+                if top.value_start is None:
+                    top.value_start = i
+                self.frames.append(_Frame(c))
+            elif c in '}]':
+                # A scalar member can end at the closing bracket without a comma
+                self._complete(len(self.frames) - 1, i, items)
+                self.frames.pop()
+                if not self.frames:
+                    self.finished = True
+                else:
+                    self._complete(len(self.frames) - 1, i + 1, items)
+            elif c == ':':
+                top.expect_key = False
+            elif c == ',':
+                self._complete(len(self.frames) - 1, i, items)
+                if top.kind == '{':
+                    top.expect_key = True
+                else:
+                    top.index += 1
+            elif c not in WHITESPACE and top.value_start is None and not top.expect_key:
+                top.value_start = i
+            i += 1
+
+        self.pos = i
+        return items
+
+    def _complete(self, depth, end, items):
+        frame = self.frames[depth]
+        if frame.value_start is None:
+            return
+        raw = self.buffer[frame.value_start:end].strip()
+        frame.value_start = None
+        is_container = raw[:1] in ('{', '[')
+        if depth == 1 or (depth == 0 and not is_container):
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                return
+            items.append((self._path(depth), value))
+
+    def _path(self, depth):
+        path = []
+        for frame in self.frames[:depth + 1]:
+            path.append(frame.key if frame.kind == '{' else frame.index)
+        return tuple(path)
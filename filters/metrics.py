@@ -0,0 +1,232 @@
+"""
+Metrics - Counters, gauges and histograms in the Prometheus text format
+No client library; each worker process keeps its own registry
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a cache hit (sub-millisecond) up to a slow multi-chunk Gemini run
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+# Tokens per prompt or response
+SIZE_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down; pass fn to read it at scrape time instead"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        if self.fn is not None:
+            try:
+                self.set(self.fn())
+            except Exception:
+                # A failing callback must not break the whole scrape
+                pass
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # Per-bucket counts (plus +Inf), running sum, total count
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, [('le', _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), fn=None):
+        return self.register(Gauge(name, help_text, labels, fn))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """The whole registry in Prometheus text exposition format 0.0.4"""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    'study_http_request_seconds', 'HTTP request latency by route', ('endpoint', 'method', 'status'))
+http_requests_in_flight = registry.gauge(
+    'study_http_requests_in_flight', 'HTTP requests currently being handled')
+filter_seconds = registry.histogram(
+    'study_filter_seconds', 'End-to-end filter process() time', ('filter', 'outcome'))
+stage_seconds = registry.histogram(
+    'study_stage_seconds', 'Time spent in each pipeline stage', ('stage', 'filter'))
+gemini_request_seconds = registry.histogram(
+    'study_gemini_request_seconds', 'Latency of each upstream Gemini attempt', ('filter', 'model', 'outcome'))
+gemini_retries = registry.counter(
+    'study_gemini_retries_total', 'Gemini attempts retried after an error', ('filter', 'error'))
+gemini_cache = registry.counter(
+    'study_gemini_cache_total', 'Response cache lookups', ('filter', 'result'))
+gemini_prompt_tokens = registry.histogram(
+    'study_gemini_prompt_tokens', 'Prompt size per Gemini call', ('filter',), SIZE_BUCKETS)
+gemini_response_tokens = registry.histogram(
+    'study_gemini_response_tokens', 'Response size per Gemini call', ('filter',), SIZE_BUCKETS)
+parse_failures = registry.counter(
+    'study_parse_failures_total', 'Model replies that were not valid JSON', ('filter', 'outcome'))
+route_cost = registry.counter(
+    'study_route_cost_usd_total', 'Estimated Gemini spend per filter and model', ('filter', 'model'))
+route_escalations = registry.counter(
+    'study_route_escalations_total', 'Replies that failed validation and moved up a model tier', ('filter', 'model'))
+near_duplicates = registry.counter(
+    'study_near_duplicate_total', 'Near-duplicate index lookups for filter inputs', ('filter', 'result'))
+
+
+class RequestTimings:
+    """Per-request stage totals, reported in the request's timing log line"""
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            total, count = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (total + seconds, count + 1)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                stage: {'ms': round(total * 1000, 1), 'count': count}
+                for stage, (total, count) in self.stages.items()
+            }
+
+
+# Set by the web tier for the duration of a request; None outside requests
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+
+@contextmanager
+def timed_stage(stage, filter_name=None):
+    """Time a block into stage_seconds and the current request's timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage, filter=filter_name or 'none')
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
@@ -0,0 +1,143 @@
+"""
+Model Router - Per-filter model tiers, generation settings and cascades
+A filter lists the tiers it may use, cheapest first; a cheaper tier's answer
+is kept unless it fails the filter's response schema, and every route's
+latency and cost is tallied so the tiers can be tuned
+"""
+
+import json
+import os
+import threading
+
+from .json_extract import extract_json
+from .metrics import route_cost, route_escalations
+
+TIERS = {
+    'lite': 'gemini-2.5-flash-lite',
+    'flash': 'gemini-2.5-flash',
+    'pro': 'gemini-2.5-pro',
+}
+DEFAULT_TIER = 'flash'
+
+# USD per million (prompt, response) tokens
+PRICES = {
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-pro': (1.25, 10.00),
+}
+
+JSON_TYPES = {'object': dict, 'array': list, 'string': str, 'boolean': bool,
+              'integer': int, 'number': (int, float)}
+
+
+def matches_schema(value, schema):
+    """Check value against the subset of OpenAPI schema Gemini uses: types, required keys, items"""
+    expected = JSON_TYPES.get(str(schema.get('type', '')).lower())
+    if expected is not None and not isinstance(value, expected):
+        return False
+    if isinstance(value, dict):
+        if any(key not in value for key in schema.get('required', ())):
+            return False
+        properties = schema.get('properties', {})
+        return all(matches_schema(value[key], sub) for key, sub in properties.items() if key in value)
+    if isinstance(value, list) and 'items' in schema:
+        return all(matches_schema(item, schema['items']) for item in value)
+    return True
+
+
+def validate(text, schema):
+    """True if the reply holds a JSON object that satisfies schema"""
+    try:
+        return matches_schema(extract_json(text), schema)
+    except ValueError:
+        return False
+
+
+class Route:
+    def __init__(self, models, temperature=None):
+        self.models = models
+        self.temperature = temperature
+
+
+class ModelRouter:
+    """Resolves a filter's declared tiers to models and keeps per-(filter, model) stats"""
+
+    def __init__(self, tiers=None, routes=None, prices=None):
+        self.tiers = dict(TIERS, **(tiers or {}))
+        # Operator overrides by filter name; these win over what the filter declares
+        self.routes = routes or {}
+        self.prices = dict(PRICES, **{model: tuple(price) for model, price in (prices or {}).items()})
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        MODEL_TIERS: JSON {"lite": "model-name"} replacing tier models.
+        FILTER_MODEL_ROUTES: JSON {"blue": {"tiers": ["lite", "flash"], "temperature": 0.3}}.
+        MODEL_PRICES: JSON {"model-name": [prompt_usd, response_usd]} per million tokens.
+        """
+        return cls(
+            tiers=json.loads(os.environ.get('MODEL_TIERS', '{}') or '{}'),
+            routes=json.loads(os.environ.get('FILTER_MODEL_ROUTES', '{}') or '{}'),
+            prices=json.loads(os.environ.get('MODEL_PRICES', '{}') or '{}')
+        )
+
+    def route(self, filter_name, tiers=None, temperature=None):
+        """The cascade for one call: models to try in order and the temperature to use"""
+        override = self.routes.get(filter_name or '', {})
+        tiers = override.get('tiers') or tiers or (DEFAULT_TIER,)
+        # An unknown tier is taken as a literal model name
+        models = [self.tiers.get(tier, tier) for tier in tiers]
+        return Route(models, override.get('temperature', temperature))
+
+    def cost(self, model, prompt_tokens, response_tokens):
+        prompt_price, response_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + response_tokens * response_price) / 1e6
+
+    def record(self, filter_name, model, seconds, prompt_tokens, response_tokens):
+        """Tally one successful upstream call on a route"""
+        cost = self.cost(model, prompt_tokens, response_tokens)
+        route_cost.inc(cost, filter=filter_name or 'unknown', model=model)
+        with self.lock:
+            stats = self._stats(filter_name, model)
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['prompt_tokens'] += prompt_tokens
+            stats['response_tokens'] += response_tokens
+            stats['cost_usd'] += cost
+
+    def record_escalation(self, filter_name, model):
+        """A reply from model failed validation and the call moved up a tier"""
+        route_escalations.inc(filter=filter_name or 'unknown', model=model)
+        with self.lock:
+            self._stats(filter_name, model)['escalations'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            routes = {}
+            for (filter_name, model), stats in self.stats.items():
+                calls = stats['calls']
+                routes.setdefault(filter_name, {})[model] = {
+                    'calls': calls,
+                    'escalations': stats['escalations'],
+                    'escalation_rate': round(stats['escalations'] / calls, 3) if calls else None,
+                    'mean_ms': round(stats['seconds'] / calls * 1000, 1) if calls else None,
+                    'max_ms': round(stats['max_seconds'] * 1000, 1),
+                    'prompt_tokens': stats['prompt_tokens'],
+                    'response_tokens': stats['response_tokens'],
+                    'cost_usd': round(stats['cost_usd'], 6),
+                    'cost_per_call_usd': round(stats['cost_usd'] / calls, 6) if calls else None,
+                }
+        return {'tiers': dict(self.tiers), 'overrides': dict(self.routes), 'routes': routes}
+
+    def _stats(self, filter_name, model):
+        # Called with self.lock held
+        return self.stats.setdefault((filter_name or 'unknown', model), {
+            'calls': 0, 'escalations': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+            'prompt_tokens': 0, 'response_tokens': 0, 'cost_usd': 0.0
+        })
+
+
+model_router = ModelRouter.from_env()
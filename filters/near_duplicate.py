@@ -0,0 +1,167 @@
+"""
+Near-Duplicate Index - SimHash fingerprints of filter inputs
+Reworded or re-copied text (different whitespace, hyphenation, page headers)
+finds the result of an earlier run of the same filter and mode instead of
+calling Gemini again
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .answer_matcher import STOP_WORDS
+
+BITS = 64
+
+# "photo-\nsynthesis" from PDF line wrapping
+HYPHEN_BREAK = re.compile(r'(\w)-\s*\n\s*(\w)')
+# Running headers and footers: "Page 3", "3 of 12", bare page numbers
+PAGE_LINE = re.compile(r'^\s*(page\s+)?\d+(\s*(of|/)\s*\d+)?\s*$', re.IGNORECASE | re.MULTILINE)
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Content words of text with PDF artefacts, case, punctuation and stop words removed"""
+    text = HYPHEN_BREAK.sub(r'\1\2', text)
+    text = PAGE_LINE.sub(' ', text)
+    return [word for word in WORD.findall(text.lower()) if word not in STOP_WORDS]
+
+
+def simhash(words, shingle=1):
+    """
+    64-bit SimHash over word shingles; near-identical texts differ in a few bits.
+    Single words are the default: a changed word then moves one feature, not three.
+    """
+    if len(words) < shingle:
+        shingle = 1
+    hashes = [
+        format(int.from_bytes(hashlib.blake2b(' '.join(words[i:i + shingle]).encode('utf-8'),
+                                              digest_size=8).digest(), 'big'), '064b')
+        for i in range(len(words) - shingle + 1)
+    ]
+    half = len(hashes) / 2
+    # Column-wise bit counts via zip, far cheaper than 64 shifts per shingle
+    fingerprint = 0
+    for column in zip(*hashes):
+        fingerprint = (fingerprint << 1) | (column.count('1') > half)
+    return fingerprint
+
+
+def band_masks(max_distance):
+    """
+    Split the 64 bits into max_distance + 1 bands. Two fingerprints within
+    max_distance bits agree exactly on at least one band (pigeonhole), so a
+    lookup only needs one dictionary probe per band.
+    """
+    bands = max_distance + 1
+    masks, start = [], 0
+    for i in range(bands):
+        width = BITS // bands + (1 if i < BITS % bands else 0)
+        masks.append(((1 << width) - 1) << start)
+        start += width
+    return masks
+
+
+class NearDuplicateIndex:
+    """(filter, mode) -> SimHash-banded results, LRU-bounded with a TTL"""
+
+    def __init__(self, max_distance=4, max_entries=1000, min_words=20, ttl=3600, enabled=True):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        # Below this, a few words change a large share of the shingles
+        self.min_words = min_words
+        self.ttl = ttl
+        self.enabled = enabled
+        self.masks = band_masks(max_distance)
+        self.entries = OrderedDict()
+        self.bands = {}
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build the index from NEAR_DUP_* environment variables"""
+        return cls(
+            max_distance=int(os.environ.get('NEAR_DUP_MAX_DISTANCE', 4)),
+            max_entries=int(os.environ.get('NEAR_DUP_MAX_ENTRIES', 1000)),
+            min_words=int(os.environ.get('NEAR_DUP_MIN_WORDS', 20)),
+            ttl=int(os.environ.get('NEAR_DUP_TTL', 3600)),
+            enabled=os.environ.get('NEAR_DUP_ENABLED', '1') != '0'
+        )
+
+    def fingerprint(self, text):
+        """(simhash, word_count) for text, or None if it is too short to compare"""
+        words = normalize(text)
+        if len(words) < self.min_words:
+            return None
+        return simhash(words), len(words)
+
+    def lookup(self, namespace, fingerprint):
+        """The stored result closest to fingerprint within max_distance, or None"""
+        if not self.enabled or fingerprint is None:
+            return None
+        value, words = fingerprint
+        now = time.time()
+        best, best_distance = None, self.max_distance + 1
+        with self.lock:
+            seen = set()
+            for band, mask in enumerate(self.masks):
+                for entry_id in self.bands.get((namespace, band, value & mask), ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    _, other, other_words, result, stored_at = self.entries[entry_id]
+                    if now - stored_at > self.ttl:
+                        continue
+                    # A long document that happens to share a fingerprint with an excerpt is not a duplicate
+                    if abs(other_words - words) > max(words, other_words) * 0.2:
+                        continue
+                    distance = bin(value ^ other).count('1')
+                    if distance < best_distance:
+                        best, best_distance = entry_id, distance
+            if best is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(best)
+            self.stats['hits'] += 1
+            return self.entries[best][3]
+
+    def add(self, namespace, fingerprint, result):
+        if not self.enabled or fingerprint is None:
+            return
+        value, words = fingerprint
+        with self.lock:
+            self.counter += 1
+            entry_id = self.counter
+            self.entries[entry_id] = (namespace, value, words, result, time.time())
+            for band, mask in enumerate(self.masks):
+                self.bands.setdefault((namespace, band, value & mask), set()).add(entry_id)
+            self.stats['stores'] += 1
+            while len(self.entries) > self.max_entries:
+                self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bands.clear()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), enabled=self.enabled,
+                        max_distance=self.max_distance)
+
+    def _evict(self):
+        # Called with self.lock held
+        entry_id, (namespace, value, _, _, _) = self.entries.popitem(last=False)
+        for band, mask in enumerate(self.masks):
+            key = (namespace, band, value & mask)
+            bucket = self.bands.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self.bands[key]
+        self.stats['evictions'] += 1
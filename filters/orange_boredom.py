@@ -5,9 +5,36 @@ Makes content fun with jokes, sarcasm, and silliness
 
 import re
 import random
-from .ai_helper import get_ai_response
+from .ai_helper import get_ai_response_async, gather_bounded
+from .base import BaseFilter
+from .json_extract import extract_json
 
-class BoredomFilter:
+COMBINED_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "jokes": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"setup": {"type": "STRING"}, "punchline": {"type": "STRING"}},
+                "required": ["setup", "punchline"]
+            }
+        },
+        "silly_text": {"type": "STRING"}
+    },
+    "required": ["jokes", "silly_text"]
+}
+
+class BoredomFilter(BaseFilter):
+    name = 'orange'
+    # Short passages make the best jokes; a few of them cover a whole chapter
+    max_chunks = 3
+    # Jokes are supposed to vary between runs, so skip the response cache
+    cache_responses = False
+    # Jokes don't need the full model, but do want more randomness
+    model_tiers = ('lite',)
+    temperature = 0.9
+    
     def __init__(self):
         self.silly_prefixes = [
             "🤪 Hold onto your textbooks!",
@@ -16,16 +43,22 @@ class BoredomFilter:
             "🦄 In a universe where studying is fun:",
             "🎭 *dramatic voice*",
         ]
-        self.joke_cache = []
     
-    def process(self, text, mode='normal'):
+    async def process_chunk_async(self, text, mode='normal'):
         """Process text to make it more engaging and fun"""
         # Ensure text is valid
         if not text or not isinstance(text, str):
             text = "No content provided"
         
-        # Generate jokes about the content
-        jokes = self._generate_jokes(text)
+        if self.combined_prompts:
+            # One request returns both sections, so the text is only sent once
+            jokes, silly_rewrite = await self._generate_combined(text)
+        else:
+            # Jokes and the silly rewrite are independent prompts, so send them together
+            jokes, silly_rewrite = await gather_bounded(
+                self._generate_jokes(text),
+                self._make_silly(text)
+            )
         
         # Add sarcastic commentary
         sarcasm = self._add_sarcasm(text)
@@ -33,9 +66,6 @@ class BoredomFilter:
         # Create fun facts
         fun_facts = self._create_fun_facts(text)
         
-        # Make silly rewrite
-        silly_rewrite = self._make_silly(text)
-        
         # Ensure all values are lists/valid
         jokes = jokes if isinstance(jokes, list) else []
         sarcasm = sarcasm if isinstance(sarcasm, list) else []
@@ -50,22 +80,61 @@ class BoredomFilter:
             'original_text': text
         }
     
-    def _make_silly(self, text):
+    def reduce_results(self, results, mode='normal'):
+        """Stitch the per-passage rewrites together and keep the best few jokes"""
+        return {
+            'silly_text': '\n\n'.join(r['silly_text'] for r in results),
+            'jokes': [joke for r in results for joke in r['jokes']][:6],
+            'sarcastic_commentary': [c for r in results for c in r['sarcastic_commentary']][:5],
+            'fun_facts': results[0]['fun_facts'],
+            'original_text': '\n\n'.join(r['original_text'] for r in results)
+        }
+    
+    async def _generate_combined(self, text):
+        """Get jokes and the silly rewrite from a single structured request"""
+        prompt = f"""Make this study text fun. Return ONLY JSON with two fields:
+        "jokes": 3 funny, lighthearted jokes or puns about the material, each with a "setup" and a "punchline".
+        "silly_text": the text rewritten to be extremely casual, with Gen Z slang, emojis, and silly humor. Keep the core meaning but make it entertaining.
+        
+        TEXT: {text}
+        """
+        try:
+            response = await get_ai_response_async(
+                prompt,
+                use_cache=self.cache_responses,
+                response_schema=COMBINED_SCHEMA,
+                **self.ai_options()
+            )
+            result = extract_json(response)
+        except Exception:
+            return self._get_fallback_jokes(), self._silly_fallback(text)
+        
+        jokes = [
+            joke for joke in result.get('jokes', [])
+            if isinstance(joke, dict) and joke.get('setup') and joke.get('punchline')
+        ]
+        silly_text = result.get('silly_text')
+        return (jokes[:3] or self._get_fallback_jokes(), silly_text if isinstance(silly_text, str) and silly_text else text)
+    
+    def _silly_fallback(self, text):
+        return f"{random.choice(self.silly_prefixes)}\n\n{text}\n\n(Could not generate silly version, but here's the original! 🤪)"
+    
+    async def _make_silly(self, text):
         """Rewrite text in a silly/slang style using AI"""
         if not text:
             return "No content to make silly! 🤪"
         
         prompt = f"""Rewrite this study text to be extremely casual, use Gen Z slang, emojis, and be funny/silly. Keep the core meaning but make it entertaining.
         
-        Text: "{text[:1000]}..."
+        Text: "{text}"
         """
         try:
-            result = get_ai_response(prompt)
+            result = await get_ai_response_async(prompt, use_cache=self.cache_responses, **self.ai_options())
             return result if result else text
         except Exception:
-            return f"{random.choice(self.silly_prefixes)}\n\n{text}\n\n(Could not generate silly version, but here's the original! 🤪)"
+            return self._silly_fallback(text)
     
-    def _generate_jokes(self, text):
+    async def _generate_jokes(self, text):
         """Generate jokes related to the content using AI"""
         if not text:
             return []
@@ -75,11 +144,11 @@ class BoredomFilter:
         Q: [Setup]
         A: [Punchline]
         
-        TEXT: {text[:1000]}
+        TEXT: {text}
         """
 
         try:
-            response = get_ai_response(prompt)
+            response = await get_ai_response_async(prompt, use_cache=self.cache_responses, **self.ai_options())
             if not response: return self._get_fallback_jokes()
             
             jokes = []
@@ -147,7 +216,3 @@ class BoredomFilter:
             "🚶 Walking while studying can increase creativity by 60%!"
         ]
         return random.sample(facts, min(3, len(facts)))
-    
-    def _suggest_memes(self, text):
-        """Stub for memes"""
-        return []
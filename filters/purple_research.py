@@ -3,21 +3,65 @@ Purple Filter - Research Links
 Uses Gemini 2.5 Flash to suggest resources
 """
 
-import json
-from .ai_helper import get_ai_response
+from .base import BaseFilter
+from .json_extract import extract_json
 
-class ResearchFilter:
+# The only topic when no research could be generated
+RESEARCH_ERROR = "Research Error"
+
+class ResearchFilter(BaseFilter):
+    name = 'purple'
+    model_tiers = ('flash',)
+    temperature = 0.4
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "topics": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "search_queries": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "basic": {"type": "STRING"},
+                        "video": {"type": "STRING"},
+                        "academic": {"type": "STRING"}
+                    },
+                    "required": ["basic", "video", "academic"]
+                }
+            },
+            "research_plan": {
+                "type": "OBJECT",
+                "properties": {
+                    "phases": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "name": {"type": "STRING"},
+                                "time": {"type": "STRING"},
+                                "activities": {"type": "ARRAY", "items": {"type": "STRING"}}
+                            },
+                            "required": ["name", "time", "activities"]
+                        }
+                    }
+                },
+                "required": ["phases"]
+            }
+        },
+        "required": ["topics", "search_queries", "research_plan"]
+    }
+    
     def __init__(self):
         self.resource_types = ['articles', 'videos', 'courses', 'books']
     
-    def process(self, text, mode='normal'):
+    def build_prompt(self, text, mode='normal'):
         """Generate research resources and links using pure AI"""
         
-        prompt = f"""
+        return f"""
         Act as a research assistant. Analyze this text and provide resources for deeper learning.
         
         TEXT:
-        {text[:4000]}
+        {text}
         
         TASK:
         1. Identify 5 Key Topics.
@@ -39,57 +83,51 @@ class ResearchFilter:
             }}
         }}
         """
-        
-        response_text = get_ai_response(prompt)
-        clean_json = response_text.replace('```json', '').replace('```', '').strip()
-        
+    
+    def parse_response(self, response_text, mode='normal'):
+        """Turn the model's JSON reply into topics, queries and a plan"""
         try:
-            result = json.loads(clean_json)
+            result = extract_json(response_text)
             return result
         except Exception:
             return {
-                "topics": ["Research Error"],
+                "topics": [RESEARCH_ERROR],
                 "search_queries": [],
                 "research_plan": {"phases": []}
             }
     
-    def _extract_topics(self, text):
-        """Extract main topics from text"""
-        # Use simple extraction
-        words = text.split()
-        
-        # Find capitalized multi-word phrases
-        topics = []
-        current_phrase = []
-        
-        for word in words:
-            clean = re.sub(r'[^\w\s]', '', word)
-            if clean and clean[0].isupper() and len(clean) > 2:
-                current_phrase.append(clean)
-            else:
-                if len(current_phrase) > 0:
-                    topics.append(' '.join(current_phrase))
-                    current_phrase = []
-        
-        # Add last phrase
-        if current_phrase:
-            topics.append(' '.join(current_phrase))
-        
-        # Get unique topics
-        unique_topics = list(dict.fromkeys(topics))[:5]
-        
-        # If no topics found, use AI
-        if not unique_topics:
-            prompt = f"""Extract 3-5 main topics or concepts from this text:
-
-"{text[:500]}..."
-
-List only the topic names, one per line."""
-            
-            ai_response = get_ai_response(prompt)
-            unique_topics = [line.strip('- •*') for line in ai_response.split('\n') if line.strip()][:5]
-        
-        return unique_topics if unique_topics else ['the main subject']
+    def is_reusable(self, result):
+        return super().is_reusable(result) and result.get('topics') != [RESEARCH_ERROR]
+    
+    def reduce_results(self, results, mode='normal'):
+        """Merge per-chunk research: dedupe topics and queries, pool phase activities"""
+        topics, queries, phases = [], [], []
+        seen_topics, seen_queries = set(), set()
+        for result in results:
+            for topic in result.get('topics', []):
+                if isinstance(topic, str) and topic.lower() not in seen_topics and topic != RESEARCH_ERROR:
+                    seen_topics.add(topic.lower())
+                    topics.append(topic)
+            for query in result.get('search_queries', []):
+                key = str(query.get('basic', '')).lower() if isinstance(query, dict) else ''
+                if key and key not in seen_queries:
+                    seen_queries.add(key)
+                    queries.append(query)
+            for i, phase in enumerate(result.get('research_plan', {}).get('phases', [])):
+                if not isinstance(phase, dict):
+                    continue
+                if i == len(phases):
+                    phases.append(dict(phase, activities=list(phase.get('activities', []))))
+                else:
+                    for activity in phase.get('activities', []):
+                        if activity not in phases[i]['activities']:
+                            phases[i]['activities'].append(activity)
+        
+        return {
+            "topics": topics[:10] or [RESEARCH_ERROR],
+            "search_queries": queries[:10],
+            "research_plan": {"phases": phases}
+        }
     
     def _generate_search_queries(self, topics):
         """Generate effective search queries"""
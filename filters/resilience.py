@@ -0,0 +1,233 @@
+"""
+Resilience - Error classification, backoff, rate limiting and circuit breaking
+Keeps Gemini brownouts from tying up every worker in sleeps and timeouts
+"""
+
+import email.utils
+import http.client
+import os
+import random
+import socket
+import threading
+import time
+
+from .gemini_client import GeminiHTTPError
+
+
+class GeminiError(Exception):
+    """Base class for upstream failures; retryable ones may succeed on a later attempt"""
+    retryable = False
+    status = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GeminiConfigError(GeminiError):
+    """The app is not configured to call Gemini (e.g. no API key)"""
+    status = 500
+
+
+class GeminiClientError(GeminiError):
+    """4xx other than 408/429: the request itself is wrong and will never succeed"""
+    status = 502
+
+
+class GeminiBlockedError(GeminiError):
+    """Gemini answered but produced no content (usually a safety block)"""
+    status = 422
+
+
+class GeminiRateLimitError(GeminiError):
+    """429 from Gemini, or our own quota limiter ran dry"""
+    retryable = True
+    status = 429
+
+
+class GeminiServerError(GeminiError):
+    """5xx or 408 from Gemini"""
+    retryable = True
+
+
+class GeminiTransportError(GeminiError):
+    """Timeouts, resets and other network failures"""
+    retryable = True
+
+
+class CircuitOpenError(GeminiError):
+    """Failing fast because the upstream has been unhealthy"""
+
+
+def parse_retry_after(value):
+    """Retry-After as seconds; accepts delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error):
+    """Map a raw exception from the transport into a typed GeminiError"""
+    if isinstance(error, GeminiError):
+        return error
+    if isinstance(error, GeminiHTTPError):
+        retry_after = parse_retry_after(error.headers.get('retry-after'))
+        message = f"Gemini returned HTTP {error.status}"
+        if error.status == 429:
+            return GeminiRateLimitError(message, retry_after)
+        if error.status == 408 or error.status >= 500:
+            return GeminiServerError(message, retry_after)
+        return GeminiClientError(f"{message}: {error.body[:200]}")
+    if isinstance(error, (socket.timeout, TimeoutError)):
+        return GeminiTransportError("Gemini request timed out")
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        return GeminiTransportError(f"Network error talking to Gemini: {error}")
+    return GeminiError(f"Unexpected Gemini error: {error}")
+
+
+def backoff_delay(attempt, retry_after=None, base=0.5, cap=8.0):
+    """Exponential backoff with full jitter, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class TokenBucket:
+    """Process-wide request limiter; rate is requests per second, 0 disables it"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        # Quota is per project; divide it by the worker count when running several
+        rpm = float(os.environ.get('GEMINI_RATE_LIMIT_RPM', 0))
+        burst = float(os.environ.get('GEMINI_RATE_LIMIT_BURST', 0)) or None
+        return cls(rpm / 60.0, burst)
+
+    def acquire(self, timeout=0.0):
+        """Take one token, waiting up to timeout seconds; returns False if none came free"""
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def time_until_available(self):
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def get_stats(self):
+        with self.lock:
+            self._refill()
+            return {'rate_per_second': self.rate, 'capacity': self.capacity, 'available': round(self.tokens, 2)}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive upstream failures, fails fast for
+    reset_timeout seconds, then lets a single trial call through (half-open).
+    A trial that reports no outcome within trial_timeout is given up on, so a
+    lost trial can't keep the breaker half-open forever.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, trial_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.trial_started = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failure_threshold=int(os.environ.get('GEMINI_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.environ.get('GEMINI_BREAKER_RESET', 30)),
+            trial_timeout=float(os.environ.get('GEMINI_BREAKER_TRIAL_TIMEOUT', 60))
+        )
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go upstream right now. Returns
+        True when this call is the half-open trial; the caller must then report
+        record_success, record_failure or abandon_trial.
+        """
+        with self.lock:
+            if self.state == 'closed':
+                return False
+            now = time.monotonic()
+            remaining = self.opened_at + self.reset_timeout - now
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self.trial_in_flight and now - self.trial_started >= self.trial_timeout:
+                    self.trial_in_flight = False
+                if not self.trial_in_flight:
+                    self.trial_in_flight = True
+                    self.trial_started = now
+                    return True
+            raise CircuitOpenError(
+                "Gemini is temporarily unavailable; please try again shortly",
+                retry_after=max(1.0, remaining)
+            )
+
+    def abandon_trial(self):
+        """The trial ended without an outcome (interrupted, client gone); let the next call try"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self, error):
+        # Client errors and quota pushback say nothing about upstream health
+        if not error.retryable or isinstance(error, GeminiRateLimitError):
+            with self.lock:
+                self.trial_in_flight = False
+            return
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def get_stats(self):
+        with self.lock:
+            return {'state': self.state, 'consecutive_failures': self.failures}
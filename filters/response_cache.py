@@ -0,0 +1,235 @@
+"""
+Response Cache - Content-addressed cache in front of Gemini
+In-memory LRU tier with TTL and size eviction, plus an optional SQLite tier
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(model, prompt, generation_config):
+    """Hash model, prompt and generation config into a stable cache key"""
+    payload = json.dumps(
+        {'model': model, 'prompt': prompt, 'config': generation_config},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryCacheTier:
+    """LRU tier bounded by entry count and total bytes, with per-entry TTL"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, expires_at, size)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, expires_at, size)
+            self.total_bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.total_bytes -= size
+
+
+class SQLiteCacheTier:
+    """Persistent tier so cached responses survive restarts"""
+
+    def __init__(self, path, purge_interval=300):
+        self.path = path
+        # Expired rows are only skipped on read, so writes sweep them out every purge_interval seconds
+        self.purge_interval = purge_interval
+        self.next_purge = time.time() + purge_interval
+        self.local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses(expires_at)")
+        conn.commit()
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        """(value, expires_at) for a live entry, or None"""
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return value, expires_at
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+            (key, value, expires_at, now)
+        )
+        conn.commit()
+        if now >= self.next_purge:
+            self.next_purge = now + self.purge_interval
+            self.purge_expired()
+
+    def delete(self, key):
+        conn = self._connect()
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._connect()
+        cursor = conn.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Two-tier response cache with hit/miss counters"""
+
+    def __init__(self, ttl=3600, max_entries=1024, max_bytes=64 * 1024 * 1024, disk_path=None, enabled=True,
+                 purge_interval=300):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.memory = MemoryCacheTier(max_entries=max_entries, max_bytes=max_bytes)
+        self.disk = SQLiteCacheTier(disk_path, purge_interval) if disk_path else None
+        self.stats = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+        self.stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from GEMINI_CACHE_* environment variables"""
+        return cls(
+            ttl=int(os.environ.get('GEMINI_CACHE_TTL', 3600)),
+            max_entries=int(os.environ.get('GEMINI_CACHE_MAX_ENTRIES', 1024)),
+            max_bytes=int(os.environ.get('GEMINI_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            disk_path=os.environ.get('GEMINI_CACHE_PATH') or None,
+            enabled=os.environ.get('GEMINI_CACHE_ENABLED', '1') != '0',
+            purge_interval=int(os.environ.get('GEMINI_CACHE_PURGE_INTERVAL', 300))
+        )
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('hits', 'memory_hits')
+            return value
+        if self.disk is not None:
+            entry = self.disk.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                # Promote to the memory tier for the next caller, keeping the entry's original expiry
+                self.memory.set(key, value, max(expires_at - time.time(), 0.001) if expires_at is not None else None)
+                self._count('hits', 'disk_hits')
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        self.memory.set(key, value, self.ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, self.ttl)
+        self._count('stores')
+
+    def purge(self, key=None):
+        """Drop a single entry, or every entry when no key is given"""
+        if key is None:
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+        else:
+            self.memory.delete(key)
+            if self.disk is not None:
+                self.disk.delete(key)
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['memory_entries'] = len(self.memory)
+        stats['memory_bytes'] = self.memory.total_bytes
+        if self.disk is not None:
+            stats['disk_entries'] = len(self.disk)
+        return stats
+
+    def _count(self, *names):
+        with self.stats_lock:
+            for name in names:
+                self.stats[name] += 1
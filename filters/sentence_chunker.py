@@ -0,0 +1,109 @@
+"""
+Sentence Chunker - Streaming, sentence-aware chunking by offsets
+One pass over the words of a text yields chunks that end at sentence (or
+paragraph) boundaries near a soft target size and never exceed a hard
+maximum; chunks are (start, end) offsets, so nothing is copied until a
+caller slices the source
+"""
+
+import re
+from collections import namedtuple
+
+WORD = re.compile(r'\S+')
+# Closing quotes and brackets may follow the terminator: 'end."' or 'end.)'
+CLOSERS = '"\'”’)]'
+TERMINATORS = '.!?'
+SENTENCE_TAIL = frozenset(TERMINATORS + CLOSERS)
+ABBREVIATIONS = frozenset((
+    'e.g.', 'i.e.', 'cf.', 'vs.', 'approx.', 'fig.', 'figs.', 'eq.', 'no.', 'vol.', 'p.', 'pp.',
+    'dr.', 'mr.', 'mrs.', 'ms.', 'prof.', 'st.', 'jr.', 'sr.',
+))
+
+
+class Span(namedtuple('Span', 'index start end words lead_end')):
+    """
+    One chunk of a source string: [start, end) offsets, its word count, and
+    where its first sentence ends (lead_end)
+    """
+    __slots__ = ()
+
+    def text(self, source):
+        return source[self.start:self.end]
+
+
+def ends_sentence(word):
+    """True if a whitespace-delimited word closes a sentence"""
+    stripped = word.rstrip(CLOSERS)
+    if not stripped or stripped[-1] not in TERMINATORS:
+        return False
+    return word.lower() not in ABBREVIATIONS
+
+
+def iter_chunks(text, target_words=300, max_words=450, start=0, end=None):
+    """
+    Yield Spans covering text[start:end]. A chunk closes at the first sentence
+    end once it has target_words words. If max_words is reached first, it is
+    cut back to its last sentence end (when that keeps at least half the
+    target), otherwise cut at the word limit, so unpunctuated text still
+    splits. A blank line counts as a sentence end. Linear time; the only
+    state is a handful of offsets.
+    """
+    end = len(text) if end is None else end
+    index = 0
+    chunk_start = None
+    words = 0
+    lead_end = None
+    # The chunk's last sentence end, and its word count up to there
+    cut_end, cut_words = None, 0
+    previous_end = start
+
+    for match in WORD.finditer(text, start, end):
+        word_start, word_end = match.span()
+
+        if chunk_start is not None and text.count('\n', previous_end, word_start) >= 2:
+            cut_end, cut_words = previous_end, words
+            if lead_end is None:
+                lead_end = previous_end
+            if words >= target_words:
+                yield Span(index, chunk_start, previous_end, words, lead_end)
+                index += 1
+                chunk_start, words, lead_end, cut_end = None, 0, None, None
+
+        if chunk_start is None:
+            chunk_start = word_start
+        words += 1
+
+        # Checking the last character first skips building a string for most words
+        if text[word_end - 1] in SENTENCE_TAIL and ends_sentence(match.group()):
+            if lead_end is None:
+                lead_end = word_end
+            if words >= target_words:
+                yield Span(index, chunk_start, word_end, words, lead_end)
+                index += 1
+                chunk_start, words, lead_end, cut_end = None, 0, None, None
+            else:
+                cut_end, cut_words = word_end, words
+        elif words >= max_words:
+            if cut_end is not None and cut_words >= target_words // 2:
+                # Back up to the last sentence end; the words after it open the next chunk
+                yield Span(index, chunk_start, cut_end, cut_words, lead_end)
+                chunk_start = WORD.search(text, cut_end, end).start()
+                words -= cut_words
+                lead_end = None
+            else:
+                yield Span(index, chunk_start, word_end, words, lead_end or word_end)
+                chunk_start, words, lead_end = None, 0, None
+            index += 1
+            cut_end = None
+
+        previous_end = word_end
+
+    if chunk_start is not None:
+        yield Span(index, chunk_start, previous_end, words, lead_end or previous_end)
+
+
+def lead_sentence(text, span, limit=100):
+    """A chunk's first sentence without its terminator, cut to limit characters with '...'"""
+    if span.lead_end - span.start > limit:
+        return text[span.start:span.start + limit].rstrip() + '...'
+    return text[span.start:span.lead_end].rstrip(CLOSERS + TERMINATORS)
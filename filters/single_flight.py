@@ -0,0 +1,56 @@
+"""
+Single Flight - Coalesce identical in-flight calls
+Concurrent callers with the same key wait on one execution and share its result
+"""
+
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+class SingleFlight:
+    def __init__(self, timeout=None):
+        # Longest a follower waits on the leader before making the call itself;
+        # None waits as long as the leader takes
+        self.timeout = timeout
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.stats = {'executed': 0, 'coalesced': 0, 'timed_out': 0}
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; callers arriving meanwhile get the same result"""
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                future = Future()
+                self.calls[key] = future
+                self.stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            try:
+                return future.result(self.timeout)
+            except FutureTimeout:
+                # A hung leader must not hold every follower; run independently
+                with self.lock:
+                    self.stats['timed_out'] += 1
+                return fn()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self.calls)
+        return stats
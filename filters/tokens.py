@@ -0,0 +1,85 @@
+"""
+Tokens - Offline token estimation, per-filter budgets and usage accounting
+"""
+
+import json
+import os
+import re
+import threading
+
+# Words and individual punctuation marks, roughly how SentencePiece splits English
+TOKEN_PIECE = re.compile(r"\w+|[^\w\s]")
+
+# Input budget is per chunk of study text; output budget becomes maxOutputTokens
+DEFAULT_BUDGETS = {
+    'blue': {'input': 1000, 'output': 2048},
+    'yellow': {'input': 1000, 'output': 3072},
+    'purple': {'input': 1000, 'output': 2048},
+    'grey': {'input': 500, 'output': 512},
+    'orange': {'input': 250, 'output': 1024},
+    'green': {'input': 2000, 'output': 1024},
+}
+FALLBACK_BUDGET = {'input': 1000, 'output': 4096}
+
+
+def _piece_tokens(piece):
+    # Short words are one token; longer ones split roughly every five characters
+    return 1 if len(piece) <= 5 else 1 + (len(piece) - 1) // 5
+
+
+def estimate_tokens(text):
+    """Estimate the Gemini token count of text without calling the API"""
+    return sum(_piece_tokens(m.group()) for m in TOKEN_PIECE.finditer(text))
+
+
+class TokenBudget:
+    def __init__(self, input_tokens, output_tokens):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+def _load_budgets():
+    budgets = {name: dict(budget) for name, budget in DEFAULT_BUDGETS.items()}
+    # e.g. FILTER_TOKEN_BUDGETS='{"blue": {"input": 2000}, "orange": {"output": 512}}'
+    overrides = json.loads(os.environ.get('FILTER_TOKEN_BUDGETS', '{}') or '{}')
+    for name, budget in overrides.items():
+        budgets.setdefault(name, dict(FALLBACK_BUDGET)).update(budget)
+    return budgets
+
+
+_budgets = _load_budgets()
+
+
+def get_budget(filter_name):
+    budget = _budgets.get(filter_name, FALLBACK_BUDGET)
+    return TokenBudget(budget['input'], budget['output'])
+
+
+class UsageTracker:
+    """Per-filter prompt/response token totals for every model call"""
+
+    def __init__(self):
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def record(self, filter_name, prompt_tokens, response_tokens, estimated=False):
+        with self.lock:
+            totals = self.totals.setdefault(filter_name or 'unknown', {
+                'calls': 0, 'prompt_tokens': 0, 'response_tokens': 0, 'estimated_calls': 0
+            })
+            totals['calls'] += 1
+            totals['prompt_tokens'] += prompt_tokens
+            totals['response_tokens'] += response_tokens
+            if estimated:
+                totals['estimated_calls'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = {name: dict(totals) for name, totals in self.totals.items()}
+        for totals in stats.values():
+            totals['avg_prompt_tokens'] = round(totals['prompt_tokens'] / totals['calls'], 1)
+            totals['avg_response_tokens'] = round(totals['response_tokens'] / totals['calls'], 1)
+        return stats
+
+
+usage_tracker = UsageTracker()
@@ -3,19 +3,101 @@ Yellow Filter - Memory Mastery
 Uses Gemini 2.5 Flash to generate fill-in-the-blank exercises
 """
 
-import json
-from .ai_helper import get_ai_response
+from .base import BaseFilter
+from .card_store import BLANK_MARKER, card_store, text_hash
+from .fair_scheduler import current_caller
+from .hint_index import HINT_LEVELS, HintIndex, build_hints
+from .json_extract import extract_json
 
-class MemoryFilter:
-    def process(self, text, mode='normal'):
+# Exercise sets generated by any worker can be found again through the card store
+hint_index = HintIndex(loader=card_store.get_exercises_by_id if card_store is not None else None)
+
+EXERCISE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "text": {"type": "STRING"},
+        "blanks": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"answer": {"type": "STRING"}, "hint": {"type": "STRING"}},
+                "required": ["answer", "hint"]
+            }
+        }
+    },
+    "required": ["text", "blanks"]
+}
+
+class MemoryFilter(BaseFilter):
+    name = 'yellow'
+    # Blanks and hints are usually fine from the light model
+    model_tiers = ('lite', 'flash')
+    temperature = 0.5
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "exercises": {
+                "type": "OBJECT",
+                "properties": {level: EXERCISE_SCHEMA for level in ("easy", "medium", "hard")},
+                "required": ["easy", "medium", "hard"]
+            },
+            "mode": {"type": "STRING"}
+        },
+        "required": ["exercises"]
+    }
+    
+    async def process_async(self, text, mode='normal'):
+        """Reuse the stored exercise set for text we've seen; only new material goes to Gemini"""
+        digest = text_hash(text)
+        if card_store is not None:
+            stored = card_store.get_exercises(digest, owner=current_caller.get())
+            if stored is not None:
+                hint_index.add(stored)
+                return dict(stored, mode=mode, from_cards=True)
+        
+        result = await super().process_async(text, mode=mode)
+        if result.get('error') or not result.get('exercises'):
+            return result
+        if card_store is not None:
+            result = card_store.save_exercises(digest, result, owner=current_caller.get())
+        else:
+            result['exercise_id'] = digest[:16]
+        hint_index.add(result)
+        return result
+    
+    def get_hint(self, word=None, exercise_id=None, level='easy', blank=1, hint_level=1):
+        """
+        Progressive hint for one blank, without calling Gemini. Levels go
+        first letter, length, masked letters, then the model's own hint.
+        With only a word (the old API), hints are built from the word itself.
+        """
+        if exercise_id:
+            hints = hint_index.hints(exercise_id, level, blank)
+        elif word:
+            hints = build_hints(word)
+        else:
+            hints = None
+        if hints is None:
+            return None
+        
+        hint_level = min(max(1, hint_level), len(hints))
+        return {
+            'hint': hints[hint_level - 1],
+            'hint_level': hint_level,
+            'kind': HINT_LEVELS[hint_level - 1],
+            'max_level': len(hints),
+            'has_more': hint_level < len(hints)
+        }
+    
+    def build_prompt(self, text, mode='normal'):
         """Generate fill-in-the-blank exercises using Gemini 2.5 Flash"""
         
         # We ask Gemini to do the heavy lifting: summarize and identifying blanks
-        prompt = f"""
+        return f"""
         Create a memory test from this study text.
         
         TEXT:
-        {text[:4000]}
+        {text}
         
         TASK:
         1. Create 3 summary paragraphs of increasing complexity (Easy, Medium, Hard).
@@ -37,14 +119,11 @@ class MemoryFilter:
             "mode": "{mode}"
         }}
         """
-        
-        response_text = get_ai_response(prompt)
-        
-        # Clean JSON
-        clean_json = response_text.replace('```json', '').replace('```', '').strip()
-        
+    
+    def parse_response(self, response_text, mode='normal'):
+        """Turn the model's JSON reply into exercises"""
         try:
-            result = json.loads(clean_json)
+            result = extract_json(response_text)
             # Ensure mode is passed through
             result['mode'] = mode
             return result
@@ -60,4 +139,20 @@ class MemoryFilter:
                 "mode": mode,
                 "error": "AI generation failed"
             }
-
+    
+    def reduce_results(self, results, mode='normal'):
+        """Concatenate per-chunk exercises level by level, renumbering the blanks"""
+        exercises = {}
+        for result in results:
+            for level, exercise in result.get('exercises', {}).items():
+                if not isinstance(exercise, dict) or not exercise.get('blanks'):
+                    continue
+                merged = exercises.setdefault(level, {'text': '', 'blanks': []})
+                offset = len(merged['blanks'])
+                text = BLANK_MARKER.sub(lambda m: f"[BLANK_{int(m.group(1)) + offset}]", exercise.get('text', ''))
+                merged['text'] = f"{merged['text']}\n\n{text}" if merged['text'] else text
+                merged['blanks'].extend(exercise['blanks'])
+        
+        if not exercises:
+            return results[0]
+        return {"exercises": exercises, "mode": mode}
@@ -0,0 +1,44 @@
+"""
+Gunicorn settings - worker processes x threads, tuned for I/O-bound Gemini calls
+"""
+
+import os
+import signal
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+
+# Requests mostly wait on Gemini, so threads do the heavy lifting and processes add isolation
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# A filter run can take a while; graceful_timeout is how long SIGTERM waits for it
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('SHUTDOWN_GRACE', 30))
+keepalive = 5
+
+# Each worker imports the app itself, so no sockets or threads are inherited across fork
+preload_app = False
+
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    from app import begin_drain
+
+    # Flip /readyz to failing as soon as SIGTERM arrives, then let gunicorn stop as usual
+    original = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        begin_drain()
+        if callable(original):
+            original(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def worker_exit(server, worker):
+    from app import drain
+
+    # Open requests are done by now; wait for background jobs and their Gemini calls
+    drain(graceful_timeout)
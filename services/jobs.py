@@ -0,0 +1,571 @@
+"""
+Jobs - Background queue for long filter runs
+Submit returns an id immediately; a bounded worker pool runs the job and the
+result is fetched by polling or delivered to a webhook
+"""
+
+import heapq
+import http.client
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {'high': 10, 'normal': 5, 'low': 0}
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+# Error of a job whose worker died on every attempt
+ABANDONED = "Job was abandoned by its worker too many times"
+
+
+def parse_priority(value):
+    """
+    Accept 'high'/'normal'/'low' or an integer; higher runs first. Integers
+    are clamped to the named range so no client can outrank 'high'.
+    """
+    if value is None:
+        return PRIORITIES['normal']
+    if isinstance(value, str) and value.lower() in PRIORITIES:
+        return PRIORITIES[value.lower()]
+    return min(max(int(value), PRIORITIES['low']), PRIORITIES['high'])
+
+
+class WebhookError(ValueError):
+    """A webhook_url the server must not call"""
+
+
+def check_webhook_url(url, allowed_hosts=()):
+    """
+    Reject webhook URLs that aren't plain http(s), or whose host is not on the
+    operator's allowlist when one is configured. Returns the parsed URL.
+    """
+    try:
+        parsed = urllib.parse.urlsplit(url)
+        parsed.port
+    except (TypeError, ValueError):
+        raise WebhookError("webhook_url is not a valid URL")
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise WebhookError("webhook_url must be an http or https URL")
+    if parsed.username or parsed.password:
+        raise WebhookError("webhook_url must not contain credentials")
+    if allowed_hosts and parsed.hostname.lower() not in allowed_hosts:
+        raise WebhookError("webhook_url host is not allowed")
+    return parsed
+
+
+def resolve_public_address(host, port):
+    """
+    One address for host, refusing loopback, private, link-local (cloud
+    metadata), multicast and reserved ranges. The caller connects to exactly
+    this address, so DNS can't be switched between the check and the request.
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise WebhookError(f"webhook_url host {host} does not resolve")
+    addresses = [info[4][0] for info in infos]
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        # ::ffff:127.0.0.1 is loopback too
+        ip = getattr(ip, 'ipv4_mapped', None) or ip
+        if not ip.is_global or ip.is_multicast:
+            raise WebhookError(f"webhook_url host {host} resolves to a non-public address")
+    return addresses[0]
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection to a pre-resolved address, with the URL's host in the Host header"""
+
+    def __init__(self, host, port, address, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS to a pre-resolved address; the certificate is still checked against the URL's host"""
+
+    def __init__(self, host, port, address, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def new_job(filter_color, text, mode='normal', priority=None, webhook_url=None, owner=None):
+    return {
+        'id': uuid.uuid4().hex,
+        'filter': filter_color,
+        'mode': mode,
+        'text': text,
+        'priority': parse_priority(priority),
+        'status': QUEUED,
+        'result': None,
+        'error': None,
+        'webhook_url': webhook_url,
+        # Whose per-user quota the run is charged to
+        'owner': owner,
+        'cancel_requested': False,
+        # Claims so far, and until when the worker running it holds it
+        'attempts': 0,
+        'lease_until': None,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+    }
+
+
+def public_view(job):
+    """Job fields safe to return to clients (no input text)"""
+    view = {k: v for k, v in job.items() if k not in ('text', 'cancel_requested', 'owner', 'lease_until')}
+    if job['started_at'] and job['finished_at']:
+        view['run_seconds'] = round(job['finished_at'] - job['started_at'], 3)
+    return view
+
+
+class MemoryJobStore:
+    """In-process priority queue; jobs are lost on restart"""
+
+    def __init__(self, ttl=24 * 3600, lease=60, max_attempts=3):
+        self.ttl = ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.jobs = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+
+    def enqueue(self, job):
+        with self.cond:
+            self._sweep()
+            self.jobs[job['id']] = job
+            heapq.heappush(self.heap, (-job['priority'], next(self.counter), job['id']))
+            self.cond.notify()
+
+    def claim(self, timeout):
+        """Take the highest-priority queued job, waiting up to timeout seconds"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                while self.heap:
+                    _, _, job_id = heapq.heappop(self.heap)
+                    job = self.jobs.get(job_id)
+                    # Cancelled jobs are skipped lazily rather than removed from the heap
+                    if job is not None and job['status'] == QUEUED:
+                        now = time.time()
+                        job.update(status=RUNNING, started_at=now, lease_until=now + self.lease,
+                                   attempts=job['attempts'] + 1)
+                        return dict(job)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def renew(self, job_id):
+        """Extend the lease of a job this worker is still running"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is not None and job['status'] == RUNNING:
+                job['lease_until'] = time.time() + self.lease
+
+    def requeue_expired(self):
+        """Put running jobs whose lease ran out back in the queue; returns how many"""
+        now = time.time()
+        requeued = 0
+        with self.cond:
+            for job in self.jobs.values():
+                if job['status'] != RUNNING or (job['lease_until'] or 0) >= now:
+                    continue
+                if job['cancel_requested']:
+                    job.update(status=CANCELLED, finished_at=now, text=None)
+                elif job['attempts'] >= self.max_attempts:
+                    job.update(status=FAILED, error=ABANDONED, finished_at=now, text=None)
+                else:
+                    job.update(status=QUEUED, started_at=None, lease_until=None)
+                    heapq.heappush(self.heap, (-job['priority'], next(self.counter), job['id']))
+                    requeued += 1
+            if requeued:
+                self.cond.notify(requeued)
+        return requeued
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(status=status, result=result, error=error, finished_at=time.time(), text=None, lease_until=None)
+            return dict(job)
+
+    def get(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def cancel(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == QUEUED:
+                job.update(status=CANCELLED, finished_at=time.time(), text=None)
+            elif job['status'] == RUNNING:
+                job['cancel_requested'] = True
+            return dict(job)
+
+    def is_cancel_requested(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            return job is None or job['cancel_requested']
+
+    def counts(self):
+        with self.cond:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
+
+    def _sweep(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['status'] in FINISHED and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Durable queue shared by every worker process pointing at the same file"""
+
+    COLUMNS = ('id', 'filter', 'mode', 'text', 'priority', 'status', 'result', 'error', 'webhook_url',
+               'owner', 'cancel_requested', 'attempts', 'lease_until', 'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, path, ttl=24 * 3600, poll_interval=0.25, lease=60, max_attempts=3):
+        self.path = path
+        self.ttl = ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.local = threading.local()
+        # Wakes local workers immediately on submit; other processes find it by polling
+        self.wakeup = threading.Event()
+        # The file and schema are created on first use, so importing the app touches no disk
+        self.ready = False
+        self.ready_lock = threading.Lock()
+
+    def _create_schema(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, filter TEXT NOT NULL, mode TEXT, text TEXT,"
+            " priority INTEGER NOT NULL, status TEXT NOT NULL, result TEXT, error TEXT,"
+            " webhook_url TEXT, owner TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        # Databases created before jobs had owners or leases
+        existing = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+        for column, kind in (('owner', 'TEXT'), ('attempts', 'INTEGER NOT NULL DEFAULT 0'), ('lease_until', 'REAL')):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority DESC, created_at)")
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        if not self.ready:
+            with self.ready_lock:
+                if not self.ready:
+                    self._create_schema(conn)
+                    self.ready = True
+        return conn
+
+    def enqueue(self, job):
+        row = dict(job, mode=json.dumps(job['mode']), cancel_requested=0)
+        conn = self._connect()
+        conn.execute(
+            f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+            [row[c] for c in self.COLUMNS]
+        )
+        conn.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?",
+                     (time.time() - self.ttl,))
+        self.wakeup.set()
+
+    def claim(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self._try_claim()
+            if job is not None:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.wakeup.wait(min(self.poll_interval, remaining))
+            self.wakeup.clear()
+
+    def _try_claim(self):
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock, so two workers can never claim the same row
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, lease_until = ?, attempts = attempts + 1"
+                " WHERE id = ?", (now, now + self.lease, row[0])
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row[0])
+
+    def renew(self, job_id):
+        """Extend the lease of a job this worker is still running"""
+        self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'", (time.time() + self.lease, job_id)
+        )
+
+    def requeue_expired(self):
+        """
+        Put running jobs whose lease ran out (their worker died) back in the
+        queue; returns how many. Ones already cancelled are closed instead, and
+        ones claimed max_attempts times fail rather than kill another worker.
+        """
+        now = time.time()
+        expired = "status = 'running' AND (lease_until IS NULL OR lease_until < ?)"
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"UPDATE jobs SET status = 'cancelled', finished_at = ?, text = NULL"
+                f" WHERE {expired} AND cancel_requested = 1", (now, now)
+            )
+            conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, text = NULL"
+                f" WHERE {expired} AND attempts >= ?", (ABANDONED, now, now, self.max_attempts)
+            )
+            requeued = conn.execute(
+                f"UPDATE jobs SET status = 'queued', started_at = NULL, lease_until = NULL WHERE {expired}", (now,)
+            ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if requeued:
+            self.wakeup.set()
+        return requeued
+
+    def finish(self, job_id, status, result=None, error=None):
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, text = NULL, lease_until = NULL"
+            " WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job['mode'] = json.loads(job['mode']) if job['mode'] else 'normal'
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def cancel(self, job_id):
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, text = NULL WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id)
+        )
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def is_cancel_requested(self, job_id):
+        row = self._connect().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def counts(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class JobQueue:
+    """Runs jobs from a store on a fixed number of worker threads"""
+
+    def __init__(self, store, runner, workers=2, webhook_hosts=()):
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        # Operator allowlist; when set, only these hosts are called (private ones included)
+        self.webhook_hosts = frozenset(host.lower() for host in webhook_hosts)
+        self.threads = []
+        self.stopping = threading.Event()
+        # Jobs this process is running, whose leases the heartbeat keeps renewing
+        self.active = set()
+        self.active_lock = threading.Lock()
+        self.heartbeat = None
+        self.heartbeat_stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, runner):
+        """
+        Build a queue from JOBS_* environment variables. JOBS_BACKEND is 'sqlite'
+        (default, at JOBS_DB_PATH) so every worker process sees every job, or
+        'memory' for a single process.
+        """
+        ttl = int(os.environ.get('JOBS_TTL', 24 * 3600))
+        lease = float(os.environ.get('JOBS_LEASE', 60))
+        max_attempts = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+        if os.environ.get('JOBS_BACKEND', 'sqlite') == 'memory':
+            store = MemoryJobStore(ttl=ttl, lease=lease, max_attempts=max_attempts)
+        else:
+            store = SQLiteJobStore(os.environ.get('JOBS_DB_PATH', os.path.join('instance', 'jobs.db')), ttl=ttl,
+                                   lease=lease, max_attempts=max_attempts)
+        hosts = [host.strip() for host in os.environ.get('WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()]
+        return cls(store, runner, workers=int(os.environ.get('JOBS_WORKERS', 2)), webhook_hosts=hosts)
+
+    def start(self):
+        if self.threads:
+            return self
+        # Jobs left running by a worker that died go back in the queue before claiming starts
+        requeued = self.store.requeue_expired()
+        if requeued:
+            logger.warning("Requeued %d jobs whose worker stopped renewing their lease", requeued)
+        self.heartbeat_stop.clear()
+        self.heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+        self.heartbeat.start()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Stop claiming new jobs and wait for running ones to finish"""
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        # Running jobs keep their leases until their workers are done with them
+        self.heartbeat_stop.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join(timeout)
+            self.heartbeat = None
+
+    def submit(self, filter_color, text, mode='normal', priority=None, webhook_url=None, owner=None):
+        """Queue a run; raises ValueError (WebhookError for the URL) on bad input"""
+        if webhook_url:
+            url = check_webhook_url(webhook_url, self.webhook_hosts)
+            if not self.webhook_hosts:
+                # Checked again when the webhook is called; this one gives the client a 400
+                resolve_public_address(url.hostname, url.port or (443 if url.scheme == 'https' else 80))
+        job = new_job(filter_color, text, mode, priority, webhook_url, owner)
+        self.store.enqueue(job)
+        self.start()
+        return public_view(job)
+
+    def get(self, job_id, owner):
+        """The job if owner submitted it; anyone else gets None, as for an unknown id"""
+        job = self.store.get(job_id)
+        return public_view(job) if job is not None and job['owner'] == owner else None
+
+    def cancel(self, job_id, owner):
+        if self.get(job_id, owner) is None:
+            return None
+        job = self.store.cancel(job_id)
+        return public_view(job) if job is not None else None
+
+    def get_stats(self):
+        return {'workers': self.workers, 'jobs': self.store.counts()}
+
+    def _work(self):
+        while not self.stopping.is_set():
+            job = self.store.claim(timeout=1.0)
+            if job is None:
+                continue
+            with self.active_lock:
+                self.active.add(job['id'])
+            try:
+                result = self.runner(job)
+                status, error = SUCCEEDED, None
+            except Exception as e:
+                result, status, error = None, FAILED, str(e)
+            finally:
+                with self.active_lock:
+                    self.active.discard(job['id'])
+            if self.store.is_cancel_requested(job['id']):
+                # Cancelled while running: the work is done but nobody wants it
+                result, status, error = None, CANCELLED, None
+            finished = self.store.finish(job['id'], status, result, error)
+            if finished is not None and finished.get('webhook_url'):
+                self._notify(finished)
+
+    def _beat(self):
+        """
+        Renew the leases of jobs running here a few times per lease, and requeue
+        jobs whose lease expired because the process running them died
+        """
+        while not self.heartbeat_stop.wait(self.store.lease / 3):
+            try:
+                with self.active_lock:
+                    running = list(self.active)
+                for job_id in running:
+                    self.store.renew(job_id)
+                self.store.requeue_expired()
+            except Exception as e:
+                logger.warning("Job heartbeat failed: %s", e)
+
+    def _notify(self, job):
+        """
+        POST the finished job to its webhook; failures are logged, not retried.
+        The host is resolved and checked here, at call time, and redirects are
+        not followed.
+        """
+        try:
+            url = check_webhook_url(job['webhook_url'], self.webhook_hosts)
+            port = url.port or (443 if url.scheme == 'https' else 80)
+            if self.webhook_hosts:
+                address = url.hostname
+            else:
+                address = resolve_public_address(url.hostname, port)
+            connection_class = _PinnedHTTPSConnection if url.scheme == 'https' else _PinnedHTTPConnection
+            conn = connection_class(url.hostname, port, address, timeout=5)
+            try:
+                conn.request(
+                    'POST', urllib.parse.urlunsplit(('', '', url.path or '/', url.query, '')),
+                    body=json.dumps(public_view(job)).encode('utf-8'),
+                    headers={'Content-Type': 'application/json'}
+                )
+                conn.getresponse().read()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning("Webhook for job %s failed: %s", job['id'], e)
@@ -0,0 +1,156 @@
+"""
+PDF Extractor - Spooled, page-parallel text extraction
+Uploads are spooled to disk, pages are extracted in a process pool, and the
+result is cached by file hash so re-uploads return instantly
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+from filters.response_cache import ResponseCache
+
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+
+class PDFExtractionError(ValueError):
+    """The upload could not be turned into text"""
+
+
+class PDFLimitExceeded(PDFExtractionError):
+    """The upload is over the configured byte or page limit"""
+
+
+def _extract_page_range(path, start, end):
+    """Runs in a worker process: extract pages [start, end) from the spooled file"""
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[i].extract_text() or '' for i in range(start, end)]
+
+
+class PDFExtractor:
+    def __init__(self, max_bytes=50 * 1024 * 1024, max_pages=1000, workers=None,
+                 pages_per_task=25, cache=None):
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.workers = workers or os.cpu_count() or 2
+        self.pages_per_task = pages_per_task
+        self.cache = cache if cache is not None else ResponseCache(ttl=24 * 3600, max_entries=64)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build an extractor from PDF_* environment variables"""
+        return cls(
+            max_bytes=int(os.environ.get('PDF_MAX_BYTES', 50 * 1024 * 1024)),
+            max_pages=int(os.environ.get('PDF_MAX_PAGES', 1000)),
+            workers=int(os.environ.get('PDF_WORKERS', 0)) or None,
+            pages_per_task=int(os.environ.get('PDF_PAGES_PER_TASK', 25)),
+            cache=ResponseCache(
+                ttl=int(os.environ.get('PDF_CACHE_TTL', 24 * 3600)),
+                max_entries=int(os.environ.get('PDF_CACHE_MAX_ENTRIES', 64)),
+                max_bytes=int(os.environ.get('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+                disk_path=os.environ.get('PDF_CACHE_PATH') or None
+            )
+        )
+
+    def extract(self, fileobj):
+        """Return (text, page_count, cached) for an uploaded PDF file object"""
+        pages = []
+        cached = False
+        for _, page_text, from_cache in self.iter_pages(fileobj):
+            pages.append(page_text)
+            cached = from_cache
+        # Same layout as before: every page followed by a newline
+        return ''.join(page + "\n" for page in pages), len(pages), cached
+
+    def iter_pages(self, fileobj):
+        """Yield (page_number, text, from_cache) in page order as pages are extracted"""
+        path, digest = self._spool(fileobj)
+        try:
+            cached = self.cache.get(digest)
+            if cached is not None:
+                for number, page_text in enumerate(json.loads(cached), start=1):
+                    yield number, page_text, True
+                return
+
+            try:
+                page_count = len(PyPDF2.PdfReader(path).pages)
+            except Exception as e:
+                raise PDFExtractionError(f"Could not read PDF: {e}")
+            if page_count > self.max_pages:
+                raise PDFLimitExceeded(f"PDF has {page_count} pages; the limit is {self.max_pages}")
+
+            pages = []
+            extracted = self._extract_pages(path, page_count)
+            while True:
+                try:
+                    page_text = next(extracted, None)
+                except Exception as e:
+                    # A malformed page, or a pool worker that died
+                    raise PDFExtractionError(f"Could not extract page {len(pages) + 1}: {e}")
+                if page_text is None:
+                    break
+                pages.append(page_text)
+                yield len(pages), page_text, False
+            self.cache.set(digest, json.dumps(pages))
+        finally:
+            os.unlink(path)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _extract_pages(self, path, page_count):
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        if len(ranges) <= 1:
+            # Not worth the inter-process round-trip for a short document
+            for start, end in ranges:
+                yield from _extract_page_range(path, start, end)
+            return
+
+        pool = self._get_pool()
+        futures = [pool.submit(_extract_page_range, path, start, end) for start, end in ranges]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _spool(self, fileobj):
+        """Copy the upload to a temp file in blocks, hashing and size-checking as we go"""
+        digest = hashlib.sha256()
+        size = 0
+        spool = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        try:
+            with spool:
+                while True:
+                    block = fileobj.read(SPOOL_BLOCK_SIZE)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > self.max_bytes:
+                        raise PDFLimitExceeded(f"PDF is larger than the {self.max_bytes // (1024 * 1024)} MB limit")
+                    digest.update(block)
+                    spool.write(block)
+        except BaseException:
+            os.unlink(spool.name)
+            raise
+        return spool.name, 'pdf:' + digest.hexdigest()
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
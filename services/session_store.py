@@ -0,0 +1,254 @@
+"""
+Session Store - Server-side study sessions
+The cookie carries only a session id; session data and study text live here,
+with each text stored once by content hash no matter how many sessions use it
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# A text stored just before its session row is written must not be swept as an orphan
+ORPHAN_GRACE = 300
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class MemorySessionBackend:
+    """Single-process backend, for development and tests"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.texts = {}
+        self.lock = threading.Lock()
+
+    def put_text(self, digest, text):
+        with self.lock:
+            self.texts.setdefault(digest, (text, time.time()))
+
+    def get_text(self, digest):
+        with self.lock:
+            entry = self.texts.get(digest)
+            return entry[0] if entry else None
+
+    def save(self, session_id, data, expires_at):
+        with self.lock:
+            self.sessions[session_id] = (dict(data), expires_at)
+
+    def load(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return dict(entry[0])
+
+    def delete(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def sweep(self):
+        now = time.time()
+        with self.lock:
+            expired = [sid for sid, (_, expires_at) in self.sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self.sessions[sid]
+            referenced = {data.get('text_hash') for data, _ in self.sessions.values()}
+            orphans = [digest for digest, (_, stored_at) in self.texts.items()
+                       if digest not in referenced and stored_at < now - ORPHAN_GRACE]
+            for digest in orphans:
+                del self.texts[digest]
+        return len(expired), len(orphans)
+
+    def count(self):
+        with self.lock:
+            return {'sessions': len(self.sessions), 'texts': len(self.texts)}
+
+
+class SQLiteSessionBackend:
+    """Default backend; one file shared by every Gunicorn worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts ("
+            " hash TEXT PRIMARY KEY,"
+            " body TEXT NOT NULL,"
+            " stored_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " text_hash TEXT,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_text ON sessions(text_hash)")
+        conn.commit()
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def put_text(self, digest, text):
+        conn = self._connect()
+        # Re-storing a known text just refreshes its grace period
+        conn.execute(
+            "INSERT INTO texts (hash, body, stored_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(hash) DO UPDATE SET stored_at = excluded.stored_at",
+            (digest, text, time.time())
+        )
+        conn.commit()
+
+    def get_text(self, digest):
+        row = self._connect().execute("SELECT body FROM texts WHERE hash = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, session_id, data, expires_at):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, text_hash, expires_at) VALUES (?, ?, ?, ?)",
+            (session_id, json.dumps(data), data.get('text_hash'), expires_at)
+        )
+        conn.commit()
+
+    def load(self, session_id):
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        conn.commit()
+
+    def sweep(self):
+        now = time.time()
+        conn = self._connect()
+        expired = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+        orphans = conn.execute(
+            "DELETE FROM texts WHERE stored_at < ?"
+            " AND NOT EXISTS (SELECT 1 FROM sessions WHERE sessions.text_hash = texts.hash)",
+            (now - ORPHAN_GRACE,)
+        ).rowcount
+        conn.commit()
+        return expired, orphans
+
+    def count(self):
+        conn = self._connect()
+        return {
+            'sessions': conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            'texts': conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0],
+        }
+
+
+class SessionStore:
+    """Session ids to session data, with a sliding TTL and a background sweeper"""
+
+    def __init__(self, backend, ttl=6 * 3600, sweep_interval=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.sweeper = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        SESSION_BACKEND is 'sqlite' (default), 'memory', or 'package.module:Class'
+        for a custom backend implementing the same methods
+        """
+        kind = os.environ.get('SESSION_BACKEND', 'sqlite')
+        if kind == 'memory':
+            backend = MemorySessionBackend()
+        elif kind == 'sqlite':
+            backend = SQLiteSessionBackend(os.environ.get('SESSION_DB_PATH', os.path.join('instance', 'sessions.db')))
+        else:
+            module_name, _, class_name = kind.partition(':')
+            backend = getattr(importlib.import_module(module_name), class_name)()
+        return cls(
+            backend,
+            ttl=int(os.environ.get('SESSION_TTL', 6 * 3600)),
+            sweep_interval=int(os.environ.get('SESSION_SWEEP_INTERVAL', 300))
+        )
+
+    def create(self, text=None, **data):
+        """Start a session, storing its text by hash; returns the new session id"""
+        self._start_sweeper()
+        if text is not None:
+            digest = text_hash(text)
+            self.backend.put_text(digest, text)
+            data['text_hash'] = digest
+        session_id = secrets.token_urlsafe(24)
+        self.backend.save(session_id, data, time.time() + self.ttl)
+        return session_id
+
+    def get(self, session_id):
+        """Session data, or None if unknown or expired"""
+        if not session_id:
+            return None
+        return self.backend.load(session_id)
+
+    def get_text(self, data):
+        digest = data.get('text_hash') if data else None
+        return self.backend.get_text(digest) if digest else None
+
+    def update(self, session_id, **changes):
+        """Merge changes into a live session and push its expiry out again"""
+        data = self.get(session_id)
+        if data is None:
+            return None
+        data.update(changes)
+        self.backend.save(session_id, data, time.time() + self.ttl)
+        return data
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+
+    def sweep(self):
+        expired, orphans = self.backend.sweep()
+        if expired or orphans:
+            logger.info("Swept %d expired sessions and %d unused texts", expired, orphans)
+        return expired, orphans
+
+    def get_stats(self):
+        stats = self.backend.count()
+        stats['ttl'] = self.ttl
+        return stats
+
+    def _start_sweeper(self):
+        # Started lazily so the thread is created in the worker process, not before a fork
+        with self.lock:
+            if self.sweeper is not None and self.sweeper.is_alive():
+                return
+            self.sweeper = threading.Thread(target=self._sweep_loop, name='session-sweeper', daemon=True)
+            self.sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Session sweep failed: %s", e)
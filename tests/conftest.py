@@ -0,0 +1,14 @@
+import os
+
+# Everything runs offline against the local fake Gemini; shared stores stay off
+# so tests never touch instance/ and don't see each other's results
+os.environ.setdefault('GEMINI_FAKE', '1')
+os.environ.setdefault('GEMINI_CACHE_ENABLED', '0')
+os.environ.setdefault('CARDS_ENABLED', '0')
+os.environ.setdefault('NEAR_DUP_ENABLED', '0')
+os.environ.setdefault('SESSION_BACKEND', 'memory')
+os.environ.setdefault('JOBS_BACKEND', 'memory')
+os.environ.setdefault('APP_WARMUP', '0')
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('USER_RATE_LIMIT_RPM', '100000')
+os.environ.setdefault('USER_RATE_LIMIT_BURST', '100000')
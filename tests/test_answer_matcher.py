@@ -0,0 +1,38 @@
+import pytest
+
+from filters.answer_matcher import AnswerMatcher
+
+
+@pytest.fixture
+def matcher():
+    return AnswerMatcher()
+
+
+@pytest.mark.parametrize('expected, answer', [
+    ('exothermic', 'endothermic'),
+    ('afferent', 'efferent'),
+    ('hypertonic', 'hypotonic'),
+    ('exocytosis', 'endocytosis'),
+    ('intracellular', 'intercellular'),
+])
+def test_opposite_terms_are_not_typos(matcher, expected, answer):
+    assert not matcher.is_correct(answer, expected)
+    assert not matcher.is_correct(expected, answer)
+
+
+@pytest.mark.parametrize('expected, answer', [
+    ('photosynthesis', 'photosynthesys'),
+    ('enzyme', 'enzime'),
+    ('hypertonic solution', 'hypertonik solution'),
+])
+def test_typos_still_match(matcher, expected, answer):
+    assert matcher.is_correct(answer, expected)
+
+
+@pytest.mark.parametrize('expected, answer', [('cause', 'result'), ('result', 'lead')])
+def test_cause_and_effect_are_not_synonyms(matcher, expected, answer):
+    assert not matcher.is_correct(answer, expected)
+
+
+def test_short_words_must_match_exactly(matcher):
+    assert not matcher.is_correct('call', 'cell')
@@ -0,0 +1,65 @@
+import io
+import json
+
+from app import create_app
+
+
+def test_metrics_are_open_to_scrapers_without_a_metrics_token():
+    client = create_app({'ADMIN_TOKEN': None, 'METRICS_TOKEN': None}).test_client()
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'study_http_request_seconds' in response.data
+    # The operator routes stay closed without ADMIN_TOKEN
+    assert client.get('/cache/stats').status_code == 403
+
+
+def test_metrics_token_guards_metrics_when_set():
+    client = create_app({'METRICS_TOKEN': 'scrape'}).test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape'}).status_code == 200
+
+
+def test_admin_token_opens_operator_routes():
+    client = create_app({'ADMIN_TOKEN': 'admin'}).test_client()
+    assert client.get('/cache/stats').status_code == 401
+    assert client.get('/cache/stats', headers={'Authorization': 'Bearer admin'}).status_code == 200
+
+
+def test_streamed_request_is_logged_after_its_body_with_stage_timings(caplog):
+    client = create_app().test_client()
+    with caplog.at_level('INFO', logger='study.requests'):
+        response = client.post('/apply_filter/stream', json={'text': 'Cells divide. ' * 30, 'filter': 'blue'})
+        assert b'event: done' in response.data
+        response.close()
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry['path'] == '/apply_filter/stream'
+    assert 'gemini' in entry['stages']
+
+
+def test_jobs_are_only_visible_to_the_session_that_submitted_them():
+    app = create_app()
+    owner, other = app.test_client(), app.test_client()
+    for client in (owner, other):
+        # The first response sets the session cookie that identifies the caller
+        client.get('/healthz')
+    job = owner.post('/jobs', json={'text': 'Cells divide.', 'filter': 'blue'}).get_json()['job']
+
+    assert other.get(f"/jobs/{job['id']}").status_code == 404
+    assert other.delete(f"/jobs/{job['id']}").status_code == 404
+    assert owner.get(f"/jobs/{job['id']}").status_code == 200
+
+
+def test_pdf_stream_ends_with_error_and_done_on_any_failure(monkeypatch):
+    import app as study_app
+
+    def iter_pages(stream):
+        yield 1, 'first page', False
+        raise OSError('disk full')
+
+    monkeypatch.setattr(study_app.pdf_extractor, 'iter_pages', iter_pages)
+    client = create_app().test_client()
+    response = client.post('/extract_pdf?stream=1', data={'file': (io.BytesIO(b'%PDF'), 'notes.pdf')})
+    events = [line.split(': ', 1)[1] for line in response.get_data(as_text=True).splitlines()
+              if line.startswith('event: ')]
+    assert events == ['page', 'error', 'done']
+    assert 'disk full' in response.get_data(as_text=True)
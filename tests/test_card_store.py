@@ -0,0 +1,96 @@
+import sqlite3
+
+from filters.card_store import CardStore, card_id, text_hash
+
+TEXT = 'Mitochondria make ATP. Ribosomes make proteins.'
+
+
+def exercise_set(*answers):
+    blanks = [{'answer': answer, 'hint': f'about {answer}'} for answer in answers]
+    text = ' '.join(f'[BLANK_{n}] is here.' for n in range(1, len(answers) + 1))
+    return {'exercises': {'easy': {'text': text, 'blanks': blanks}}}
+
+
+def test_construction_touches_no_disk(tmp_path):
+    path = tmp_path / 'instance' / 'cards.db'
+    store = CardStore(str(path))
+    assert not path.parent.exists()
+    assert store.get_exercises(text_hash(TEXT)) is None
+    assert path.exists()
+
+
+def test_lapses_on_dropped_answers_do_not_keep_the_set_stale(tmp_path):
+    store = CardStore(str(tmp_path / 'cards.db'), rephrase_lapses=2)
+    digest = text_hash(TEXT)
+    store.save_exercises(digest, exercise_set('ATP', 'proteins'), owner='alice')
+    for _ in range(2):
+        store.review(card_id(digest, 'easy', 'ATP'), 0, owner='alice')
+    assert store.get_exercises(digest, owner='alice') is None
+
+    # The rephrasing no longer blanks ATP, so its lapses stop counting
+    store.save_exercises(digest, exercise_set('Ribosomes', 'proteins'), owner='alice')
+    stored = store.get_exercises(digest, owner='alice')
+    assert [blank['answer'] for blank in stored['exercises']['easy']['blanks']] == ['Ribosomes', 'proteins']
+
+
+def test_rephrasing_resets_the_lapse_streak_of_kept_answers(tmp_path):
+    store = CardStore(str(tmp_path / 'cards.db'), rephrase_lapses=2)
+    digest = text_hash(TEXT)
+    store.save_exercises(digest, exercise_set('ATP'), owner='alice')
+    for _ in range(2):
+        store.review(card_id(digest, 'easy', 'ATP'), 1, owner='alice')
+    assert store.get_exercises(digest, owner='alice') is None
+
+    store.save_exercises(digest, exercise_set('ATP'), owner='alice')
+    assert store.get_exercises(digest, owner='alice') is not None
+
+
+def test_schedules_are_per_owner(tmp_path):
+    store = CardStore(str(tmp_path / 'cards.db'), rephrase_lapses=2)
+    digest = text_hash(TEXT)
+    result = store.save_exercises(digest, exercise_set('ATP'), owner='alice')
+    atp = result['exercises']['easy']['blanks'][0]['card_id']
+
+    # bob reuses alice's exercise set and gets cards of his own
+    assert store.get_exercises(digest, owner='bob') is not None
+    assert [card['id'] for card in store.due('bob', now=2e10)] == [atp]
+
+    for _ in range(2):
+        store.review(atp, 0, owner='bob')
+    assert store.get_exercises(digest, owner='bob') is None
+    assert store.get_exercises(digest, owner='alice') is not None
+
+    card = store.review(atp, 5, owner='alice')
+    assert card['repetitions'] == 1 and card['lapses'] == 0
+    assert store.due('alice') == []
+    assert store.review('unknown', 5, owner='alice') is None
+
+
+def test_review_adds_a_card_the_owner_has_not_seen(tmp_path):
+    store = CardStore(str(tmp_path / 'cards.db'))
+    digest = text_hash(TEXT)
+    result = store.save_exercises(digest, exercise_set('ATP'), owner='alice')
+    atp = result['exercises']['easy']['blanks'][0]['card_id']
+
+    card = store.review(atp, 4, owner='carol')
+    assert card['answer'] == 'ATP' and card['repetitions'] == 1
+    assert store.next_due('carol') == card['due']
+
+
+def test_cards_from_before_owners_are_migrated(tmp_path):
+    path = str(tmp_path / 'cards.db')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE cards (id TEXT PRIMARY KEY, text_hash TEXT NOT NULL, level TEXT NOT NULL,"
+        " answer TEXT NOT NULL, hint TEXT, context TEXT, ease REAL NOT NULL DEFAULT 2.5,"
+        " interval REAL NOT NULL DEFAULT 0, repetitions INTEGER NOT NULL DEFAULT 0,"
+        " lapses INTEGER NOT NULL DEFAULT 0, due REAL NOT NULL, last_reviewed REAL, created_at REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX idx_cards_due ON cards(due)")
+    conn.execute("INSERT INTO cards (id, text_hash, level, answer, due, created_at) VALUES ('c1', 'h', 'easy', 'ATP', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    store = CardStore(path)
+    assert [card['id'] for card in store.due(now=2)] == ['c1']
+    assert store.review('c1', 5, owner='alice')['answer'] == 'ATP'
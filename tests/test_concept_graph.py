@@ -0,0 +1,58 @@
+import numpy as np
+
+from filters.concept_graph import ConceptGraph
+
+CHUNKS = [
+    "Photosynthesis turns light energy into chemical energy. Photosynthesis happens in chloroplasts. "
+    "Chloroplasts hold chlorophyll, and chlorophyll absorbs light energy.",
+    "The Calvin cycle uses chemical energy from photosynthesis. The Calvin cycle fixes carbon dioxide "
+    "into glucose inside chloroplasts.",
+    "Cellular respiration breaks glucose down again. Cellular respiration releases the chemical energy "
+    "stored in glucose by the Calvin cycle.",
+]
+
+
+def graph(labels, scores, edges):
+    return ConceptGraph(labels, np.asarray(scores, dtype=float), [0] * len(labels),
+                        [[0] for _ in labels], edges, [[]])
+
+
+def test_edges_point_from_earlier_concepts():
+    built = ConceptGraph.from_texts(CHUNKS)
+    assert built.labels == ConceptGraph.from_texts(CHUNKS).labels
+    index = {label: i for i, label in enumerate(built.labels)}
+    assert 'photosynthesis' in index and 'cellular respiration' in index
+    assert built.first_chunks[index['photosynthesis']] == 0
+    assert built.first_chunks[index['cellular respiration']] == 2
+    assert built.edges
+    order = built.learning_order()
+    position = {concept: i for i, concept in enumerate(order)}
+    for source, target, weight in built.edges:
+        assert built.first_chunks[source] <= built.first_chunks[target]
+        assert position[source] < position[target]
+        assert weight >= 0.3
+    assert sorted(order) == list(range(len(built.labels)))
+    assert len(built.keyphrases) == len(CHUNKS)
+
+
+def test_kahn_order_respects_prerequisites_then_strength():
+    # a -> c, b -> c, c -> d; b scores higher than a, so it goes first
+    g = graph(['a', 'b', 'c', 'd', 'e'], [1.0, 2.0, 5.0, 1.0, 0.5], [(0, 2, 0.5), (1, 2, 0.5), (2, 3, 0.5)])
+    assert g.learning_order() == [1, 0, 2, 3, 4]
+    assert g.roots() == ['b', 'a', 'e', 'c', 'd']
+
+
+def test_cycle_still_yields_every_node():
+    # b -> c -> d -> b is a cycle; a stays a normal root
+    g = graph(['a', 'b', 'c', 'd'], [1.0, 1.0, 3.0, 2.0], [(0, 1, 0.5), (1, 2, 0.5), (2, 3, 0.5), (3, 1, 0.5)])
+    order = g.learning_order()
+    assert sorted(order) == [0, 1, 2, 3]
+    assert order[0] == 0
+    # The cycle is entered at its strongest concept, then followed
+    assert order[1:] == [2, 3, 1]
+    assert [node['position'] for node in g.as_dict()['nodes']] == [0, 3, 1, 2]
+
+
+def test_empty_text_gives_an_empty_graph():
+    empty = ConceptGraph.from_texts(['the and of', ''])
+    assert empty.labels == [] and empty.learning_order() == [] and empty.keyphrases == [[], []]
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import app as study_app
+from filters import ai_helper
+from filters.document import map_chunks
+from filters.fair_scheduler import FairScheduler, current_caller
+from filters.resilience import GeminiRateLimitError
+
+# Eight paragraphs, one chunk each at a 40-token budget
+DOCUMENT = '\n\n'.join(f"Paragraph {i} about cell biology. " * 8 for i in range(8))
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # Three requests of burst and effectively no refill during the test
+    scheduler = FairScheduler(slots=4, user_rate=0.001, user_burst=3)
+    monkeypatch.setattr(ai_helper, 'scheduler', scheduler)
+    current_caller.set('alice')
+    yield scheduler
+    current_caller.set(None)
+
+
+def fan_out(max_chunks):
+    async def ask(chunk_text):
+        return await ai_helper.get_ai_response_async(chunk_text, use_cache=False, max_retries=0)
+    return asyncio.run(map_chunks(DOCUMENT, ask, 40, max_chunks))
+
+
+def test_a_fanned_out_run_costs_one_request(scheduler):
+    with scheduler.run():
+        results, covered = fan_out(6)
+    assert len(results) == 6
+    assert covered['failed'] == 0
+    assert scheduler.quota('alice')['remaining'] == 2
+
+    for _ in range(2):
+        with scheduler.run():
+            fan_out(6)
+    with pytest.raises(GeminiRateLimitError):
+        with scheduler.run():
+            fan_out(6)
+
+
+def test_calls_outside_a_run_are_charged_one_by_one(scheduler):
+    results, covered = fan_out(6)
+    # The quota ran dry part way; the result says how much is missing
+    assert len(results) == 3
+    assert covered['failed'] == 3
+    assert scheduler.get_stats()['rejected_quota'] == 3
+
+
+def test_quota_is_per_caller(scheduler):
+    for _ in range(3):
+        with scheduler.run():
+            scheduler.charge('alice')
+    with pytest.raises(GeminiRateLimitError):
+        scheduler.charge('alice')
+    scheduler.charge('bob')
+    assert scheduler.quota('bob')['remaining'] == 2
+
+
+def test_rejected_wait_does_not_cost_the_caller_priority():
+    scheduler = FairScheduler(slots=1, max_wait=0.05)
+    with scheduler.slot('alice', 'blue'):
+        with pytest.raises(GeminiRateLimitError):
+            with scheduler.slot('bob', 'blue', cost=100):
+                pass
+    assert 'bob' not in scheduler.last_finish
+    assert scheduler.pending == {}
+    with scheduler.slot('bob', 'blue'):
+        pass
+    assert scheduler.last_finish['bob'] == pytest.approx(scheduler.last_finish['alice'])
+
+
+def in_thread(caller, fn, outcomes):
+    def target():
+        current_caller.set(caller)
+        try:
+            outcomes[caller] = fn()
+        except Exception as e:
+            outcomes[caller] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def test_coalesced_callers_each_pay_for_the_shared_call(scheduler):
+    ai_helper.get_client()
+    previous_delay = ai_helper._fake_server.delay
+    ai_helper._fake_server.delay = 0.2
+    try:
+        outcomes = {}
+        ask = lambda: ai_helper.get_ai_response("shared prompt", max_retries=0)
+        threads = [in_thread('alice', ask, outcomes)]
+        time.sleep(0.05)
+        threads.append(in_thread('bob', ask, outcomes))
+        for thread in threads:
+            thread.join()
+    finally:
+        ai_helper._fake_server.delay = previous_delay
+    assert outcomes['alice'] == outcomes['bob']
+    assert ai_helper.ai_flight.get_stats()['coalesced'] >= 1
+    assert scheduler.quota('alice')['remaining'] == 2
+    assert scheduler.quota('bob')['remaining'] == 2
+
+
+def test_over_quota_leader_does_not_fail_followers(monkeypatch):
+    scheduler = FairScheduler(user_rate=0.001, user_burst=1)
+    monkeypatch.setattr(study_app, 'scheduler', scheduler)
+    scheduler.charge('alice')
+
+    def process(text, mode='normal'):
+        # A filter that reaches Gemini part way through its run
+        time.sleep(0.2)
+        scheduler.charge(current_caller.get())
+        return {'summary': text}
+    monkeypatch.setattr(study_app.filters['orange'], 'cache_responses', True)
+    monkeypatch.setattr(study_app.filters['orange'], 'process', process)
+
+    outcomes = {}
+    run = lambda: study_app.run_filter('orange', 'same text for both callers')
+    threads = [in_thread('alice', run, outcomes)]
+    time.sleep(0.05)
+    threads.append(in_thread('bob', run, outcomes))
+    for thread in threads:
+        thread.join()
+
+    assert isinstance(outcomes['alice'], GeminiRateLimitError)
+    assert outcomes['bob'] == {'summary': 'same text for both callers'}
@@ -0,0 +1,14 @@
+from filters.hint_index import HintIndex
+
+
+def test_blank_without_answer_keeps_later_blanks_numbered():
+    index = HintIndex()
+    index.add({'exercise_id': 'e1', 'exercises': {'easy': {'blanks': [
+        {'answer': 'ATP'}, {'answer': ''}, 'junk', {'answer': 'ribosome', 'hint': 'makes proteins'}
+    ]}}})
+
+    assert index.hints('e1', 'easy', 1)[0] == "Starts with 'A'"
+    assert index.hints('e1', 'easy', 2) is None
+    assert index.hints('e1', 'easy', 3) is None
+    assert index.hints('e1', 'easy', 4)[-1] == 'makes proteins'
+    assert index.hints('e1', 'easy', 5) is None
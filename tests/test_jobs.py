@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from services.jobs import (
+    PRIORITIES, JobQueue, MemoryJobStore, SQLiteJobStore, WebhookError, new_job, parse_priority
+)
+
+
+def test_sqlite_claim_hands_each_job_to_exactly_one_worker(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    store = SQLiteJobStore(path)
+    job_ids = set()
+    for i in range(100):
+        job = new_job('blue', f'text {i}')
+        store.enqueue(job)
+        job_ids.add(job['id'])
+
+    claimed, lock = [], threading.Lock()
+
+    def worker():
+        # A store per thread, like separate worker processes sharing the file
+        own = SQLiteJobStore(path, poll_interval=0.01)
+        while True:
+            job = own.claim(timeout=0.2)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job['id'])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+    assert store.counts() == {'running': 100}
+
+
+def test_sqlite_claims_highest_priority_first(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.db'))
+    for priority in ('low', 'high', 'normal'):
+        store.enqueue(new_job('blue', priority, priority=priority))
+    assert [store.claim(0)['text'] for _ in range(3)] == ['high', 'normal', 'low']
+
+
+def test_priority_is_clamped_to_named_levels():
+    assert parse_priority(10 ** 6) == PRIORITIES['high']
+    assert parse_priority(-10 ** 6) == PRIORITIES['low']
+    assert parse_priority('LOW') == PRIORITIES['low']
+    with pytest.raises(ValueError):
+        parse_priority('urgent')
+
+
+@pytest.mark.parametrize('url', [
+    'file:///etc/passwd',
+    'ftp://example.com/hook',
+    'http://127.0.0.1:8080/hook',
+    'http://localhost/hook',
+    'http://169.254.169.254/latest/meta-data',
+    'http://10.1.2.3/hook',
+    'http://[::1]/hook',
+    'http://[::ffff:127.0.0.1]/hook',
+])
+def test_webhook_to_non_public_target_is_rejected(url):
+    queue = JobQueue(MemoryJobStore(), runner=lambda job: {})
+    with pytest.raises(WebhookError):
+        queue.submit('blue', 'text', webhook_url=url)
+
+
+def test_allowlisted_webhook_is_delivered():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    queue = JobQueue(MemoryJobStore(), runner=lambda job: {'ok': True}, workers=1, webhook_hosts=['127.0.0.1'])
+    try:
+        job = queue.submit('blue', 'text', webhook_url=f"http://127.0.0.1:{server.server_port}/hook")
+        server.timeout = 5
+        for _ in range(50):
+            if received:
+                break
+            threading.Event().wait(0.1)
+    finally:
+        queue.stop(1)
+        server.server_close()
+
+    assert received and received[0]['id'] == job['id']
+    assert received[0]['result'] == {'ok': True}
+
+
+def test_default_queue_is_shared_between_worker_processes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('JOBS_BACKEND', raising=False)
+    monkeypatch.delenv('JOBS_DB_PATH', raising=False)
+    first = JobQueue.from_env(runner=lambda job: {})
+    second = JobQueue.from_env(runner=lambda job: {})
+    # Nothing is written until the queue is used
+    assert not (tmp_path / 'instance').exists()
+
+    job = first.store.enqueue(new_job('blue', 'text')) or first.store.claim(0)
+    assert second.get(job['id'], None)['status'] == 'running'
+    second.cancel(job['id'], None)
+    assert first.store.is_cancel_requested(job['id'])
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda tmp_path: SQLiteJobStore(str(tmp_path / 'jobs.db'), lease=0.05),
+    lambda tmp_path: MemoryJobStore(lease=0.05),
+])
+def test_job_of_a_dead_worker_is_requeued_once_its_lease_expires(tmp_path, make_store):
+    store = make_store(tmp_path)
+    job = new_job('blue', 'text')
+    store.enqueue(job)
+    assert store.claim(0)['attempts'] == 1
+    assert store.requeue_expired() == 0
+
+    # The worker never renews, as if its process had been killed
+    time.sleep(0.1)
+    assert store.requeue_expired() == 1
+    assert store.get(job['id'])['status'] == 'queued'
+    assert store.claim(0)['attempts'] == 2
+
+
+def test_renewed_lease_keeps_the_job_running(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.db'), lease=0.2)
+    job = new_job('blue', 'text')
+    store.enqueue(job)
+    store.claim(0)
+    for _ in range(3):
+        time.sleep(0.1)
+        store.renew(job['id'])
+        assert store.requeue_expired() == 0
+    assert store.get(job['id'])['status'] == 'running'
+
+
+def test_job_abandoned_too_often_fails(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.db'), lease=0.01, max_attempts=2)
+    job = new_job('blue', 'text')
+    store.enqueue(job)
+    for _ in range(2):
+        store.claim(0)
+        time.sleep(0.02)
+        store.requeue_expired()
+    assert store.get(job['id'])['status'] == 'failed'
+
+
+def test_startup_requeues_and_runs_jobs_left_running(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    dead = SQLiteJobStore(path, lease=0.01)
+    job = new_job('blue', 'text')
+    dead.enqueue(job)
+    dead.claim(0)
+    time.sleep(0.02)
+
+    queue = JobQueue(SQLiteJobStore(path, poll_interval=0.01), runner=lambda job: {'ok': True}, workers=1).start()
+    try:
+        for _ in range(100):
+            if queue.store.get(job['id'])['status'] == 'succeeded':
+                break
+            time.sleep(0.02)
+    finally:
+        queue.stop(1)
+    assert queue.store.get(job['id'])['result'] == {'ok': True}
+
+
+def test_heartbeat_renews_leases_of_long_jobs():
+    release = threading.Event()
+    queue = JobQueue(MemoryJobStore(lease=0.1), runner=lambda job: release.wait(5) and {}, workers=1)
+    job = queue.submit('blue', 'text', owner='me')
+    try:
+        time.sleep(0.4)
+        assert queue.get(job['id'], 'me')['attempts'] == 1
+        assert queue.get(job['id'], 'me')['status'] == 'running'
+    finally:
+        release.set()
+        queue.stop(1)
+
+
+def test_only_the_owner_can_read_or_cancel_a_job():
+    queue = JobQueue(MemoryJobStore(), runner=lambda job: {})
+    job = queue.store.enqueue(new_job('blue', 'text', owner='alice')) or queue.store.get(next(iter(queue.store.jobs)))
+    assert queue.get(job['id'], 'bob') is None
+    assert queue.cancel(job['id'], 'bob') is None
+    assert queue.store.get(job['id'])['status'] == 'queued'
+    assert queue.cancel(job['id'], 'alice')['status'] == 'cancelled'
@@ -0,0 +1,41 @@
+import pytest
+
+from filters.json_extract import extract_json, parse_stats
+
+
+def test_bare_object():
+    assert extract_json('  {"a": 1, "b": [2, 3]}\n') == {'a': 1, 'b': [2, 3]}
+
+
+def test_markdown_fence():
+    assert extract_json('```json\n{"concepts": ["x"]}\n```') == {'concepts': ['x']}
+
+
+def test_preamble_and_trailing_prose():
+    reply = 'Here is the JSON you asked for:\n{"a": {"b": "}"}}\nLet me know if {you} need more.'
+    assert extract_json(reply) == {'a': {'b': '}'}}
+
+
+def test_braces_in_prose_before_the_object_are_skipped():
+    assert extract_json('Use {curly braces} like so: {"ok": true}') == {'ok': True}
+
+
+def test_escaped_quotes_inside_strings():
+    assert extract_json('x {"q": "say \\"{hi}\\""} y') == {'q': 'say "{hi}"'}
+
+
+def test_bare_list_falls_through_to_inner_object():
+    assert extract_json('[{"a": 1}]') == {'a': 1}
+
+
+@pytest.mark.parametrize('reply', ['', 'no json here', '[1, 2, 3]', '"a string"', '{"a": 1', '{not: json}'])
+def test_invalid_replies_raise(reply):
+    with pytest.raises(ValueError):
+        extract_json(reply)
+
+
+def test_parse_stats_counts_by_filter_and_outcome():
+    parse_stats.record('test-filter', 'failed')
+    parse_stats.record('test-filter', 'repaired')
+    counts = parse_stats.get_stats()['test-filter']
+    assert counts['failed'] >= 1 and counts['repaired'] >= 1
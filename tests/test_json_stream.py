@@ -0,0 +1,53 @@
+from filters.json_stream import JSONStreamParser
+
+REPLY = (
+    'Sure, here it is:\n```json\n'
+    '{"concepts": ["osmosis", "say \\"hi\\" {not a brace}"],'
+    ' "questions": {"Remember": "What is osmosis?", "Apply": {"q": [1, 2], "hint": "water"}},'
+    ' "count": 3, "done": true, "extra": null}\n```\nHope that helps!'
+)
+EXPECTED = [
+    (('concepts', 0), 'osmosis'),
+    (('concepts', 1), 'say "hi" {not a brace}'),
+    (('questions', 'Remember'), 'What is osmosis?'),
+    (('questions', 'Apply'), {'q': [1, 2], 'hint': 'water'}),
+    (('count',), 3),
+    (('done',), True),
+    (('extra',), None),
+]
+
+
+def feed_in_pieces(text, size):
+    parser, items = JSONStreamParser(), []
+    for start in range(0, len(text), size):
+        items += parser.feed(text[start:start + size])
+    return parser, items
+
+
+def test_whole_reply_yields_every_member_in_order():
+    parser, items = feed_in_pieces(REPLY, len(REPLY))
+    assert items == EXPECTED
+    assert parser.finished
+
+
+def test_any_split_gives_the_same_items():
+    for size in (1, 2, 3, 7, 16):
+        assert feed_in_pieces(REPLY, size)[1] == EXPECTED
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = JSONStreamParser()
+    assert parser.feed('{"concepts": ["osm') == []
+    assert parser.feed('osis", ') == [(('concepts', 0), 'osmosis')]
+    assert parser.feed('"diffusion"') == []
+    # The last array member closes with the bracket, no comma needed
+    assert parser.feed(']') == [(('concepts', 1), 'diffusion')]
+    assert parser.feed(', "questions": {"Apply": {"q": [1') == []
+    assert parser.feed(']}') == [(('questions', 'Apply'), {'q': [1]})]
+
+
+def test_text_after_the_object_is_ignored():
+    parser = JSONStreamParser()
+    parser.feed('{"a": 1}')
+    assert parser.finished
+    assert parser.feed(' {"b": 2}') == []
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+import app as study_app
+from filters.near_duplicate import NearDuplicateIndex
+
+TEXT = ' '.join(
+    f"Mitochondria produce ATP through oxidative phosphorylation in step {i} of cellular respiration."
+    for i in range(6)
+)
+REWORDED = TEXT.replace('produce', 'make', 1) + '\n\nPage 3'
+OTHER = ' '.join(f"The French revolution reshaped European politics in year {i}." for i in range(10))
+
+BLUE = {
+    'concepts': ['ATP'],
+    'questions': {level: '?' for level in ('Remember', 'Understand', 'Apply', 'Analyze', 'Evaluate', 'Create')},
+    'summary': 'Cells make energy.'
+}
+
+
+def test_lookup_finds_near_duplicates_within_their_namespace():
+    index = NearDuplicateIndex()
+    index.add(('blue', '"normal"'), index.fingerprint(TEXT), BLUE)
+
+    assert index.lookup(('blue', '"normal"'), index.fingerprint(REWORDED)) is BLUE
+    assert index.lookup(('blue', '"normal"'), index.fingerprint(OTHER)) is None
+    assert index.lookup(('purple', '"normal"'), index.fingerprint(REWORDED)) is None
+    assert index.fingerprint('too short to compare') is None
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = NearDuplicateIndex()
+    monkeypatch.setattr(study_app, 'near_duplicates', index)
+    return index
+
+
+def stub(monkeypatch, color, result):
+    calls = []
+
+    def process(text, mode='normal'):
+        calls.append(text)
+        return result
+    monkeypatch.setattr(study_app.filters[color], 'process', process)
+    return calls
+
+
+def test_valid_result_is_reused_for_reworded_text(index, monkeypatch):
+    calls = stub(monkeypatch, 'blue', BLUE)
+    assert study_app.run_filter('blue', TEXT) == BLUE
+    assert study_app.run_filter('blue', REWORDED) == BLUE
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('color, result', [
+    ('blue', {'concepts': ['Error parsing AI response'],
+              'questions': {'Error': 'Could not generate structured questions. Please try again.'},
+              'summary': 'AI generation failed.'}),
+    ('blue', dict(BLUE, summary='AI generation failed.')),
+    ('blue', dict(BLUE, coverage={'chunks': 4, 'used': 2, 'failed': 2})),
+    ('yellow', {'exercises': {}, 'error': 'AI generation failed'}),
+    ('grey', {'question': 'What is the main topic?', 'answer': 'The topic',
+              'session_tips': ['Focus!'], 'recommended_duration': 25}),
+    ('purple', {'topics': ['Research Error'], 'search_queries': [], 'research_plan': {'phases': []}}),
+    ('green', {'chunks': [{'id': 1, 'start': 0, 'end': 40}]}),
+])
+def test_fallbacks_partial_and_offset_results_are_not_stored(index, monkeypatch, color, result):
+    calls = stub(monkeypatch, color, result)
+    study_app.run_filter(color, TEXT)
+    study_app.run_filter(color, REWORDED)
+    assert len(calls) == 2
+    assert index.get_stats()['stores'] == 0
+
+
+def test_only_the_leader_of_coalesced_runs_stores(index, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def process(text, mode='normal'):
+        calls.append(text)
+        release.wait(5)
+        return BLUE
+    monkeypatch.setattr(study_app.filters['blue'], 'process', process)
+
+    threads = [threading.Thread(target=study_app.run_filter, args=('blue', TEXT)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while not calls:
+        time.sleep(0.01)
+    # Give the followers time to join the flight before it lands
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert index.get_stats()['stores'] == 1
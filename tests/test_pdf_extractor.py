@@ -0,0 +1,44 @@
+import io
+
+import pytest
+from PyPDF2 import PdfWriter
+
+from filters.response_cache import ResponseCache
+from services.pdf_extractor import PDFExtractionError, PDFExtractor
+
+
+def blank_pdf(pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=72, height=72)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def extractor():
+    return PDFExtractor(cache=ResponseCache(enabled=False))
+
+
+def test_pages_are_yielded_in_order():
+    assert [number for number, _, _ in extractor().iter_pages(blank_pdf(3))] == [1, 2, 3]
+
+
+def test_a_failing_page_becomes_an_extraction_error(monkeypatch):
+    pdf = extractor()
+
+    def extract_pages(path, page_count):
+        yield 'first page'
+        raise RuntimeError('worker died')
+
+    monkeypatch.setattr(pdf, '_extract_pages', extract_pages)
+    pages = pdf.iter_pages(blank_pdf(2))
+    assert next(pages)[1] == 'first page'
+    with pytest.raises(PDFExtractionError, match='page 2: worker died'):
+        next(pages)
+
+
+def test_unreadable_upload_is_an_extraction_error():
+    with pytest.raises(PDFExtractionError):
+        extractor().extract(io.BytesIO(b'not a pdf'))
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from filters import ai_helper
+from filters.resilience import CircuitBreaker, CircuitOpenError, GeminiRateLimitError, GeminiServerError, TokenBucket
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure(GeminiServerError("down"))
+    assert breaker.state == 'open'
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    monkeypatch.setattr(ai_helper, 'circuit_breaker', breaker)
+    return breaker
+
+
+def test_fails_fast_while_open_then_closes_after_successful_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    open_breaker(breaker)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    # Only one trial at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.before_call() is False
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure(GeminiServerError("still down"))
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_trial_without_outcome_times_out():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01, trial_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+
+
+def test_rate_limited_call_does_not_hold_the_trial(breaker, monkeypatch):
+    monkeypatch.setattr(ai_helper, 'RATE_LIMIT_WAIT', 0.0)
+    limiter = TokenBucket(rate=1.0, capacity=1)
+    limiter.tokens = 0
+    monkeypatch.setattr(ai_helper, 'rate_limiter', limiter)
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    with pytest.raises(GeminiRateLimitError):
+        ai_helper.get_ai_response("hello", use_cache=False, max_retries=0)
+
+    limiter.tokens = 1
+    assert ai_helper.get_ai_response("hello", use_cache=False, max_retries=0)
+    assert breaker.state == 'closed'
+
+
+def test_abandoned_stream_releases_the_trial(breaker):
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    stream = ai_helper.stream_ai_response("hello " * 100, use_cache=False, max_retries=0)
+    next(stream)
+    # The client went away mid-stream: GeneratorExit, not an Exception
+    stream.close()
+
+    assert breaker.state == 'half_open'
+    assert breaker.before_call() is True
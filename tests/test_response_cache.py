@@ -0,0 +1,75 @@
+import time
+
+from filters.response_cache import MemoryCacheTier, ResponseCache, SQLiteCacheTier, make_cache_key
+
+
+def test_cache_key_depends_on_model_prompt_and_config():
+    key = make_cache_key('flash', 'prompt', {'temperature': 0.2, 'topK': 1})
+    assert key == make_cache_key('flash', 'prompt', {'topK': 1, 'temperature': 0.2})
+    assert key != make_cache_key('lite', 'prompt', {'temperature': 0.2, 'topK': 1})
+    assert key != make_cache_key('flash', 'prompt', {'temperature': 0.3, 'topK': 1})
+
+
+def test_memory_tier_evicts_least_recently_used_by_count():
+    tier = MemoryCacheTier(max_entries=2)
+    tier.set('a', 'A', None)
+    tier.set('b', 'B', None)
+    assert tier.get('a') == 'A'  # a is now the most recent
+    tier.set('c', 'C', None)
+    assert tier.get('b') is None
+    assert tier.get('a') == 'A' and tier.get('c') == 'C'
+    assert len(tier) == 2
+
+
+def test_memory_tier_evicts_by_bytes_and_skips_oversized_values():
+    tier = MemoryCacheTier(max_entries=100, max_bytes=10)
+    tier.set('a', 'x' * 6, None)
+    tier.set('b', 'y' * 6, None)
+    assert tier.get('a') is None and tier.get('b') == 'y' * 6
+    assert tier.total_bytes == 6
+    tier.set('huge', 'z' * 11, None)
+    assert tier.get('huge') is None and tier.get('b') == 'y' * 6
+
+
+def test_memory_tier_expires_entries():
+    tier = MemoryCacheTier()
+    tier.set('a', 'A', 0.05)
+    assert tier.get('a') == 'A'
+    time.sleep(0.06)
+    assert tier.get('a') is None
+    assert len(tier) == 0 and tier.total_bytes == 0
+
+
+def test_sqlite_tier_expires_and_purges(tmp_path):
+    tier = SQLiteCacheTier(str(tmp_path / 'cache.db'), purge_interval=3600)
+    tier.set('short', 'S', 0.05)
+    tier.set('forever', 'F', None)
+    assert tier.get('short') == 'S'
+    time.sleep(0.06)
+    assert tier.get('short') is None
+    assert tier.get('forever') == 'F'
+
+    tier.set('stale', 'X', 0.01)
+    time.sleep(0.02)
+    assert len(tier) == 2  # expired rows stay until read or purged
+    assert tier.purge_expired() == 1
+    assert len(tier) == 1
+
+
+def test_sqlite_tier_sweeps_on_write_once_per_interval(tmp_path):
+    tier = SQLiteCacheTier(str(tmp_path / 'cache.db'), purge_interval=0)
+    tier.set('stale', 'X', 0.01)
+    time.sleep(0.02)
+    tier.set('fresh', 'F', 60)
+    assert len(tier) == 1
+
+
+def test_disk_hit_is_promoted_with_its_original_expiry(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache(ttl=0.2, disk_path=path).set('k', 'value')
+    restarted = ResponseCache(ttl=60, disk_path=path)
+    assert restarted.get('k') == 'value'
+    assert restarted.get_stats()['disk_hits'] == 1
+    time.sleep(0.25)
+    assert restarted.get('k') is None
+    assert restarted.get_stats()['misses'] == 1
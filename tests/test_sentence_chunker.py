@@ -0,0 +1,78 @@
+import re
+import time
+
+from filters.sentence_chunker import iter_chunks, lead_sentence
+
+SENTENCES = [
+    f"Sentence {i} explains {'how cells divide and grow ' * (i % 4 + 1)}in plain words."
+    for i in range(120)
+]
+TEXT = '  '.join(SENTENCES[:60]) + '\n\n' + ' '.join(SENTENCES[60:]) + '\n'
+
+
+def test_offsets_slice_the_source_exactly_and_cover_every_word():
+    spans = list(iter_chunks(TEXT, target_words=80, max_words=120))
+    assert len(spans) > 3
+    assert [span.index for span in spans] == list(range(len(spans)))
+    for span in spans:
+        chunk = TEXT[span.start:span.end]
+        assert span.text(TEXT) == chunk
+        assert chunk == chunk.strip()
+        assert len(chunk.split()) == span.words <= 120
+    assert [w for span in spans for w in span.text(TEXT).split()] == TEXT.split()
+    # Every chunk but the last closes at a sentence end
+    assert all(span.text(TEXT).endswith('.') for span in spans[:-1])
+
+
+def test_offsets_within_a_window_of_the_source():
+    start = TEXT.index('Sentence 10 ')
+    end = TEXT.index('Sentence 30 ')
+    spans = list(iter_chunks(TEXT, 50, 80, start=start, end=end))
+    assert spans[0].start == start
+    assert spans[-1].end == len(TEXT[:end].rstrip())
+    assert ' '.join(span.text(TEXT) for span in spans).split() == TEXT[start:end].split()
+
+
+def test_unpunctuated_text_is_cut_at_the_word_limit():
+    text = ' '.join(f"word{i}" for i in range(1000))
+    spans = list(iter_chunks(text, target_words=300, max_words=450))
+    assert [span.words for span in spans] == [450, 450, 100]
+    assert spans[1].text(text).split()[0] == 'word450'
+    assert spans[-1].end == len(text)
+
+
+def test_last_chunk_boundary():
+    exact = ' '.join(['alpha beta gamma delta.'] * 5)
+    spans = list(iter_chunks(exact, target_words=20, max_words=30))
+    # The target is reached on the final word: one chunk, no empty tail
+    assert [(span.start, span.end, span.words) for span in spans] == [(0, len(exact), 20)]
+
+    tail = exact + '  trailing words without an end  \n'
+    spans = list(iter_chunks(tail, target_words=20, max_words=30))
+    assert len(spans) == 2
+    assert spans[-1].text(tail) == 'trailing words without an end'
+    assert lead_sentence(tail, spans[-1]) == 'trailing words without an end'
+
+    assert list(iter_chunks('   \n\n  ')) == []
+
+
+def test_abbreviations_do_not_end_a_chunk():
+    text = 'Cells divide, e.g. by mitosis. ' * 10
+    spans = list(iter_chunks(text, target_words=5, max_words=50))
+    assert all(re.search(r'mitosis\.$', span.text(text)) for span in spans)
+
+
+def test_time_grows_linearly_with_input():
+    def best_of_three(text):
+        times = []
+        for _ in range(3):
+            started = time.perf_counter()
+            for _ in iter_chunks(text):
+                pass
+            times.append(time.perf_counter() - started)
+        return min(times)
+
+    block = 'Cells divide and grow in plain words. ' * 50 + '\n\n'
+    small, large = best_of_three(block * 100), best_of_three(block * 400)
+    # Four times the text; a quadratic pass would take about sixteen times as long
+    assert large < small * 8
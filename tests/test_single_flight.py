@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from filters.single_flight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, count):
+    results = [None] * count
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, fn)
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    return threads, results
+
+
+def test_concurrent_callers_share_one_execution():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return 'answer'
+    threads, results = run_concurrently(flight, 'k', fn, 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['answer'] * 4
+    assert len(calls) == 1
+    assert flight.get_stats() == {'executed': 1, 'coalesced': 3, 'timed_out': 0, 'in_flight': 0}
+
+
+def test_leader_exception_reaches_followers_and_the_key_is_released():
+    flight, release = SingleFlight(), threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError('upstream broke')
+    threads, results = run_concurrently(flight, 'k', fail, 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.calls == {}
+    # The next call starts fresh rather than seeing the old failure
+    assert flight.do('k', lambda: 'recovered') == 'recovered'
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+    assert flight.get_stats()['coalesced'] == 0
+
+
+def test_follower_of_a_hung_leader_runs_independently():
+    flight, release = SingleFlight(timeout=0.05), threading.Event()
+    leader = threading.Thread(target=flight.do, args=('k', lambda: release.wait(5)))
+    leader.start()
+    time.sleep(0.01)
+
+    started = time.perf_counter()
+    assert flight.do('k', lambda: 'own result') == 'own result'
+    assert time.perf_counter() - started < 1
+    assert flight.get_stats()['timed_out'] == 1
+
+    release.set()
+    leader.join()
+    assert flight.calls == {}
+
+
+def test_follower_fallback_errors_are_its_own():
+    flight, release = SingleFlight(timeout=0.05), threading.Event()
+    leader = threading.Thread(target=flight.do, args=('k', lambda: release.wait(5)))
+    leader.start()
+    time.sleep(0.01)
+
+    def broken():
+        raise RuntimeError('own failure')
+    with pytest.raises(RuntimeError, match='own failure'):
+        flight.do('k', broken)
+    release.set()
+    leader.join()